@@ -0,0 +1,7 @@
+"""API benchmarks against synthetic projects.
+
+    python -m benchmarks --shape wide --save benchmarks/baselines/wide.json
+    python -m benchmarks --shape wide --compare benchmarks/baselines/wide.json
+
+See `python -m benchmarks --help` and the Benchmarks section of the README.
+"""
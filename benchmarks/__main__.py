@@ -0,0 +1,112 @@
+"""Benchmark the API against a synthetic project.
+
+Seeds a project of the chosen shape, then times every endpoint scenario and
+reports p50/p95/p99 latency, throughput and SQL queries per request.
+
+In-process (default): drives the blueprints through Flask's test client,
+sequentially, on a throwaway SQLite database unless --database-url is given:
+
+    python -m benchmarks --shape wide --iterations 200
+    python -m benchmarks --shape large --database-url postgresql://localhost/pseudocode_bench
+
+HTTP: seeds the database the server uses (DATABASE_URL, or --database-url)
+and hits the running server from concurrent clients. Query counts are only
+available in-process.
+
+    python -m benchmarks --shape wide --url http://localhost:5009 --concurrency 16 --duration 10
+
+Baselines: --save writes the report as JSON; --compare reads one back and
+exits with status 1 if a scenario got slower, issues more queries or fails
+more often.
+"""
+import argparse
+import json
+import os
+import secrets
+import shutil
+import sys
+import tempfile
+from main import create_app
+from src.models.user import db
+from benchmarks.runner import SCENARIOS, build_report, compare, format_report, run_http, run_in_process
+from benchmarks.shapes import SHAPES, seed
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='python -m benchmarks', description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--shape', choices=sorted(SHAPES), default='small')
+    parser.add_argument('--scenarios', help='comma-separated subset of: ' + ', '.join(s.name for s in SCENARIOS))
+    parser.add_argument('--database-url', help='seed (and in-process, serve) this database instead')
+    parser.add_argument('--iterations', type=int, default=100, help='timed requests per scenario in-process')
+    parser.add_argument('--warmup', type=int, default=5)
+    parser.add_argument('--url', help='benchmark a running server over HTTP instead of in-process')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=10, help='seconds per scenario over HTTP')
+    parser.add_argument('--save', metavar='PATH', help='write the report to this JSON file')
+    parser.add_argument('--compare', metavar='PATH', help='baseline JSON to check for regressions')
+    parser.add_argument('--threshold', type=float, default=0.25, help='allowed median slowdown, as a fraction')
+    args = parser.parse_args()
+
+    scenarios = SCENARIOS
+    if args.scenarios:
+        wanted = set(args.scenarios.split(','))
+        scenarios = [scenario for scenario in SCENARIOS if scenario.name in wanted]
+        unknown = wanted - {scenario.name for scenario in scenarios}
+        if unknown:
+            parser.error(f'unknown scenarios: {", ".join(sorted(unknown))}')
+
+    # No job threads: their polling would show up in the per-request query counts
+    config = {'RATE_LIMIT_ENABLED': False, 'PASSWORD_HASH_WORKERS': 0, 'JOB_WORKERS': 0,
+              'SECRET_KEY': os.environ.get('SECRET_KEY') or secrets.token_hex(32)}
+    scratch = None
+    if args.database_url:
+        config['SQLALCHEMY_DATABASE_URI'] = args.database_url
+    elif not args.url:
+        scratch = tempfile.mkdtemp(prefix='pseudocode-bench-')
+        config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(scratch, 'bench.db')}"
+
+    try:
+        app = create_app(config)
+        shape = SHAPES[args.shape]
+        with app.app_context():
+            database = db.engine.dialect.name
+            seeded = seed(shape)
+        print(f'Seeded {seeded.items} items in {seeded.seconds}s', file=sys.stderr)
+
+        if args.url:
+            results = run_http(args.url, seeded, scenarios, args.concurrency, args.duration)
+            mode = f'http x{args.concurrency}'
+        else:
+            results = run_in_process(app, seeded, scenarios, args.iterations, args.warmup)
+            mode = 'in-process'
+    finally:
+        if scratch:
+            shutil.rmtree(scratch, ignore_errors=True)
+
+    report = build_report(args.shape, shape, seeded, mode, database, results)
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print(format_report(report, baseline))
+
+    if args.save:
+        os.makedirs(os.path.dirname(os.path.abspath(args.save)), exist_ok=True)
+        with open(args.save, 'w') as f:
+            json.dump(report, f, indent=2)
+            f.write('\n')
+
+    if baseline:
+        if (baseline.get('shape'), baseline.get('mode')) != (report['shape'], report['mode']):
+            print(f"Baseline is for {baseline.get('shape')} / {baseline.get('mode')}, not comparable", file=sys.stderr)
+            raise SystemExit(2)
+        regressions = compare(report, baseline, args.threshold)
+        for regression in regressions:
+            print(f'REGRESSION {regression}')
+        if regressions:
+            raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,233 @@
+import http.cookiejar
+import json
+import platform
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import namedtuple
+from datetime import datetime, timezone
+from sqlalchemy import event
+from src.models.user import db
+from src.services.serialization import COMPACT_MIMETYPE
+
+# `path` is formatted with the seeded ids plus whatever `prepare` returns; `prepare` runs untimed
+Scenario = namedtuple('Scenario', 'name method path body headers prepare', defaults=(None, None, None))
+
+
+def new_item(client, ids):
+    """A fresh leaf item to delete, so every iteration deletes something."""
+    _, body = client.request('POST', f"/api/sections/{ids['section_id']}/items", {'text': 'Benchmark leaf'})
+    return {'item_id': json.loads(body)['item']['id']}
+
+
+def touch_item(client, ids):
+    """Bump the project revision so the next tree read misses the cache."""
+    client.request('PUT', f"/api/items/{ids['item_id']}", {'text': 'Benchmark touch'})
+    return {}
+
+
+SCENARIOS = [
+    Scenario('get_projects', 'GET', '/api/projects'),
+    Scenario('get_project', 'GET', '/api/projects/{project_id}'),
+    Scenario('get_project_uncached', 'GET', '/api/projects/{project_id}', prepare=touch_item),
+    Scenario('get_project_compact', 'GET', '/api/projects/{project_id}', headers={'Accept': COMPACT_MIMETYPE}),
+    Scenario('get_project_stats', 'GET', '/api/projects/{project_id}/stats'),
+    Scenario('list_items', 'GET', '/api/sections/{section_id}/items?depth=3'),
+    Scenario('search', 'GET', '/api/search?q=item&project_id={project_id}'),
+    Scenario('create_item', 'POST', '/api/sections/{section_id}/items', body={'text': 'Benchmark item'}),
+    Scenario('update_item', 'PUT', '/api/items/{item_id}', body={'text': 'Benchmark edit'}),
+    Scenario('delete_item', 'DELETE', '/api/items/{item_id}', prepare=new_item),
+]
+
+
+# Clients return (status, raw body): decoding a large tree would otherwise count against the endpoint
+class TestClient:
+    """Requests through Flask's test client: no network, one thread."""
+
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def request(self, method, path, body=None, headers=None):
+        response = self.client.open(path, method=method, json=body, headers=headers)
+        return response.status_code, response.get_data()
+
+
+class HttpClient:
+    """Requests to a running server over HTTP, with its own cookie jar."""
+
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip('/')
+        self.opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()))
+
+    def request(self, method, path, body=None, headers=None):
+        data = json.dumps(body).encode() if body is not None else None
+        request = urllib.request.Request(self.base_url + path, data=data, method=method,
+                                         headers=dict({'Content-Type': 'application/json'}, **(headers or {})))
+        try:
+            with self.opener.open(request, timeout=60) as response:
+                return response.status, response.read()
+        except urllib.error.HTTPError as e:
+            return e.code, e.read()
+
+
+def login(client, credentials):
+    status, body = client.request('POST', '/api/auth/login', credentials)
+    if status != 200:
+        raise RuntimeError(f'Benchmark login failed with {status}: {body[:200]!r}')
+
+
+class QueryCounter:
+    """Counts statements sent to the database by this process."""
+
+    def __init__(self, engine):
+        self.count = 0
+        event.listen(engine, 'before_cursor_execute', self._count)
+
+    def _count(self, *args):
+        self.count += 1
+
+
+def percentile(values, p):
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+def summarize(latencies, errors, elapsed, query_counts=None):
+    latencies = sorted(latencies)
+    result = {
+        'requests': len(latencies),
+        'errors': errors,
+        'throughput': round(len(latencies) / elapsed, 1) if elapsed else None,
+        'p50_ms': None,
+        'p95_ms': None,
+        'p99_ms': None,
+        'queries': None
+    }
+    if latencies:
+        result.update({
+            'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+            'p95_ms': round(percentile(latencies, 95) * 1000, 2),
+            'p99_ms': round(percentile(latencies, 99) * 1000, 2)
+        })
+    if query_counts:
+        result['queries'] = {
+            'mean': round(sum(query_counts) / len(query_counts), 2),
+            'max': max(query_counts)
+        }
+    return result
+
+
+def _send(client, scenario, ids):
+    values = dict(ids, **(scenario.prepare(client, ids) if scenario.prepare else {}))
+    return scenario.method, scenario.path.format(**values)
+
+
+def run_in_process(app, seeded, scenarios, iterations, warmup=5):
+    """Time each scenario sequentially through the test client, counting queries per request."""
+    ids = seeded._asdict()
+    client = TestClient(app)
+    login(client, seeded.credentials)
+    with app.app_context():
+        counter = QueryCounter(db.engine)
+
+    results = {}
+    for scenario in scenarios:
+        latencies, query_counts, errors = [], [], 0
+        for n in range(warmup + iterations):
+            method, path = _send(client, scenario, ids)
+            queries_before = counter.count
+            request_started = time.perf_counter()
+            status, _ = client.request(method, path, scenario.body, scenario.headers)
+            elapsed = time.perf_counter() - request_started
+            if n < warmup:
+                continue
+            if status >= 400:
+                errors += 1
+                continue
+            latencies.append(elapsed)
+            query_counts.append(counter.count - queries_before)
+        results[scenario.name] = summarize(latencies, errors, sum(latencies), query_counts)
+    return results
+
+
+def run_http(base_url, seeded, scenarios, concurrency, duration):
+    """Hit each scenario from `concurrency` threads for `duration` seconds against a running server."""
+    ids = seeded._asdict()
+    results = {}
+    for scenario in scenarios:
+        latencies, errors = [], []
+
+        def worker(deadline):
+            client = HttpClient(base_url)
+            login(client, seeded.credentials)
+            while time.perf_counter() < deadline:
+                method, path = _send(client, scenario, ids)
+                request_started = time.perf_counter()
+                status, _ = client.request(method, path, scenario.body, scenario.headers)
+                if status >= 400:
+                    errors.append(status)
+                else:
+                    latencies.append(time.perf_counter() - request_started)
+
+        deadline = time.perf_counter() + duration
+        threads = [threading.Thread(target=worker, args=(deadline,)) for _ in range(concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        results[scenario.name] = summarize(latencies, len(errors), duration)
+    return results
+
+
+def build_report(shape_name, shape, seeded, mode, database, results):
+    return {
+        'shape': shape_name,
+        'shape_params': shape._asdict(),
+        'items': seeded.items,
+        'seed_seconds': seeded.seconds,
+        'mode': mode,
+        'database': database,
+        'python': platform.python_version(),
+        'created_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'results': results
+    }
+
+
+def compare(report, baseline, threshold):
+    """Regressions of `report` against `baseline`, as readable lines.
+
+    Query counts are deterministic, so any increase counts. Latency counts
+    when the median grows by more than `threshold` (a fraction) and by at
+    least 1 ms; tail percentiles of a short run swing too much to gate on.
+    """
+    regressions = []
+    for name, current in report['results'].items():
+        previous = baseline.get('results', {}).get(name)
+        if not previous:
+            continue
+        if current['errors'] > previous['errors']:
+            regressions.append(f"{name}: {current['errors']} errors (baseline {previous['errors']})")
+        if current['queries'] and previous['queries'] and current['queries']['mean'] > previous['queries']['mean']:
+            regressions.append(f"{name}: {current['queries']['mean']} queries/request "
+                               f"(baseline {previous['queries']['mean']})")
+        if current['p50_ms'] is not None and previous['p50_ms'] is not None:
+            limit = max(previous['p50_ms'] * (1 + threshold), previous['p50_ms'] + 1)
+            if current['p50_ms'] > limit:
+                regressions.append(f"{name}: p50 {current['p50_ms']} ms (baseline {previous['p50_ms']} ms)")
+    return regressions
+
+
+def format_report(report, baseline=None):
+    lines = [f"{report['shape']} ({report['items']} items, seeded in {report['seed_seconds']}s), "
+             f"{report['mode']} mode on {report['database']}",
+             f"{'endpoint':<22}{'req':>7}{'err':>5}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'queries':>9}"
+             + (f"{'base p50':>10}" if baseline else '')]
+    for name, r in report['results'].items():
+        queries = r['queries']['mean'] if r['queries'] else '-'
+        line = (f"{name:<22}{r['requests']:>7}{r['errors']:>5}{r['throughput'] or '-':>9}"
+                f"{r['p50_ms'] or '-':>9}{r['p95_ms'] or '-':>9}{r['p99_ms'] or '-':>9}{queries:>9}")
+        if baseline:
+            previous = baseline.get('results', {}).get(name) or {}
+            line += f"{previous.get('p50_ms') or '-':>10}"
+        lines.append(line)
+    return '\n'.join(lines)
@@ -0,0 +1,81 @@
+import time
+import uuid
+from collections import namedtuple
+from werkzeug.security import generate_password_hash
+from src.models.user import db, User
+from src.models.project import Project, ProjectMember
+from src.services.importer import ProjectImporter
+from src.services.revisions import record_change
+
+BENCHMARK_PASSWORD = 'benchmark-password'
+
+# Each section holds `items` items laid out as chains `depth` levels deep (depth 1 is a flat list)
+Shape = namedtuple('Shape', 'sections items depth members')
+
+SHAPES = {
+    'small': Shape(sections=5, items=20, depth=1, members=0),
+    'wide': Shape(sections=50, items=200, depth=1, members=0),
+    'deep': Shape(sections=10, items=1000, depth=100, members=0),
+    'large': Shape(sections=100, items=1000, depth=4, members=0),
+    'members': Shape(sections=10, items=50, depth=2, members=500),
+}
+
+Seeded = namedtuple('Seeded', 'credentials project_id section_id item_id items seconds')
+
+
+def _create_users(count, password_hash):
+    tag = uuid.uuid4().hex[:8]
+    rows = [{
+        'username': f'bench-{tag}-{n}',
+        'email': f'bench-{tag}-{n}@example.com',
+        'password_hash': password_hash
+    } for n in range(count)]
+    return db.session.execute(db.insert(User).returning(User.id, sort_by_parameter_order=True), rows).scalars().all()
+
+
+def seed(shape):
+    """Create an owner, a project of the given shape and its members through the app's models.
+
+    Sections and items go through the same importer as project imports, so
+    counters, the search index and the change log are filled in as usual.
+    Must run inside an app context.
+    """
+    started = time.perf_counter()
+    # One hash for every seeded user; hashing hundreds of members would dominate the run
+    password_hash = generate_password_hash(BENCHMARK_PASSWORD)
+    owner_id, *member_ids = _create_users(1 + shape.members, password_hash)
+    owner = db.session.get(User, owner_id)
+
+    project = Project(name=f'Benchmark {shape.sections}x{shape.items}/{shape.depth}', owner_id=owner_id)
+    db.session.add(project)
+    db.session.flush()
+    db.session.add(ProjectMember(project_id=project.id, user_id=owner_id, role='owner'))
+    if member_ids:
+        db.session.execute(db.insert(ProjectMember), [
+            {'project_id': project.id, 'user_id': user_id, 'role': 'editor'} for user_id in member_ids
+        ])
+    record_change(project.id, 'project', project.id, 'created')
+    db.session.commit()
+
+    importer = ProjectImporter(project.id)
+    for s in range(shape.sections):
+        section_key = ('section', s)
+        importer.add_section(section_key, {'name': f'Section {s}', 'priority': 'medium'})
+        for i in range(shape.items):
+            parent_key = ('item', s, i - 1) if i % shape.depth else None
+            importer.add_item(('item', s, i), section_key, parent_key, {
+                'text': f'Item {s}.{i}',
+                'description': f'Synthetic item {i} of section {s}',
+                'priority': ('critical', 'high', 'medium', 'low')[i % 4],
+                'type': ('feature', 'comment', 'ux-decision')[i % 3]
+            })
+    summary = importer.finish()
+
+    return Seeded(
+        credentials={'username': owner.username, 'password': BENCHMARK_PASSWORD},
+        project_id=project.id,
+        section_id=importer.section_map.get(('section', 0)),
+        item_id=importer.item_map.get(('item', 0, 0)),
+        items=summary['items'],
+        seconds=round(time.perf_counter() - started, 3)
+    )
@@ -0,0 +1,44 @@
+# Production server settings, picked up by `gunicorn -c gunicorn.conf.py "main:create_app()"`.
+# Every value can be overridden from the environment.
+import os
+
+try:
+    cpu_count = len(os.sched_getaffinity(0))
+except AttributeError:
+    cpu_count = os.cpu_count() or 1
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 5009)}"
+
+# Requests spend most of their time waiting on the database, so run a few
+# processes per core and let threads overlap the I/O inside each of them.
+workers = int(os.environ.get('WEB_CONCURRENCY', cpu_count * 2 + 1))
+# Tell the app how many processes share it, for the state it keeps per process
+os.environ['WEB_CONCURRENCY'] = str(workers)
+threads = int(os.environ.get('WEB_THREADS', 4))
+worker_class = 'gthread'
+
+# Build the app (and run migrations) once in the master, then fork
+preload_app = True
+
+timeout = int(os.environ.get('WEB_TIMEOUT', 60))
+graceful_timeout = 30
+keepalive = 5
+
+# Recycle workers now and then to cap slow memory growth
+max_requests = int(os.environ.get('WEB_MAX_REQUESTS', 2000))
+max_requests_jitter = 200
+
+accesslog = '-'
+errorlog = '-'
+loglevel = os.environ.get('LOG_LEVEL', 'info')
+
+
+def post_fork(server, worker):
+    # The preloaded app's engines were created in the master. Drop their pools in the
+    # child without closing the sockets, which still belong to the parent.
+    from src.models.user import db
+
+    app = server.app.wsgi()
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=False)
@@ -1,4 +1,5 @@
 import os
+import secrets
 import sys
 # DON'T CHANGE THIS !!!
 sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
@@ -7,73 +8,211 @@ sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
 
 from flask import Flask, send_from_directory
 from flask_cors import CORS
+from sqlalchemy.engine import make_url
+from werkzeug.middleware.proxy_fix import ProxyFix
 from src.models.user import db
-from src.models.project import Project, ProjectMember
-from src.models.section import Section, Item
+from src.models.project import Project, ProjectMember, ProjectChange
+from src.models.section import Section, Item, SectionStat
+from src.models.job import Job
 from src.routes.user import user_bp
 from src.routes.project import project_bp
 from src.routes.section import section_bp
+from src.routes.search import search_bp
+from src.routes.job import job_bp
+from src.services.auth import init_auth
+from src.services.cache import init_project_cache
+from src.services.passwords import init_passwords
+from src.services.ratelimit import init_rate_limits
+from src.services.realtime import init_realtime
+from src.services.assets import init_assets
+from src.services.jobs import init_jobs, jobs_cli
+from src.services.routing import configure_binds, init_routing
+from src.services.metrics import init_metrics
+from src.services.search import init_search, search_cli
+from src.services.serialization import init_json
+from src.services.stats import stats_cli
+from src.services.migrations import db_cli, upgrade
+
+
+def database_uri():
+    # Use PostgreSQL on Railway, SQLite locally
+    database_url = os.environ.get('DATABASE_URL')
+    # Never log the password
+    print(f"🔍 DATABASE_URL: {make_url(database_url).render_as_string(hide_password=True) if database_url else None}")
+    print(f"🔍 RAILWAY_ENVIRONMENT: {os.environ.get('RAILWAY_ENVIRONMENT')}")
+
+    if database_url:
+        # Railway PostgreSQL
+        if database_url.startswith('postgres://'):
+            # Fix for newer SQLAlchemy versions
+            database_url = database_url.replace('postgres://', 'postgresql://', 1)
+        print(f"✅ Using PostgreSQL: {make_url(database_url).render_as_string(hide_password=True)}")
+        return database_url
 
-app = Flask(__name__, static_folder=os.path.join(os.path.dirname(__file__), 'src', 'static'))
-app.config['SECRET_KEY'] = 'asdf#FGSgvasgf$5$WGT'
-
-# Enable CORS for all routes
-CORS(app, supports_credentials=True)
-
-# Register blueprints
-app.register_blueprint(user_bp, url_prefix='/api')
-app.register_blueprint(project_bp, url_prefix='/api')
-app.register_blueprint(section_bp, url_prefix='/api')
-
-# Database configuration
-# Use PostgreSQL on Railway, SQLite locally
-database_url = os.environ.get('DATABASE_URL')
-print(f"🔍 DATABASE_URL: {database_url}")
-print(f"🔍 RAILWAY_ENVIRONMENT: {os.environ.get('RAILWAY_ENVIRONMENT')}")
-
-if database_url:
-    # Railway PostgreSQL
-    if database_url.startswith('postgres://'):
-        # Fix for newer SQLAlchemy versions
-        database_url = database_url.replace('postgres://', 'postgresql://', 1)
-    app.config['SQLALCHEMY_DATABASE_URI'] = database_url
-    print(f"✅ Using PostgreSQL: {database_url[:50]}...")
-else:
     # Local SQLite fallback
-    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(os.path.dirname(__file__), 'database', 'app.db')}"
     print("✅ Using SQLite fallback")
+    return f"sqlite:///{os.path.join(os.path.dirname(__file__), 'database', 'app.db')}"
+
+
+def engine_options(uri):
+    # SQLite uses its own per-thread pool; the sizing knobs only apply to server databases
+    if uri.startswith('sqlite'):
+        return {}
+
+    # One connection per worker thread, plus headroom for bursts. The total across
+    # workers (WEB_CONCURRENCY * (pool_size + max_overflow)) must fit max_connections.
+    return {
+        'pool_size': int(os.environ.get('DB_POOL_SIZE', os.environ.get('WEB_THREADS', 4))),
+        'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', 5)),
+        'pool_timeout': int(os.environ.get('DB_POOL_TIMEOUT', 30)),
+        'pool_recycle': int(os.environ.get('DB_POOL_RECYCLE', 1800)),
+        'pool_pre_ping': os.environ.get('DB_POOL_PRE_PING', '1') != '0'
+    }
+
+
+def create_app(config=None):
+    app = Flask(__name__, static_folder=os.path.join(os.path.dirname(__file__), 'src', 'static'))
+    # Required outside debug and testing; see the check after the config is applied
+    app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY')
+    # Previous keys, still accepted for auth tokens while they age out (comma-separated)
+    app.config['SECRET_KEY_FALLBACKS'] = [key for key in os.environ.get('SECRET_KEY_FALLBACKS', '').split(',') if key]
+
+    # Behind N reverse proxies, take the client address from X-Forwarded-For (used by rate limits)
+    proxy_count = int(os.environ.get('TRUSTED_PROXY_COUNT', 0))
+    if proxy_count:
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=proxy_count, x_proto=proxy_count)
+
+    # Enable CORS for all routes
+    CORS(app, supports_credentials=True)
+
+    # Register blueprints
+    app.register_blueprint(user_bp, url_prefix='/api')
+    app.register_blueprint(project_bp, url_prefix='/api')
+    app.register_blueprint(section_bp, url_prefix='/api')
+    app.register_blueprint(search_bp, url_prefix='/api')
+    app.register_blueprint(job_bp, url_prefix='/api')
+
+    # Maintenance commands (flask stats verify|rebuild, flask db upgrade|status|check-indexes,
+    # flask jobs work|prune, flask search reindex)
+    app.cli.add_command(stats_cli)
+    app.cli.add_command(db_cli)
+    app.cli.add_command(jobs_cli)
+    app.cli.add_command(search_cli)
+
+    # Database configuration
+    app.config['SQLALCHEMY_DATABASE_URI'] = database_uri()
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+
+    # Serialized project tree cache (set PROJECT_CACHE_URL to share it across workers via Redis)
+    app.config['PROJECT_CACHE_URL'] = os.environ.get('PROJECT_CACHE_URL')
+    app.config['PROJECT_CACHE_MAX_BYTES'] = int(os.environ.get('PROJECT_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+
+    # Read replicas and shards (see src/services/routing.py). Replicas serve SELECTs of read-only
+    # views; callers who wrote within REPLICA_STICKY_SECONDS keep reading the primary.
+    # DATABASE_SHARDS is 'number=url,...' (numbers from 1); SHARD_MAP assigns projects: 'project_id=number,...'
+    app.config['DATABASE_REPLICA_URLS'] = os.environ.get('DATABASE_REPLICA_URLS')
+    app.config['REPLICA_STICKY_SECONDS'] = int(os.environ.get('REPLICA_STICKY_SECONDS', 5))
+    app.config['DATABASE_SHARDS'] = os.environ.get('DATABASE_SHARDS')
+    app.config['SHARD_MAP'] = os.environ.get('SHARD_MAP')
+    app.config['SHARD_ID_SPAN'] = int(os.environ.get('SHARD_ID_SPAN', 100_000_000))
+    app.config['DATABASE_ROUTING_STORE_URL'] = os.environ.get('DATABASE_ROUTING_STORE_URL', os.environ.get('PROJECT_CACHE_URL'))
+
+    # Token revocations (set AUTH_STORE_URL so a logout applies on every worker)
+    app.config['AUTH_STORE_URL'] = os.environ.get('AUTH_STORE_URL', os.environ.get('PROJECT_CACHE_URL'))
+    app.config['WEB_CONCURRENCY'] = int(os.environ.get('WEB_CONCURRENCY', 1))  # exported by gunicorn.conf.py
 
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-db.init_app(app)
+    # Password hashing runs in a per-worker process pool (PASSWORD_HASH_WORKERS=0 hashes inline)
+    app.config['PASSWORD_HASH_METHOD'] = os.environ.get('PASSWORD_HASH_METHOD', 'scrypt')
+    app.config['PASSWORD_HASH_WORKERS'] = int(os.environ.get('PASSWORD_HASH_WORKERS', 1))
+    app.config['PASSWORD_HASH_MAX_PENDING'] = int(os.environ.get('PASSWORD_HASH_MAX_PENDING', 16))
 
-# Create all tables
-with app.app_context():
-    db.create_all()
+    # Login/register attempts per window, as hits/seconds
+    app.config['RATE_LIMIT_ENABLED'] = os.environ.get('RATE_LIMIT_ENABLED', '1') != '0'
+    app.config['LOGIN_IP_RATE_LIMIT'] = os.environ.get('LOGIN_IP_RATE_LIMIT', '30/60')
+    app.config['LOGIN_USER_RATE_LIMIT'] = os.environ.get('LOGIN_USER_RATE_LIMIT', '10/60')
+    app.config['RATE_LIMIT_STORE_URL'] = os.environ.get('RATE_LIMIT_STORE_URL', os.environ.get('PROJECT_CACHE_URL'))
 
-@app.route('/', defaults={'path': ''})
-@app.route('/<path:path>')
-def serve(path):
-    static_folder_path = app.static_folder
-    if static_folder_path is None:
-            return "Static folder not configured", 404
+    # orjson-backed jsonify and request parsing when available (FAST_JSON=0 keeps the stdlib encoder)
+    app.config['FAST_JSON'] = os.environ.get('FAST_JSON', '1') != '0'
 
-    if path != "" and os.path.exists(os.path.join(static_folder_path, path)):
-        return send_from_directory(static_folder_path, path)
-    else:
-        index_path = os.path.join(static_folder_path, 'index.html')
-        if os.path.exists(index_path):
-            return send_from_directory(static_folder_path, 'index.html')
-        else:
-            return "index.html not found", 404
+    # Request metrics at /metrics (readable only with `Authorization: Bearer <METRICS_TOKEN>`),
+    # slow query log, and an opt-in profiler that keeps stacks of requests over PROFILE_SLOW_REQUESTS_MS
+    app.config['METRICS_ENABLED'] = os.environ.get('METRICS_ENABLED', '1') != '0'
+    app.config['METRICS_TOKEN'] = os.environ.get('METRICS_TOKEN')
+    app.config['SLOW_QUERY_MS'] = int(os.environ.get('SLOW_QUERY_MS', 200))
+    app.config['PROFILE_SLOW_REQUESTS_MS'] = int(os.environ.get('PROFILE_SLOW_REQUESTS_MS', 0))
+    app.config['PROFILE_INTERVAL_MS'] = int(os.environ.get('PROFILE_INTERVAL_MS', 5))
+    app.config['PROFILE_DIR'] = os.environ.get('PROFILE_DIR')
 
+    # Change broadcasting (set REALTIME_BROKER_URL to fan out across workers via Redis)
+    app.config['REALTIME_BROKER_URL'] = os.environ.get('REALTIME_BROKER_URL', os.environ.get('PROJECT_CACHE_URL'))
+    # Open streams per process, each holding a thread; by default half of them, so streams can't starve the API
+    app.config['REALTIME_MAX_STREAMS'] = int(os.environ.get('REALTIME_MAX_STREAMS', max(int(os.environ.get('WEB_THREADS', 4)) // 2, 1)))
+    app.config['REALTIME_POLL_SECONDS'] = int(os.environ.get('REALTIME_POLL_SECONDS', 10))
+
+    # Background jobs: worker threads per process; 0 leaves them to `flask jobs work`
+    app.config['JOB_WORKERS'] = int(os.environ.get('JOB_WORKERS', 1))
+    app.config['JOB_POLL_SECONDS'] = float(os.environ.get('JOB_POLL_SECONDS', 1))
+    app.config['JOB_LEASE_SECONDS'] = int(os.environ.get('JOB_LEASE_SECONDS', 60))
+    app.config['JOB_MAX_ATTEMPTS'] = int(os.environ.get('JOB_MAX_ATTEMPTS', 3))
+    app.config['JOB_CHUNK_SIZE'] = int(os.environ.get('JOB_CHUNK_SIZE', 2000))
+
+    if config:
+        app.config.update(config)
+    if not app.config['SECRET_KEY']:
+        # A key everyone knows would let anyone sign auth tokens for any user
+        if not (app.debug or app.testing):
+            raise RuntimeError('SECRET_KEY is not set; set it to a long random value (or FLASK_DEBUG=1 for development)')
+        app.config['SECRET_KEY'] = secrets.token_hex(32)
+        app.logger.warning('SECRET_KEY is not set; using a random key, so auth tokens only last as long as this process')
+    app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', engine_options(app.config['SQLALCHEMY_DATABASE_URI']))
+
+    init_json(app)
+    configure_binds(app)
+    db.init_app(app)
+    init_auth(app)
+    init_passwords(app)
+    init_rate_limits(app)
+    init_project_cache(app)
+    init_realtime(app)
+    init_metrics(app)
+    init_jobs(app)
+
+    # Create all tables
+    with app.app_context():
+        db.create_all()
+
+    # Bring existing databases up to date (columns and indexes create_all can't add).
+    # Set AUTO_MIGRATE=0 to run `flask db upgrade` as a separate deploy step instead.
+    if os.environ.get('AUTO_MIGRATE', '1') != '0':
+        upgrade(app)
+
+    # Full-text search index (SQLite FTS5 locally, tsvector/GIN on PostgreSQL)
+    init_search(app)
+
+    # Shard schemas and id ranges; pin writers' reads to the primary
+    init_routing(app)
+
+    # Don't hand connections opened during startup down to forked workers
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose()
+
+    # The frontend, from memory: hashed CSS/JS split out of index.html, precompressed
+    init_assets(app)
+
+    @app.route('/test')
+    def test_login():
+        return send_from_directory('.', 'test_login.html')
+
+    return app
 
-@app.route('/test')
-def test_login():
-    return send_from_directory('.', 'test_login.html')
 
 if __name__ == '__main__':
-    # Get port from environment variable (Railway sets this)
-    port = int(os.environ.get('PORT', 5009))
+    # Development server only; production runs gunicorn (see Procfile and gunicorn.conf.py)
     # Disable debug in production
     debug_mode = os.environ.get('FLASK_ENV') != 'production'
+    app = create_app({'DEBUG': debug_mode})
+    # Get port from environment variable (Railway sets this)
+    port = int(os.environ.get('PORT', 5009))
     app.run(host='0.0.0.0', port=port, debug=debug_mode)
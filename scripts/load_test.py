@@ -0,0 +1,102 @@
+"""Simple HTTP load test for comparing serving modes.
+
+Start the server one way, run this, then repeat with the other:
+
+    python main.py
+    gunicorn -c gunicorn.conf.py "main:create_app()"
+
+    python scripts/load_test.py --url http://localhost:5009 --concurrency 16 --duration 20
+
+It registers a throwaway user, seeds one project, then has every client thread
+read the project list and the project tree in a loop and reports throughput
+and latency percentiles.
+"""
+import argparse
+import http.cookiejar
+import json
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+
+
+def make_opener():
+    return urllib.request.build_opener(urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()))
+
+
+def call(opener, url, method='GET', body=None):
+    data = json.dumps(body).encode() if body is not None else None
+    request = urllib.request.Request(url, data=data, method=method, headers={'Content-Type': 'application/json'})
+    with opener.open(request, timeout=30) as response:
+        return json.loads(response.read() or b'null')
+
+
+def seed(base_url, sections, items):
+    opener = make_opener()
+    username = f'load-{uuid.uuid4().hex[:8]}'
+    credentials = {'username': username, 'email': f'{username}@example.com', 'password': 'load-test'}
+    call(opener, f'{base_url}/api/auth/register', 'POST', credentials)
+
+    project = call(opener, f'{base_url}/api/projects', 'POST', {'name': 'Load test'})
+    operations = []
+    for s in range(sections):
+        operations.append({'op': 'create', 'type': 'section', 'temp_id': f's{s}', 'data': {'name': f'Section {s}'}})
+        for i in range(items):
+            operations.append({'op': 'create', 'type': 'item', 'temp_id': f's{s}i{i}',
+                               'data': {'section_id': f's{s}', 'text': f'Item {i}'}})
+    call(opener, f'{base_url}/api/projects/{project["id"]}/batch', 'POST', {'operations': operations})
+    return credentials, project['id']
+
+
+def worker(base_url, credentials, project_id, deadline, latencies, errors):
+    opener = make_opener()
+    call(opener, f'{base_url}/api/auth/login', 'POST', credentials)
+    paths = ['/api/projects', f'/api/projects/{project_id}']
+    n = 0
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        try:
+            with opener.open(base_url + paths[n % len(paths)], timeout=30) as response:
+                response.read()
+            latencies.append(time.perf_counter() - started)
+        except (urllib.error.URLError, OSError):
+            errors.append(1)
+        n += 1
+
+
+def percentile(values, p):
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', default='http://localhost:5009')
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=20)
+    parser.add_argument('--sections', type=int, default=10)
+    parser.add_argument('--items', type=int, default=20)
+    args = parser.parse_args()
+
+    base_url = args.url.rstrip('/')
+    credentials, project_id = seed(base_url, args.sections, args.items)
+
+    latencies, errors = [], []
+    deadline = time.perf_counter() + args.duration
+    threads = [threading.Thread(target=worker, args=(base_url, credentials, project_id, deadline, latencies, errors))
+               for _ in range(args.concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    latencies.sort()
+    print(f'{len(latencies)} requests in {args.duration:.0f}s with {args.concurrency} clients, {len(errors)} errors')
+    if latencies:
+        print(f'throughput: {len(latencies) / args.duration:.1f} req/s')
+        print(f'latency ms: p50 {percentile(latencies, 50) * 1000:.1f}  '
+              f'p95 {percentile(latencies, 95) * 1000:.1f}  p99 {percentile(latencies, 99) * 1000:.1f}')
+
+
+if __name__ == '__main__':
+    main()
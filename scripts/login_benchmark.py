@@ -0,0 +1,80 @@
+"""Login throughput under concurrency, and what it does to other requests.
+
+Start the server with rate limits off, once hashing inline and once in the pool:
+
+    RATE_LIMIT_ENABLED=0 PASSWORD_HASH_WORKERS=0 python main.py
+    RATE_LIMIT_ENABLED=0 PASSWORD_HASH_WORKERS=2 python main.py
+
+    python scripts/login_benchmark.py --url http://localhost:5009 --concurrency 16 --duration 20
+
+Client threads log in as fast as they can, while one probe thread calls the
+cheap /api/auth/me endpoint. The probe latency shows how much the hashing
+starves unrelated requests.
+"""
+import argparse
+import threading
+import time
+import urllib.error
+import uuid
+from load_test import make_opener, call, percentile
+
+
+def login_worker(base_url, credentials, deadline, latencies, statuses):
+    opener = make_opener()
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        try:
+            call(opener, f'{base_url}/api/auth/login', 'POST', credentials)
+            latencies.append(time.perf_counter() - started)
+        except urllib.error.HTTPError as e:
+            statuses.append(e.code)
+        except (urllib.error.URLError, OSError):
+            statuses.append('error')
+
+
+def probe_worker(base_url, credentials, deadline, latencies):
+    opener = make_opener()
+    call(opener, f'{base_url}/api/auth/login', 'POST', credentials)
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        with opener.open(f'{base_url}/api/auth/me', timeout=30) as response:
+            response.read()
+        latencies.append(time.perf_counter() - started)
+        time.sleep(0.05)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', default='http://localhost:5009')
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=20)
+    args = parser.parse_args()
+
+    base_url = args.url.rstrip('/')
+    username = f'bench-{uuid.uuid4().hex[:8]}'
+    credentials = {'username': username, 'password': 'benchmark-password'}
+    call(make_opener(), f'{base_url}/api/auth/register', 'POST', dict(credentials, email=f'{username}@example.com'))
+
+    logins, statuses, probes = [], [], []
+    deadline = time.perf_counter() + args.duration
+    threads = [threading.Thread(target=login_worker, args=(base_url, credentials, deadline, logins, statuses))
+               for _ in range(args.concurrency)]
+    threads.append(threading.Thread(target=probe_worker, args=(base_url, credentials, deadline, probes)))
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    logins.sort()
+    probes.sort()
+    print(f'{len(logins)} logins in {args.duration:.0f}s with {args.concurrency} clients '
+          f'({len(logins) / args.duration:.1f}/s), {len(statuses)} rejected {sorted(set(statuses), key=str)}')
+    if logins:
+        print(f'login ms:    p50 {percentile(logins, 50) * 1000:.1f}  p95 {percentile(logins, 95) * 1000:.1f}')
+    if probes:
+        print(f'/auth/me ms: p50 {percentile(probes, 50) * 1000:.1f}  p95 {percentile(probes, 95) * 1000:.1f}  '
+              f'p99 {percentile(probes, 99) * 1000:.1f}')
+
+
+if __name__ == '__main__':
+    main()
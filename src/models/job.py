@@ -0,0 +1,46 @@
+from datetime import datetime
+from src.models.user import db
+
+class Job(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(50), nullable=False)  # a handler registered in src/services/jobs.py
+    # No foreign key: a delete_project job outlives its project
+    project_id = db.Column(db.Integer, nullable=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    status = db.Column(db.String(20), default='queued', nullable=False)  # 'queued', 'running', 'succeeded', 'failed'
+    params = db.Column(db.JSON)
+    checkpoint = db.Column(db.JSON)  # where the next step resumes; saved with each step's work
+    progress = db.Column(db.Integer, default=0, nullable=False)
+    total = db.Column(db.Integer)
+    result = db.Column(db.JSON)
+    error = db.Column(db.Text)
+    attempts = db.Column(db.Integer, default=0, nullable=False)
+    locked_by = db.Column(db.String(100))
+    locked_until = db.Column(db.DateTime)  # lease; a running job past it is taken over by another worker
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+
+    __table_args__ = (
+        # Workers look for the oldest queued (or abandoned) job
+        db.Index('ix_job_status_id', 'status', 'id'),
+    )
+
+    def __repr__(self):
+        return f'<Job {self.id} {self.kind} {self.status}>'
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'project_id': self.project_id,
+            'status': self.status,
+            'progress': self.progress,
+            'total': self.total,
+            'result': self.result,
+            'error': self.error,
+            'attempts': self.attempts,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
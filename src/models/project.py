@@ -8,10 +8,14 @@ class Project(db.Model):
     owner_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    revision = db.Column(db.Integer, default=0, nullable=False)  # bumped on every write to the project tree
+    version = db.Column(db.Integer, default=1, nullable=False)  # bumped by edits to the project itself, for If-Match
+    deleting = db.Column(db.Boolean, default=False, nullable=False)  # set by DELETE until the delete job removes the row
     
     # Relationships
     sections = db.relationship('Section', backref='project', lazy=True, cascade='all, delete-orphan')
     members = db.relationship('ProjectMember', backref='project', lazy=True, cascade='all, delete-orphan')
+    changes = db.relationship('ProjectChange', backref='project', lazy=True, cascade='all, delete-orphan')
 
     def __repr__(self):
         return f'<Project {self.name}>'
@@ -24,6 +28,8 @@ class Project(db.Model):
             'owner_id': self.owner_id,
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'updated_at': self.updated_at.isoformat() if self.updated_at else None,
+            'revision': self.revision,
+            'version': self.version,
             'owner': self.owner.to_dict() if self.owner else None
         }
         
@@ -39,7 +45,11 @@ class ProjectMember(db.Model):
     role = db.Column(db.String(20), default='member')  # 'owner', 'editor', 'viewer'
     joined_at = db.Column(db.DateTime, default=datetime.utcnow)
     
-    __table_args__ = (db.UniqueConstraint('project_id', 'user_id'),)
+    __table_args__ = (
+        db.UniqueConstraint('project_id', 'user_id'),
+        # get_projects looks memberships up by user first
+        db.Index('ix_project_member_user_project', 'user_id', 'project_id'),
+    )
 
     def __repr__(self):
         return f'<ProjectMember {self.user_id} in {self.project_id}>'
@@ -54,3 +64,25 @@ class ProjectMember(db.Model):
             'user': self.user.to_dict() if self.user else None
         }
 
+class ProjectChange(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    project_id = db.Column(db.Integer, db.ForeignKey('project.id'), nullable=False)
+    revision = db.Column(db.Integer, nullable=False)
+    entity_type = db.Column(db.String(20), nullable=False)  # 'project', 'section', 'item'
+    entity_id = db.Column(db.Integer, nullable=False)
+    action = db.Column(db.String(20), nullable=False)  # 'created', 'updated', 'deleted'
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (db.Index('ix_project_change_project_revision', 'project_id', 'revision'),)
+
+    def __repr__(self):
+        return f'<ProjectChange {self.entity_type}:{self.entity_id} {self.action} r{self.revision}>'
+
+    def to_dict(self):
+        return {
+            'revision': self.revision,
+            'entity_type': self.entity_type,
+            'entity_id': self.entity_id,
+            'action': self.action,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
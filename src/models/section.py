@@ -8,9 +8,13 @@ class Section(db.Model):
     priority = db.Column(db.String(20), default='medium')  # 'critical', 'high', 'medium', 'low'
     order_index = db.Column(db.Integer, default=0)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    version = db.Column(db.Integer, default=1, nullable=False)  # bumped by every content edit, for If-Match
     
     # Relationships
     items = db.relationship('Item', backref='section', lazy=True, cascade='all, delete-orphan')
+    
+    # Sections are always read per project in order (get_project, listing, max(order_index))
+    __table_args__ = (db.Index('ix_section_project_order', 'project_id', 'order_index'),)
 
     def __repr__(self):
         return f'<Section {self.name}>'
@@ -22,6 +26,7 @@ class Section(db.Model):
             'name': self.name,
             'priority': self.priority,
             'order_index': self.order_index,
+            'version': self.version,
             'created_at': self.created_at.isoformat() if self.created_at else None
         }
         
@@ -43,9 +48,17 @@ class Item(db.Model):
     order_index = db.Column(db.Integer, default=0)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    version = db.Column(db.Integer, default=1, nullable=False)  # bumped by every content edit, for If-Match
     
     # Self-referential relationship for hierarchical structure
     children = db.relationship('Item', backref=db.backref('parent', remote_side=[id]), lazy=True, cascade='all, delete-orphan')
+    
+    __table_args__ = (
+        # Sibling lookups within a section: create_item's max(order_index), top-level listing, tree loads
+        db.Index('ix_item_section_parent_order', 'section_id', 'parent_id', 'order_index'),
+        # Children of an item: subtree CTE recursion, child listing
+        db.Index('ix_item_parent_order', 'parent_id', 'order_index'),
+    )
 
     def __repr__(self):
         return f'<Item {self.text[:50]}>'
@@ -60,6 +73,7 @@ class Item(db.Model):
             'priority': self.priority,
             'type': self.type,
             'order_index': self.order_index,
+            'version': self.version,
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'updated_at': self.updated_at.isoformat() if self.updated_at else None
         }
@@ -69,3 +83,16 @@ class Item(db.Model):
             
         return result
 
+class SectionStat(db.Model):
+    # Item counts per section broken down by priority and type, kept current by the write paths
+    id = db.Column(db.Integer, primary_key=True)
+    project_id = db.Column(db.Integer, db.ForeignKey('project.id'), nullable=False, index=True)
+    section_id = db.Column(db.Integer, db.ForeignKey('section.id'), nullable=False)
+    priority = db.Column(db.String(20), nullable=False)
+    type = db.Column(db.String(20), nullable=False)
+    count = db.Column(db.Integer, nullable=False, default=0)
+    
+    __table_args__ = (db.UniqueConstraint('section_id', 'priority', 'type'),)
+
+    def __repr__(self):
+        return f'<SectionStat {self.section_id} {self.priority}/{self.type}={self.count}>'
@@ -0,0 +1,36 @@
+from flask import Blueprint, request, jsonify, g
+from src.models.user import db
+from src.models.job import Job
+from src.services.access import require_user
+
+job_bp = Blueprint('job', __name__)
+
+MAX_PAGE_SIZE = 100
+
+def job_accepted(job):
+    """202 response pointing at the job's status URL."""
+    return jsonify({'job': job.to_dict()}), 202, {'Location': f'/api/jobs/{job.id}'}
+
+@job_bp.route('/jobs', methods=['GET'])
+@require_user
+def list_jobs():
+    limit = min(max(request.args.get('limit', 20, type=int), 1), MAX_PAGE_SIZE)
+
+    # The caller's own jobs, newest first
+    jobs = db.session.execute(
+        db.select(Job).where(Job.user_id == g.user_id).order_by(Job.id.desc()).limit(limit)
+    ).scalars().all()
+
+    return jsonify([job.to_dict() for job in jobs]), 200
+
+@job_bp.route('/jobs/<int:job_id>', methods=['GET'])
+@require_user
+def get_job(job_id):
+    job = db.session.get(Job, job_id)
+    # Someone else's job is reported as missing, like a project the caller can't see
+    if not job or job.user_id != g.user_id:
+        return jsonify({'error': 'Job not found'}), 404
+
+    response = jsonify(job.to_dict())
+    response.headers['Cache-Control'] = 'no-store'
+    return response, 200
@@ -1,41 +1,71 @@
-from flask import Blueprint, request, jsonify, session
+import json
+from flask import Blueprint, request, jsonify, g, current_app, stream_with_context
 from src.models.user import db
 from src.models.project import Project, ProjectMember
-from src.models.section import Section, Item
+from src.services.tree import build_project_tree, build_compact_tree, COMPACT_ITEM_FIELDS
+from src.services.serialization import COMPACT_MIMETYPE, wants_compact, json_bytes
+from src.services.access import require_access, require_user, membership_cache
+from src.services.cache import project_cache
+from src.services.routing import read_only
+from src.routes.job import job_accepted
+from src.services import jobs, stats
+from src.services.realtime import change_hub, iter_events, fallback_event, queue_changes, FALLBACK_POLL_SECONDS
+from src.services.versioning import (
+    VersionConflict, RowDeleted, expected_version, conditional_update, conflict_response, version_etag
+)
+from src.services.export import iter_export_json, iter_export_ndjson, iter_chunks, iter_gzip
+from src.services.importer import (
+    ProjectImporter, import_ndjson, import_document, DEFAULT_CHUNK_SIZE
+)
+from src.services.revisions import (
+    record_change, collect_changes, project_etag, projects_list_etag,
+    etag_matches, not_modified, with_etag
+)
 
 project_bp = Blueprint('project', __name__)
 
-def require_auth():
-    user_id = session.get('user_id')
-    if not user_id:
-        return None
-    return user_id
-
 @project_bp.route('/projects', methods=['GET'])
+@read_only
+@require_user
 def get_projects():
-    user_id = require_auth()
-    if not user_id:
-        return jsonify({'error': 'Not authenticated'}), 401
+    user_id = g.user_id
     
     # Get projects where user is owner or member
     projects = db.session.query(Project).join(ProjectMember).filter(
-        ProjectMember.user_id == user_id
-    ).all()
+        ProjectMember.user_id == user_id,
+        Project.deleting.is_(False)
+    ).order_by(Project.id).all()
     
-    # Return projects array directly (not wrapped in object)
-    return jsonify([{
+    etag = projects_list_etag(user_id, projects)
+    if request.args.get('include_stats') == 'true':
+        etag += '-stats'
+    if etag_matches(etag):
+        return not_modified(etag)
+    
+    projects_data = [{
         'id': p.id,
         'name': p.name,
         'description': p.description,
         'created_at': p.created_at.isoformat(),
-        'updated_at': p.updated_at.isoformat()
-    } for p in projects]), 200
+        'updated_at': p.updated_at.isoformat(),
+        'revision': p.revision,
+        'version': p.version
+    } for p in projects]
+    
+    # Optional per-project counts from the counter rows, one grouped query for all projects
+    if request.args.get('include_stats') == 'true' and projects:
+        project_stats = stats.projects_stats([p.id for p in projects])
+        for project_data in projects_data:
+            project_data['stats'] = project_stats[project_data['id']]
+    
+    # Return projects array directly (not wrapped in object)
+    response = jsonify(projects_data)
+    return with_etag(response, etag), 200
 
 @project_bp.route('/projects', methods=['POST'])
+@require_user
 def create_project():
-    user_id = require_auth()
-    if not user_id:
-        return jsonify({'error': 'Not authenticated'}), 401
+    user_id = g.user_id
     
     try:
         data = request.get_json()
@@ -64,6 +94,7 @@ def create_project():
         
         db.session.add(member)
         db.session.commit()
+        membership_cache.invalidate(user_id, project.id)
         
         # Return project object directly
         return jsonify({
@@ -71,7 +102,8 @@ def create_project():
             'name': project.name,
             'description': project.description,
             'created_at': project.created_at.isoformat(),
-            'updated_at': project.updated_at.isoformat()
+            'updated_at': project.updated_at.isoformat(),
+            'version': project.version
         }), 201
         
     except Exception as e:
@@ -79,132 +111,238 @@ def create_project():
         return jsonify({'error': str(e)}), 500
 
 @project_bp.route('/projects/<int:project_id>', methods=['GET'])
+@read_only
+@require_access('project')
 def get_project(project_id):
-    user_id = require_auth()
-    if not user_id:
-        return jsonify({'error': 'Not authenticated'}), 401
+    project = Project.query.get(project_id)
+    if not project:
+        return jsonify({'error': 'Project not found'}), 404
     
-    # Check if user has access to project
-    member = ProjectMember.query.filter_by(
-        project_id=project_id,
-        user_id=user_id
-    ).first()
+    # Accept: application/vnd.pseudocode.compact+json selects flat item rows per section
+    fmt, mimetype = ('compact', COMPACT_MIMETYPE) if wants_compact(request) else ('json', 'application/json')
     
-    if not member:
-        return jsonify({'error': 'Access denied'}), 403
+    # Answer conditional requests before touching sections or items
+    etag = project_etag(project) + ('-compact' if fmt == 'compact' else '')
+    if etag_matches(etag):
+        return vary_accept(not_modified(etag))
     
+    payload = project_cache.get(project_id, project.revision, fmt)
+    if payload is None:
+        result = {
+            'id': project.id,
+            'name': project.name,
+            'description': project.description,
+            'created_at': project.created_at.isoformat(),
+            'updated_at': project.updated_at.isoformat(),
+            'revision': project.revision,
+            'version': project.version
+        }
+        # Get sections with items (constant number of queries)
+        if fmt == 'compact':
+            result['item_fields'] = COMPACT_ITEM_FIELDS
+            result['sections'] = build_compact_tree(project_id)
+        else:
+            result['sections'] = build_project_tree(project_id)
+        payload = json_bytes(result)
+        project_cache.set(project_id, project.revision, payload, fmt)
+    
+    # Return project data directly (not wrapped in object)
+    response = current_app.response_class(payload, mimetype=mimetype)
+    return vary_accept(with_etag(response, etag)), 200
+
+def vary_accept(response):
+    response.vary.add('Accept')
+    return response
+
+@project_bp.route('/projects/<int:project_id>/stats', methods=['GET'])
+@read_only
+@require_access('project')
+def get_project_stats(project_id):
+    return jsonify(dict(stats.project_stats(project_id), id=project_id)), 200
+
+@project_bp.route('/projects/<int:project_id>/changes', methods=['GET'])
+@read_only
+@require_access('project')
+def get_project_changes(project_id):
     project = Project.query.get(project_id)
     if not project:
         return jsonify({'error': 'Project not found'}), 404
     
-    # Get sections with items
-    sections = Section.query.filter_by(project_id=project_id).order_by(Section.order_index).all()
-    
-    sections_data = []
-    for section in sections:
-        items = Item.query.filter_by(section_id=section.id, parent_id=None).order_by(Item.order_index).all()
-        
-        def get_item_with_children(item):
-            children = Item.query.filter_by(parent_id=item.id).order_by(Item.order_index).all()
-            return {
-                'id': item.id,
-                'text': item.text,
-                'description': item.description,
-                'priority': item.priority,
-                'type': item.type,
-                'order_index': item.order_index,
-                'children': [get_item_with_children(child) for child in children]
-            }
-        
-        sections_data.append({
-            'id': section.id,
-            'name': section.name,
-            'priority': section.priority,
-            'order_index': section.order_index,
-            'items': [get_item_with_children(item) for item in items]
-        })
+    since = request.args.get('since', type=int)
+    if since is None or since < 0:
+        return jsonify({'error': 'since must be a non-negative revision number'}), 400
     
-    # Return project data directly (not wrapped in object)
-    return jsonify({
+    if since > project.revision:
+        return jsonify({'error': 'Revision is ahead of the project', 'revision': project.revision}), 409
+    
+    changes = collect_changes(project_id, since)
+    
+    result = {
         'id': project.id,
-        'name': project.name,
-        'description': project.description,
-        'created_at': project.created_at.isoformat(),
-        'updated_at': project.updated_at.isoformat(),
-        'sections': sections_data
-    }), 200
+        'since': since,
+        'revision': project.revision,
+        'sections': changes['sections'],
+        'items': changes['items'],
+        'deleted': changes['deleted']
+    }
+    if changes['project_changed']:
+        result['project'] = {
+            'id': project.id,
+            'name': project.name,
+            'description': project.description,
+            'updated_at': project.updated_at.isoformat(),
+            'version': project.version
+        }
+    
+    return jsonify(result), 200
 
-@project_bp.route('/projects/<int:project_id>', methods=['PUT'])
-def update_project(project_id):
-    user_id = require_auth()
-    if not user_id:
-        return jsonify({'error': 'Not authenticated'}), 401
+@project_bp.route('/projects/<int:project_id>/events', methods=['GET'])
+@require_access('project')
+def project_events(project_id):
+    # Server-sent events; each message is a coalesced batch of changes up to a revision.
+    # The stream must not hold on to the request's DB session, so no stream_with_context.
+    headers = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    if not change_hub.open_stream():
+        # Every stream holds a worker thread; past the cap, clients poll /changes instead
+        poll_seconds = current_app.config.get('REALTIME_POLL_SECONDS', FALLBACK_POLL_SECONDS)
+        return current_app.response_class(fallback_event(poll_seconds), mimetype='text/event-stream', headers=headers)
+    
+    response = current_app.response_class(iter_events(project_id), mimetype='text/event-stream', headers=headers)
+    # Runs once the server is done with the response, even if the client left before it started
+    response.call_on_close(change_hub.close_stream)
+    return response
+
+@project_bp.route('/projects/<int:project_id>/export', methods=['GET'])
+@read_only
+@require_access('project')
+def export_project(project_id):
+    project = Project.query.get(project_id)
+    if not project:
+        return jsonify({'error': 'Project not found'}), 404
     
-    # Check if user is owner
-    member = ProjectMember.query.filter_by(
-        project_id=project_id,
-        user_id=user_id,
-        role='owner'
-    ).first()
+    export_format = request.args.get('format', 'json')
+    if export_format == 'json':
+        records, mimetype, extension = iter_export_json(project), 'application/json', 'json'
+    elif export_format == 'ndjson':
+        records, mimetype, extension = iter_export_ndjson(project), 'application/x-ndjson', 'ndjson'
+    else:
+        return jsonify({'error': 'format must be json or ndjson'}), 400
     
-    if not member:
-        return jsonify({'error': 'Access denied'}), 403
+    # Stream the document as it is read instead of building it in memory
+    body = iter_chunks(records)
+    headers = {
+        'Content-Disposition': f'attachment; filename="project-{project_id}.{extension}"',
+        'Cache-Control': 'no-store'
+    }
+    if request.args.get('gzip') in ('1', 'true'):
+        body = iter_gzip(body)
+        headers['Content-Encoding'] = 'gzip'
+    
+    return current_app.response_class(stream_with_context(body), mimetype=mimetype, headers=headers)
+
+@project_bp.route('/projects/<int:project_id>/import', methods=['POST'])
+@require_access('project')
+def import_project(project_id):
+    chunk_size = request.args.get('chunk_size', DEFAULT_CHUNK_SIZE, type=int)
+    if chunk_size < 1:
+        return jsonify({'error': 'chunk_size must be positive'}), 400
+    
+    importer = ProjectImporter(project_id, chunk_size=chunk_size)
     
+    try:
+        if request.mimetype == 'application/x-ndjson':
+            # Parsed line by line straight from the request body
+            import_ndjson(importer, (line.decode('utf-8') for line in request.stream))
+        else:
+            import_document(importer, json.load(request.stream))
+        
+        result = importer.finish()
+        return jsonify(dict(result, message='Project imported successfully')), 201
+        
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({
+            'error': str(e),
+            'imported_sections': importer.section_count,
+            'imported_items': importer.item_count
+        }), 400
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+@project_bp.route('/projects/<int:project_id>', methods=['PUT'])
+@require_access('project', roles=('owner',))
+def update_project(project_id):
     try:
         project = Project.query.get(project_id)
         if not project:
             return jsonify({'error': 'Project not found'}), 404
         
         data = request.get_json()
-        project.name = data.get('name', project.name)
-        project.description = data.get('description', project.description)
+        values = {field: data[field] for field in ('name', 'description') if field in data}
+        project = conditional_update(Project, project, values, expected_version(data, 'project', project_id))
         
+        revision = record_change(project_id, 'project', project_id, 'updated')
         db.session.commit()
         
         # Return project object directly
-        return jsonify({
+        response = jsonify({
             'id': project.id,
             'name': project.name,
             'description': project.description,
-            'updated_at': project.updated_at.isoformat()
-        }), 200
+            'updated_at': project.updated_at.isoformat(),
+            'revision': revision,
+            'version': project.version
+        })
+        response.set_etag(version_etag('project', project.id, project.version))
+        return response, 200
         
+    except VersionConflict as e:
+        db.session.rollback()
+        return conflict_response('project', e.current)
+    except RowDeleted:
+        db.session.rollback()
+        return jsonify({'error': 'Project not found'}), 404
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
 @project_bp.route('/projects/<int:project_id>', methods=['DELETE'])
+@require_access('project', roles=('owner',), allow_deleting=True)
 def delete_project(project_id):
-    user_id = require_auth()
-    if not user_id:
-        return jsonify({'error': 'Not authenticated'}), 401
-    
-    # Check if user is owner
-    member = ProjectMember.query.filter_by(
-        project_id=project_id,
-        user_id=user_id,
-        role='owner'
-    ).first()
-    
-    if not member:
-        return jsonify({'error': 'Access denied'}), 403
-    
     try:
-        project = Project.query.get(project_id)
-        if not project:
-            return jsonify({'error': 'Project not found'}), 404
+        # Hidden from now on; only the first request marks it, repeats get the job already under way
+        marked = db.session.execute(
+            db.update(Project).where(Project.id == project_id, Project.deleting.is_(False)).values(deleting=True)
+        ).rowcount
+        job = None if marked else jobs.pending('delete_project', project_id)
+        if job is None:
+            # Marked just now, or marked before by a job that since failed; unless it already finished
+            if not marked and not db.session.get(Project, project_id):
+                return jsonify({'error': 'Project not found'}), 404
+            # Deleted in chunks by a background job (see delete_project_step); poll /api/jobs/<id>
+            job = jobs.enqueue('delete_project', g.user_id, project_id=project_id)
+        queue_changes(project_id, None, [('project', project_id, 'deleted')])
+        db.session.commit()
+        membership_cache.invalidate(project_id=project_id)
+        project_cache.invalidate(project_id)
         
-        # Delete all related data (cascade should handle this, but being explicit)
-        sections = Section.query.filter_by(project_id=project_id).all()
-        for section in sections:
-            Item.query.filter_by(section_id=section.id).delete()
-            db.session.delete(section)
+        return job_accepted(job)
         
-        ProjectMember.query.filter_by(project_id=project_id).delete()
-        db.session.delete(project)
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+@project_bp.route('/projects/<int:project_id>/reindex', methods=['POST'])
+@require_access('project', roles=('owner',))
+def reindex_project(project_id):
+    try:
+        job = jobs.enqueue('reindex_project', g.user_id, project_id=project_id)
         db.session.commit()
-        
-        return jsonify({'message': 'Project deleted successfully'}), 200
+        return job_accepted(job)
         
     except Exception as e:
         db.session.rollback()
@@ -0,0 +1,46 @@
+from flask import Blueprint, request, jsonify, g
+from src.models.user import db
+from src.models.project import Project, ProjectMember
+from src.services import search as search_index
+from src.services.access import require_user
+from src.services.routing import read_only
+
+search_bp = Blueprint('search', __name__)
+
+MAX_PAGE_SIZE = 100
+
+@search_bp.route('/search', methods=['GET'])
+@read_only
+@require_user
+def search():
+    user_id = g.user_id
+    
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({'error': 'q is required'}), 400
+    
+    limit = min(max(request.args.get('limit', 20, type=int), 1), MAX_PAGE_SIZE)
+    offset = max(request.args.get('offset', 0, type=int), 0)
+    
+    # Only search projects the caller is a member of
+    project_ids = set(db.session.execute(
+        db.select(ProjectMember.project_id).join(Project, Project.id == ProjectMember.project_id)
+        .where(ProjectMember.user_id == user_id, Project.deleting.is_(False))
+    ).scalars())
+    
+    project_id = request.args.get('project_id', type=int)
+    if project_id is not None:
+        if project_id not in project_ids:
+            return jsonify({'error': 'Access denied'}), 403
+        project_ids = {project_id}
+    
+    # Fetch one extra row to know whether another page exists
+    results = search_index.search(query, project_ids, limit=limit + 1, offset=offset)
+    
+    return jsonify({
+        'query': query,
+        'results': results[:limit],
+        'limit': limit,
+        'offset': offset,
+        'next_offset': offset + limit if len(results) > limit else None
+    }), 200
@@ -1,32 +1,99 @@
-from flask import Blueprint, request, jsonify, session
+from flask import Blueprint, request, jsonify, g
 from src.models.user import db
-from src.models.project import ProjectMember
 from src.models.section import Section, Item
+from src.services.revisions import record_change, record_changes
+from src.services.access import require_access, require_user, has_project_access
+from src.services.tree import delete_subtree, fetch_subtree, count_subtree, subtree_cte, expand_items
+from src.services.pagination import page_args, keyset_page
+from src.services.routing import read_only, router
+from src.services.ordering import next_order_index, place
+from src.services.batch import BatchWriter, BatchError, BatchConflict, BatchNotFound
+from src.services.versioning import (
+    VersionConflict, RowDeleted, expected_version, conditional_update, conflict_response, version_etag
+)
+from src.services import search, stats
+from src.services.stats import StatDeltas
 
 section_bp = Blueprint('section', __name__)
 
-def require_auth():
-    user_id = session.get('user_id')
-    if not user_id:
-        return None
-    return user_id
+MAX_DEPTH = 10
 
-def check_project_access(project_id, user_id):
-    member = ProjectMember.query.filter_by(
-        project_id=project_id,
-        user_id=user_id
-    ).first()
-    return member is not None
+def depth_arg():
+    return min(max(request.args.get('depth', 1, type=int), 1), MAX_DEPTH)
 
-@section_bp.route('/projects/<int:project_id>/sections', methods=['POST'])
-def create_section(project_id):
-    user_id = require_auth()
-    if not user_id:
-        return jsonify({'error': 'Not authenticated'}), 401
+def move_args(data, id_fields):
+    """The body's 'moves', checked to be objects with integer ids; raises ValueError."""
+    moves = data.get('moves') if isinstance(data, dict) else None
+    if not isinstance(moves, list) or not moves:
+        raise ValueError('moves must be a non-empty list')
+    for index, move in enumerate(moves):
+        if not isinstance(move, dict):
+            raise ValueError(f'Move {index} must be an object')
+        for field in id_fields:
+            value = move.get(field)
+            # bool is an int subclass, but true is not an id
+            if (field == 'id' or value is not None) and (not isinstance(value, int) or isinstance(value, bool)):
+                raise ValueError(f'Move {index} {field} must be an integer')
+    return moves
+
+@section_bp.route('/projects/<int:project_id>/sections', methods=['GET'])
+@read_only
+@require_access('project')
+def list_sections(project_id):
+    try:
+        limit, after = page_args(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     
-    if not check_project_access(project_id, user_id):
-        return jsonify({'error': 'Access denied'}), 403
+    sections, next_cursor = keyset_page(Section.query.filter_by(project_id=project_id), Section, limit, after)
+    
+    return jsonify({
+        'sections': [section.to_dict() for section in sections],
+        'next_cursor': next_cursor
+    }), 200
+
+@section_bp.route('/sections/<int:section_id>/items', methods=['GET'])
+@read_only
+@require_access('section')
+def list_items(section_id):
+    section = g.section
     
+    try:
+        limit, after = page_args(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    # Top-level items are paginated; `depth` pulls in that many levels below them
+    items, next_cursor = keyset_page(
+        Item.query.filter_by(section_id=section_id, parent_id=None), Item, limit, after
+    )
+    
+    return jsonify({
+        'items': expand_items(items, depth_arg()),
+        'next_cursor': next_cursor
+    }), 200
+
+@section_bp.route('/items/<int:item_id>/children', methods=['GET'])
+@read_only
+@require_access('item')
+def list_children(item_id):
+    item = g.item
+    
+    try:
+        limit, after = page_args(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    children, next_cursor = keyset_page(Item.query.filter_by(parent_id=item_id), Item, limit, after)
+    
+    return jsonify({
+        'items': expand_items(children, depth_arg()),
+        'next_cursor': next_cursor
+    }), 200
+
+@section_bp.route('/projects/<int:project_id>/sections', methods=['POST'])
+@require_access('project')
+def create_section(project_id):
     try:
         data = request.get_json()
         name = data.get('name')
@@ -42,19 +109,24 @@ def create_section(project_id):
             project_id=project_id,
             name=name,
             priority=priority,
-            order_index=max_order + 1
+            order_index=next_order_index(max_order)
         )
         
         db.session.add(section)
+        db.session.flush()  # Get the section ID
+        search.index_sections([section.id])
+        revision = record_change(project_id, 'section', section.id, 'created')
         db.session.commit()
         
         return jsonify({
             'message': 'Section created successfully',
+            'revision': revision,
             'section': {
                 'id': section.id,
                 'name': section.name,
                 'priority': section.priority,
-                'order_index': section.order_index
+                'order_index': section.order_index,
+                'version': section.version
             }
         }), 201
         
@@ -62,19 +134,46 @@ def create_section(project_id):
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
+@section_bp.route('/projects/<int:project_id>/batch', methods=['POST'])
+@require_access('project')
+def batch_write(project_id):
+    data = request.get_json() or {}
+    operations = data.get('operations')
+    if not isinstance(operations, list) or not operations:
+        return jsonify({'error': 'operations must be a non-empty list'}), 400
+    
+    try:
+        writer = BatchWriter(project_id)
+        id_map, changes = writer.apply(operations)
+        search.sync_index(changes, removed_items=writer.removed_items)
+        stats.apply_deltas(writer.stat_deltas)
+        revision = record_changes(project_id, changes)
+        db.session.commit()
+        
+        return jsonify({
+            'message': 'Batch applied successfully',
+            'revision': revision,
+            'operations': len(operations),
+            'id_map': id_map
+        }), 200
+        
+    except BatchConflict as e:
+        db.session.rollback()
+        return jsonify({'error': str(e), 'operation': e.index, 'current': e.current.to_dict()}), 409
+    except BatchNotFound as e:
+        db.session.rollback()
+        return jsonify({'error': str(e), 'operation': e.index}), 404
+    except BatchError as e:
+        db.session.rollback()
+        return jsonify({'error': str(e), 'operation': e.index}), 400
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
 @section_bp.route('/sections/<int:section_id>/items', methods=['POST'])
+@require_access('section')
 def create_item(section_id):
-    user_id = require_auth()
-    if not user_id:
-        return jsonify({'error': 'Not authenticated'}), 401
-    
-    # Check access through section's project
-    section = Section.query.get(section_id)
-    if not section:
-        return jsonify({'error': 'Section not found'}), 404
-    
-    if not check_project_access(section.project_id, user_id):
-        return jsonify({'error': 'Access denied'}), 403
+    section = g.section
     
     try:
         data = request.get_json()
@@ -104,14 +203,21 @@ def create_item(section_id):
             description=description,
             priority=priority,
             type=item_type,
-            order_index=max_order + 1
+            order_index=next_order_index(max_order)
         )
         
         db.session.add(item)
+        db.session.flush()  # Get the item ID
+        search.index_items([item.id])
+        deltas = StatDeltas()
+        deltas.add(section.project_id, section_id, item.priority, item.type)
+        stats.apply_deltas(deltas)
+        revision = record_change(section.project_id, 'item', item.id, 'created')
         db.session.commit()
         
         return jsonify({
             'message': 'Item created successfully',
+            'revision': revision,
             'item': {
                 'id': item.id,
                 'text': item.text,
@@ -119,7 +225,8 @@ def create_item(section_id):
                 'priority': item.priority,
                 'type': item.type,
                 'parent_id': item.parent_id,
-                'order_index': item.order_index
+                'order_index': item.order_index,
+                'version': item.version
             }
         }), 201
         
@@ -128,30 +235,28 @@ def create_item(section_id):
         return jsonify({'error': str(e)}), 500
 
 @section_bp.route('/items/<int:item_id>', methods=['PUT'])
+@require_access('item')
 def update_item(item_id):
-    user_id = require_auth()
-    if not user_id:
-        return jsonify({'error': 'Not authenticated'}), 401
-    
-    item = Item.query.get(item_id)
-    if not item:
-        return jsonify({'error': 'Item not found'}), 404
-    
-    section = Section.query.get(item.section_id)
-    if not check_project_access(section.project_id, user_id):
-        return jsonify({'error': 'Access denied'}), 403
+    item = g.item
     
     try:
         data = request.get_json()
-        item.text = data.get('text', item.text)
-        item.description = data.get('description', item.description)
-        item.priority = data.get('priority', item.priority)
-        item.type = data.get('type', item.type)
+        deltas = StatDeltas()
+        deltas.remove(g.project_id, item.section_id, item.priority, item.type)
+        
+        # Single UPDATE ... WHERE version = ?; a stale If-Match/expected_version gets a 409
+        values = {field: data[field] for field in ('text', 'description', 'priority', 'type') if field in data}
+        item = conditional_update(Item, item, values, expected_version(data, 'item', item_id))
         
+        deltas.add(g.project_id, item.section_id, item.priority, item.type)
+        stats.apply_deltas(deltas)
+        search.index_items([item.id])
+        revision = record_change(g.project_id, 'item', item.id, 'updated')
         db.session.commit()
         
-        return jsonify({
+        response = jsonify({
             'message': 'Item updated successfully',
+            'revision': revision,
             'item': {
                 'id': item.id,
                 'text': item.text,
@@ -159,101 +264,292 @@ def update_item(item_id):
                 'priority': item.priority,
                 'type': item.type,
                 'parent_id': item.parent_id,
-                'order_index': item.order_index
+                'order_index': item.order_index,
+                'version': item.version
             }
-        }), 200
+        })
+        response.set_etag(version_etag('item', item.id, item.version))
+        return response, 200
         
+    except VersionConflict as e:
+        db.session.rollback()
+        return conflict_response('item', e.current)
+    except RowDeleted:
+        db.session.rollback()
+        return jsonify({'error': 'Item not found'}), 404
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
-@section_bp.route('/items/<int:item_id>', methods=['DELETE'])
-def delete_item(item_id):
-    user_id = require_auth()
-    if not user_id:
-        return jsonify({'error': 'Not authenticated'}), 401
+@section_bp.route('/items/<int:item_id>/subtree', methods=['GET'])
+@read_only
+@require_access('item')
+def get_item_subtree(item_id):
+    item = g.item
     
-    item = Item.query.get(item_id)
-    if not item:
-        return jsonify({'error': 'Item not found'}), 404
+    if request.args.get('count_only') == 'true':
+        return jsonify({'id': item_id, 'count': count_subtree(item_id)}), 200
     
-    section = Section.query.get(item.section_id)
-    if not check_project_access(section.project_id, user_id):
-        return jsonify({'error': 'Access denied'}), 403
+    return jsonify({'item': fetch_subtree(item_id)}), 200
+
+@section_bp.route('/items/<int:item_id>', methods=['DELETE'])
+@require_access('item')
+def delete_item(item_id):
+    item = g.item
     
     try:
-        # Delete all child items recursively
-        def delete_children(parent_id):
-            children = Item.query.filter_by(parent_id=parent_id).all()
-            for child in children:
-                delete_children(child.id)
-                db.session.delete(child)
-        
-        delete_children(item.id)
-        db.session.delete(item)
+        # Delete the item and all its descendants in a single statement
+        deleted_rows = delete_subtree(item_id)
+        deleted_ids = [row.id for row in deleted_rows]
+        db.session.expunge(item)
+        deltas = StatDeltas()
+        deltas.remove_rows(g.project_id, deleted_rows)
+        stats.apply_deltas(deltas)
+        search.remove_items(deleted_ids)
+        revision = record_change(g.project_id, 'item', item_id, 'deleted')
         db.session.commit()
         
-        return jsonify({'message': 'Item deleted successfully'}), 200
+        return jsonify({
+            'message': 'Item deleted successfully',
+            'deleted_count': len(deleted_ids),
+            'revision': revision
+        }), 200
         
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
 @section_bp.route('/sections/<int:section_id>', methods=['PUT'])
+@require_access('section')
 def update_section(section_id):
-    user_id = require_auth()
-    if not user_id:
-        return jsonify({'error': 'Not authenticated'}), 401
-    
-    section = Section.query.get(section_id)
-    if not section:
-        return jsonify({'error': 'Section not found'}), 404
-    
-    if not check_project_access(section.project_id, user_id):
-        return jsonify({'error': 'Access denied'}), 403
+    section = g.section
     
     try:
         data = request.get_json()
-        section.name = data.get('name', section.name)
-        section.priority = data.get('priority', section.priority)
+        values = {field: data[field] for field in ('name', 'priority') if field in data}
+        section = conditional_update(Section, section, values, expected_version(data, 'section', section_id))
         
+        search.index_sections([section.id])
+        revision = record_change(section.project_id, 'section', section.id, 'updated')
         db.session.commit()
         
-        return jsonify({
+        response = jsonify({
             'message': 'Section updated successfully',
+            'revision': revision,
             'section': {
                 'id': section.id,
                 'name': section.name,
                 'priority': section.priority,
-                'order_index': section.order_index
+                'order_index': section.order_index,
+                'version': section.version
             }
-        }), 200
+        })
+        response.set_etag(version_etag('section', section.id, section.version))
+        return response, 200
         
+    except VersionConflict as e:
+        db.session.rollback()
+        return conflict_response('section', e.current)
+    except RowDeleted:
+        db.session.rollback()
+        return jsonify({'error': 'Section not found'}), 404
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
 @section_bp.route('/sections/<int:section_id>', methods=['DELETE'])
+@require_access('section')
 def delete_section(section_id):
-    user_id = require_auth()
-    if not user_id:
-        return jsonify({'error': 'Not authenticated'}), 401
+    section = g.section
     
-    section = Section.query.get(section_id)
-    if not section:
+    try:
+        # Delete all items in section
+        deleted_ids = db.session.execute(
+            db.delete(Item).where(Item.section_id == section_id).returning(Item.id),
+            execution_options={'synchronize_session': False}
+        ).scalars().all()
+        stats.remove_section(section_id)
+        db.session.delete(section)
+        search.remove_items(deleted_ids)
+        search.remove_sections([section_id])
+        revision = record_change(section.project_id, 'section', section_id, 'deleted')
+        db.session.commit()
+        
+        return jsonify({'message': 'Section deleted successfully', 'revision': revision}), 200
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+@section_bp.route('/sections/reorder', methods=['PUT'])
+@require_user
+def reorder_sections():
+    user_id = g.user_id
+    
+    try:
+        moves = move_args(request.get_json(silent=True) or {}, ('id', 'before_id', 'after_id'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    # Moves within one project share its shard; ids from another shard simply aren't found
+    router.use_id(moves[0]['id'])
+    sections = Section.query.filter(Section.id.in_([move['id'] for move in moves])).all()
+    sections_by_id = {section.id: section for section in sections}
+    if len(sections_by_id) != len({move['id'] for move in moves}):
         return jsonify({'error': 'Section not found'}), 404
     
-    if not check_project_access(section.project_id, user_id):
+    project_ids = {section.project_id for section in sections}
+    if len(project_ids) != 1:
+        return jsonify({'error': 'All sections must belong to the same project'}), 400
+    
+    project_id = project_ids.pop()
+    if not has_project_access(project_id, user_id):
         return jsonify({'error': 'Access denied'}), 403
     
     try:
-        # Delete all items in section
-        Item.query.filter_by(section_id=section_id).delete()
-        db.session.delete(section)
+        # Apply every move in order inside one transaction; a rebalance renumbers other sections too
+        changed_ids = set(sections_by_id)
+        for move in moves:
+            section = sections_by_id[move['id']]
+            changed_ids.update(place(section, {'project_id': project_id},
+                                     before_id=move.get('before_id'), after_id=move.get('after_id')))
+            db.session.flush()
+        
+        revision = record_changes(project_id, [('section', changed_id, 'updated') for changed_id in sorted(changed_ids)])
         db.session.commit()
         
-        return jsonify({'message': 'Section deleted successfully'}), 200
+        return jsonify({
+            'message': 'Sections reordered successfully',
+            'revision': revision,
+            'sections': [{
+                'id': section.id,
+                'order_index': section.order_index
+            } for section in sections]
+        }), 200
+        
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+@section_bp.route('/items/reorder', methods=['PUT'])
+@require_user
+def reorder_items():
+    user_id = g.user_id
+    
+    try:
+        moves = move_args(request.get_json(silent=True) or {},
+                          ('id', 'parent_id', 'section_id', 'before_id', 'after_id'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    router.use_id(moves[0]['id'])
+    
+    # Load moved items, target parents and target sections with their projects in one query each
+    item_ids = {move['id'] for move in moves}
+    parent_ids = {move['parent_id'] for move in moves if move.get('parent_id') is not None}
+    rows = db.session.query(Item, Section.project_id).join(
+        Section, Item.section_id == Section.id
+    ).filter(Item.id.in_(item_ids | parent_ids)).all()
+    items_by_id = {item.id: item for item, _ in rows}
+    project_ids = {project_id for _, project_id in rows}
+    
+    if not item_ids <= items_by_id.keys():
+        return jsonify({'error': 'Item not found'}), 404
+    if not parent_ids <= items_by_id.keys():
+        return jsonify({'error': 'Parent item not found'}), 404
+    
+    section_ids = {move['section_id'] for move in moves if move.get('section_id') is not None}
+    if section_ids:
+        sections = Section.query.filter(Section.id.in_(section_ids)).all()
+        if len(sections) != len(section_ids):
+            return jsonify({'error': 'Section not found'}), 404
+        project_ids |= {section.project_id for section in sections}
+    
+    if len(project_ids) != 1:
+        return jsonify({'error': 'All items must belong to the same project'}), 400
+    
+    project_id = project_ids.pop()
+    if not has_project_access(project_id, user_id):
+        return jsonify({'error': 'Access denied'}), 403
+    
+    try:
+        changed_ids = set()
+        deltas = StatDeltas()
+        for move in moves:
+            item = items_by_id[move['id']]
+            
+            # Resolve the target container; omitted keys keep the current one
+            if 'parent_id' in move:
+                parent_id = move['parent_id']
+            elif move.get('section_id') is not None:
+                parent_id = None
+            else:
+                parent_id = item.parent_id
+            
+            if parent_id is not None:
+                parent = items_by_id[parent_id]
+                subtree = subtree_cte(item.id)
+                in_subtree = db.session.execute(
+                    db.select(subtree.c.id).where(subtree.c.id == parent_id)
+                ).first()
+                if in_subtree:
+                    raise ValueError(f'Item {item.id} cannot be moved under its own descendant')
+                section_id = parent.section_id
+            else:
+                section_id = move.get('section_id') or item.section_id
+            
+            if section_id != item.section_id:
+                # Descendants follow their ancestor into the new section
+                subtree = subtree_cte(item.id)
+                moved = db.session.execute(
+                    db.update(Item)
+                    .where(Item.id.in_(db.select(subtree.c.id)), Item.id != item.id)
+                    .values(section_id=section_id)
+                    .returning(Item.id, Item.priority, Item.type),
+                    execution_options={'synchronize_session': 'fetch'}
+                ).all()
+                changed_ids.update(row.id for row in moved)
+                
+                # Counters follow the subtree from the old section to the new one
+                for row in moved + [item]:
+                    deltas.remove(project_id, item.section_id, row.priority, row.type)
+                    deltas.add(project_id, section_id, row.priority, row.type)
+            
+            item.section_id = section_id
+            item.parent_id = parent_id
+            changed_ids.update(place(item, {'section_id': section_id, 'parent_id': parent_id},
+                                     before_id=move.get('before_id'), after_id=move.get('after_id')))
+            db.session.flush()
+            changed_ids.add(item.id)
+        
+        stats.apply_deltas(deltas)
+        search.index_items(changed_ids)
+        revision = record_changes(project_id, [('item', changed_id, 'updated') for changed_id in sorted(changed_ids)])
+        db.session.commit()
         
+        return jsonify({
+            'message': 'Items reordered successfully',
+            'revision': revision,
+            'items': [{
+                'id': items_by_id[move['id']].id,
+                'section_id': items_by_id[move['id']].section_id,
+                'parent_id': items_by_id[move['id']].parent_id,
+                'order_index': items_by_id[move['id']].order_index
+            } for move in moves]
+        }), 200
+        
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
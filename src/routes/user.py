@@ -1,11 +1,27 @@
-from flask import Blueprint, request, jsonify, session
-from werkzeug.security import check_password_hash, generate_password_hash
+from flask import Blueprint, request, jsonify
 from src.models.user import db, User
+from src.services.auth import token_manager, current_identity, set_auth_cookie, clear_auth_cookie
+from src.services.passwords import password_hasher, HasherBusy
+from src.services.ratelimit import login_ip_limiter, login_user_limiter
 
 user_bp = Blueprint('user', __name__)
 
+def too_many_attempts(retry_after):
+    response = jsonify({'error': 'Too many attempts, try again later', 'retry_after': retry_after})
+    response.headers['Retry-After'] = str(retry_after)
+    return response, 429
+
+def hasher_busy():
+    response = jsonify({'error': 'Server busy, try again shortly'})
+    response.headers['Retry-After'] = '1'
+    return response, 503
+
 @user_bp.route('/auth/register', methods=['POST'])
 def register():
+    retry_after = login_ip_limiter.hit(f'ip:{request.remote_addr}')
+    if retry_after:
+        return too_many_attempts(retry_after)
+    
     try:
         data = request.get_json()
         username = data.get('username')
@@ -26,22 +42,27 @@ def register():
         user = User(
             username=username,
             email=email,
-            password_hash=generate_password_hash(password)
+            password_hash=password_hasher.hash(password)
         )
         
         db.session.add(user)
         db.session.commit()
         
         # Log user in
-        session['user_id'] = user.id
+        token = token_manager.issue(user)
         
-        # Return user object directly
-        return jsonify({
+        # Return user object directly; the token only for API clients that ask for it
+        body = {
             'id': user.id,
             'username': user.username,
             'email': user.email
-        }), 201
+        }
+        if data.get('return_token') is True:
+            body['token'] = token
+        return set_auth_cookie(jsonify(body), token), 201
         
+    except HasherBusy:
+        return hasher_busy()
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -55,40 +76,61 @@ def login():
         if not username or not password:
             return jsonify({'error': 'Missing username or password'}), 400
         
+        # Checked before any hashing, so a credential-stuffing burst is turned away cheaply
+        retry_after = (login_ip_limiter.hit(f'ip:{request.remote_addr}')
+                       or login_user_limiter.hit(f'user:{username.lower()}'))
+        if retry_after:
+            return too_many_attempts(retry_after)
+        
         user = User.query.filter_by(username=username).first()
+        if user is None:
+            password_hasher.verify_unknown(password)
         
-        if user and check_password_hash(user.password_hash, password):
-            session['user_id'] = user.id
-            # Return user object directly
-            return jsonify({
+        if user and password_hasher.verify(user.password_hash, password):
+            if password_hasher.needs_rehash(user.password_hash):
+                # Hashing parameters changed since this password was stored
+                user.password_hash = password_hasher.hash(password)
+                db.session.commit()
+            token = token_manager.issue(user)
+            # Return user object directly; the token only for API clients that ask for it
+            body = {
                 'id': user.id,
                 'username': user.username,
                 'email': user.email
-            }), 200
+            }
+            if data.get('return_token') is True:
+                body['token'] = token
+            return set_auth_cookie(jsonify(body), token), 200
         else:
             return jsonify({'error': 'Invalid credentials'}), 401
             
+    except HasherBusy:
+        return hasher_busy()
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @user_bp.route('/auth/logout', methods=['POST'])
 def logout():
-    session.pop('user_id', None)
-    return jsonify({'message': 'Logged out successfully'}), 200
+    identity = current_identity()
+    if identity:
+        # {"all_sessions": true} also signs the user out on every other device
+        if (request.get_json(silent=True) or {}).get('all_sessions'):
+            token_manager.revoke_user(identity.user_id)
+        else:
+            token_manager.revoke(identity)
+    response = jsonify({'message': 'Logged out successfully'})
+    return clear_auth_cookie(response), 200
 
 @user_bp.route('/auth/me', methods=['GET'])
 def get_current_user():
-    user_id = session.get('user_id')
-    if not user_id:
+    # Answered from the signed token alone, without a database lookup
+    identity = current_identity()
+    if not identity:
         return jsonify({'error': 'Not authenticated'}), 401
     
-    user = User.query.get(user_id)
-    if not user:
-        return jsonify({'error': 'User not found'}), 404
-    
     # Return user object directly
     return jsonify({
-        'id': user.id,
-        'username': user.username,
-        'email': user.email
+        'id': identity.user_id,
+        'username': identity.username,
+        'email': identity.email
     }), 200
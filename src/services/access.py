@@ -0,0 +1,188 @@
+import threading
+import time
+from functools import wraps
+from flask import g, jsonify
+from src.models.user import db
+from src.models.project import Project, ProjectMember
+from src.models.section import Section, Item
+from src.services.auth import current_identity
+from src.services.routing import router
+
+MEMBERSHIP_TTL = 30  # seconds; bounds how long another worker may act on a stale membership
+
+
+class MembershipCache:
+    """Short-lived (user_id, project_id) -> (role, deleting) map, including negative entries.
+
+    Local to the process. Membership writes and project deletion call
+    invalidate() so this worker sees them at once; other workers pick them
+    up when the entry expires.
+    """
+
+    _missing = object()
+
+    def __init__(self, ttl=MEMBERSHIP_TTL):
+        self.ttl = ttl
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, user_id, project_id):
+        entry = self._entries.get((user_id, project_id))
+        if entry is None or entry[1] < time.monotonic():
+            return self._missing
+        return entry[0]
+
+    def set(self, user_id, project_id, access):
+        with self._lock:
+            self._entries[(user_id, project_id)] = (access, time.monotonic() + self.ttl)
+
+    def invalidate(self, user_id=None, project_id=None):
+        with self._lock:
+            if user_id is None and project_id is None:
+                self._entries.clear()
+                return
+            for key in [key for key in self._entries
+                        if (user_id is None or key[0] == user_id) and (project_id is None or key[1] == project_id)]:
+                del self._entries[key]
+
+
+membership_cache = MembershipCache()
+
+
+def current_user_id():
+    identity = current_identity()
+    return identity.user_id if identity else None
+
+
+def _member_join(user_id):
+    return db.and_(ProjectMember.project_id == Section.project_id, ProjectMember.user_id == user_id)
+
+
+def project_access(project_id, user_id):
+    """(role or None, whether the project is being deleted); served from the cache when possible."""
+    access = membership_cache.get(user_id, project_id)
+    if access is MembershipCache._missing:
+        row = db.session.execute(
+            db.select(ProjectMember.role, Project.deleting)
+            .join(Project, Project.id == ProjectMember.project_id)
+            .where(ProjectMember.project_id == project_id, ProjectMember.user_id == user_id)
+        ).first()
+        access = (row.role, row.deleting) if row else (None, False)
+        membership_cache.set(user_id, project_id, access)
+    return access
+
+
+def project_role(project_id, user_id):
+    """Role of the user in the project, or None; also None once the project is being deleted."""
+    role, deleting = project_access(project_id, user_id)
+    return None if deleting else role
+
+
+def has_project_access(project_id, user_id):
+    return project_role(project_id, user_id) is not None
+
+
+def resolve_section(section_id, user_id):
+    """Load a section and the user's access to its project with one joined query."""
+    if router.current_shard():
+        # Memberships live on the primary, so a sharded section can't be joined to them
+        section = db.session.get(Section, section_id)
+        return section, project_access(section.project_id, user_id) if section else (None, False)
+    row = db.session.execute(
+        db.select(Section, ProjectMember.role, Project.deleting)
+        .join(Project, Project.id == Section.project_id)
+        .outerjoin(ProjectMember, _member_join(user_id))
+        .where(Section.id == section_id)
+    ).first()
+    if row is None:
+        return None, (None, False)
+    section, role, deleting = row
+    membership_cache.set(user_id, section.project_id, (role, deleting))
+    return section, (role, deleting)
+
+
+def resolve_item(item_id, user_id):
+    """Load an item, its project id and the user's access: item -> section -> project -> role in one query."""
+    if router.current_shard():
+        row = db.session.execute(
+            db.select(Item, Section.project_id).join(Section, Item.section_id == Section.id).where(Item.id == item_id)
+        ).first()
+        if row is None:
+            return None, None, (None, False)
+        item, project_id = row
+        return item, project_id, project_access(project_id, user_id)
+    row = db.session.execute(
+        db.select(Item, Section.project_id, ProjectMember.role, Project.deleting)
+        .join(Section, Item.section_id == Section.id)
+        .join(Project, Project.id == Section.project_id)
+        .outerjoin(ProjectMember, _member_join(user_id))
+        .where(Item.id == item_id)
+    ).first()
+    if row is None:
+        return None, None, (None, False)
+    item, project_id, role, deleting = row
+    membership_cache.set(user_id, project_id, (role, deleting))
+    return item, project_id, (role, deleting)
+
+
+def require_access(resource, roles=None, allow_deleting=False):
+    """Authenticate the caller and authorize them against the project a view works on.
+
+    `resource` names the URL argument the view takes: 'project' (project_id),
+    'section' (section_id) or 'item' (item_id). On success g.user_id,
+    g.project_id and g.role are set, plus g.section or g.item when loaded.
+    `roles` restricts access to specific roles, e.g. ('owner',). A project
+    being deleted answers 404 unless `allow_deleting` is set.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            user_id = current_user_id()
+            if not user_id:
+                return jsonify({'error': 'Not authenticated'}), 401
+
+            # Select the database holding the resource before loading anything from it
+            if resource == 'project':
+                project_id = kwargs['project_id']
+                router.use_project(project_id)
+                role, deleting = project_access(project_id, user_id)
+            elif resource == 'section':
+                router.use_id(kwargs['section_id'])
+                section, (role, deleting) = resolve_section(kwargs['section_id'], user_id)
+                if section is None:
+                    return jsonify({'error': 'Section not found'}), 404
+                g.section = section
+                project_id = section.project_id
+            elif resource == 'item':
+                router.use_id(kwargs['item_id'])
+                item, project_id, (role, deleting) = resolve_item(kwargs['item_id'], user_id)
+                if item is None:
+                    return jsonify({'error': 'Item not found'}), 404
+                g.item = item
+            else:
+                raise ValueError(f'Unknown resource {resource!r}')
+
+            if role is None or (roles is not None and role not in roles):
+                return jsonify({'error': 'Access denied'}), 403
+            if deleting and not allow_deleting:
+                # Checked after the role, so only members learn the project existed
+                return jsonify({'error': 'Project is being deleted'}), 404
+
+            g.user_id = user_id
+            g.project_id = project_id
+            g.role = role
+            return view(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def require_user(view):
+    """Authenticate the caller only; sets g.user_id."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        user_id = current_user_id()
+        if not user_id:
+            return jsonify({'error': 'Not authenticated'}), 401
+        g.user_id = user_id
+        return view(*args, **kwargs)
+    return wrapper
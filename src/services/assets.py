@@ -0,0 +1,172 @@
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+import threading
+from flask import current_app, request
+
+try:
+    import brotli
+except ImportError:  # optional; without it assets are precompressed with gzip only
+    brotli = None
+
+# URL prefix of the files split out of index.html; their names carry a hash of their content
+ASSET_PREFIX = 'assets/'
+IMMUTABLE = 'public, max-age=31536000, immutable'
+REVALIDATE = 'no-cache'
+COMPRESS_MIN_BYTES = 512
+COMPRESSIBLE_TYPES = ('application/javascript', 'application/json', 'application/xml', 'image/svg+xml')
+
+# Only attribute-less blocks: <script src=...> and <style media=...> are left alone
+INLINE_STYLE = re.compile(r'<style>(.*?)</style>', re.S)
+INLINE_SCRIPT = re.compile(r'<script>(.*?)</script>', re.S)
+
+
+def _compressible(mimetype):
+    return mimetype.startswith('text/') or mimetype in COMPRESSIBLE_TYPES
+
+
+def precompress(body, mimetype):
+    """{encoding: bytes} for the encodings that make `body` smaller."""
+    if len(body) < COMPRESS_MIN_BYTES or not _compressible(mimetype):
+        return {}
+    variants = {'gzip': gzip.compress(body, 9, mtime=0)}
+    if brotli is not None:
+        variants['br'] = brotli.compress(body, quality=11)
+    return {encoding: data for encoding, data in variants.items() if len(data) < len(body)}
+
+
+class Asset:
+    """A static file held in memory with its precompressed variants."""
+
+    __slots__ = ('body', 'mimetype', 'cache_control', 'etag', 'encodings')
+
+    def __init__(self, body, mimetype, cache_control):
+        self.body = body
+        self.mimetype = mimetype
+        self.cache_control = cache_control
+        self.etag = hashlib.sha256(body).hexdigest()[:20]
+        self.encodings = precompress(body, mimetype)
+
+
+def split_inline(html):
+    """Move inline <style> and <script> blocks of a page into content-hashed files.
+
+    Returns the rewritten page and {path: (body, mimetype)} of the new files.
+    Each block is replaced where it stood, so scripts still run in order.
+    """
+    files = {}
+
+    def extractor(extension, mimetype, tag):
+        def replace(match):
+            body = match.group(1).encode('utf-8')
+            path = f'{ASSET_PREFIX}app.{hashlib.sha256(body).hexdigest()[:12]}.{extension}'
+            files[path] = (body, mimetype)
+            return tag.format(url='/' + path)
+        return replace
+
+    html = INLINE_STYLE.sub(extractor('css', 'text/css', '<link rel="stylesheet" href="{url}">'), html)
+    html = INLINE_SCRIPT.sub(extractor('js', 'text/javascript', '<script src="{url}"></script>'), html)
+    return html, files
+
+
+class AssetManifest:
+    """The static folder, read once into memory and keyed by URL path.
+
+    index.html has its inline CSS and JS split out into hashed files under
+    /assets/, which never change under their URL and are cached for a year.
+    index.html itself, and any other file, is revalidated with its ETag.
+    """
+
+    def __init__(self, folder):
+        self.folder = folder
+        self.assets = {}
+        self._signature = None
+        self._lock = threading.Lock()
+
+    def _scan(self):
+        # (relative path, mtime, size) of every file, to notice edits while debugging
+        entries = []
+        for root, dirs, names in os.walk(self.folder):
+            dirs.sort()
+            for name in sorted(names):
+                path = os.path.join(root, name)
+                stat = os.stat(path)
+                entries.append((os.path.relpath(path, self.folder).replace(os.sep, '/'), stat.st_mtime_ns, stat.st_size))
+        return tuple(entries)
+
+    def build(self):
+        signature = self._scan()
+        assets = {}
+        for path, _, _ in signature:
+            with open(os.path.join(self.folder, path), 'rb') as f:
+                body = f.read()
+            if path == 'index.html':
+                html, files = split_inline(body.decode('utf-8'))
+                for asset_path, (asset_body, mimetype) in files.items():
+                    assets[asset_path] = Asset(asset_body, mimetype, IMMUTABLE)
+                body = html.encode('utf-8')
+            mimetype = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+            assets[path] = Asset(body, mimetype, REVALIDATE)
+        self.assets = assets
+        self._signature = signature
+
+    def refresh(self):
+        """Rebuild if a file changed since the last build."""
+        if self._scan() != self._signature:
+            with self._lock:
+                if self._scan() != self._signature:
+                    self.build()
+
+    def lookup(self, path):
+        asset = self.assets.get(path)
+        if asset is None and not path.startswith(ASSET_PREFIX):
+            # Client-side routes get the app; a stale hashed URL gets a 404, not HTML
+            asset = self.assets.get('index.html')
+        return asset
+
+
+def _negotiate(asset):
+    best, best_quality = None, 0
+    for encoding in ('br', 'gzip'):
+        quality = request.accept_encodings[encoding] if encoding in asset.encodings else 0
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+def asset_response(asset):
+    encoding = _negotiate(asset)
+    response = current_app.response_class(asset.encodings[encoding] if encoding else asset.body,
+                                          mimetype=asset.mimetype)
+    # Each encoding is a different byte sequence, so it gets its own validator
+    response.set_etag(f'{asset.etag}-{encoding}' if encoding else asset.etag)
+    response.headers['Cache-Control'] = asset.cache_control
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    if asset.encodings:
+        response.vary.add('Accept-Encoding')
+    return response.make_conditional(request)
+
+
+def init_assets(app):
+    """Serve the static folder (and the SPA fallback) from an in-memory manifest."""
+    if app.static_folder is None or not os.path.isdir(app.static_folder):
+        manifest = None
+    else:
+        manifest = AssetManifest(app.static_folder)
+        manifest.build()
+
+    def serve(path):
+        if manifest is None:
+            return "Static folder not configured", 404
+        if app.debug:
+            manifest.refresh()
+        asset = manifest.lookup(path)
+        if asset is None:
+            return ("Not found" if path.startswith(ASSET_PREFIX) else "index.html not found"), 404
+        return asset_response(asset)
+
+    app.add_url_rule('/', 'serve', serve, defaults={'path': ''})
+    app.add_url_rule('/<path:path>', 'serve', serve)
@@ -0,0 +1,148 @@
+import threading
+import time
+import uuid
+from collections import namedtuple
+from flask import g, request
+from itsdangerous import BadSignature, URLSafeTimedSerializer
+
+try:
+    import redis
+except ImportError:  # optional, only needed to share revocations across workers
+    redis = None
+
+TOKEN_COOKIE = 'auth_token'
+TOKEN_MAX_AGE = 7 * 24 * 3600
+
+Identity = namedtuple('Identity', 'user_id username email token_id issued_at')
+
+
+class LocalRevocationStore:
+    """In-process revocation entries that expire on their own. Not shared between workers."""
+
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            now = time.time()
+            # Drop expired entries as we go so the map stays bounded by live tokens
+            for stale in [k for k, (_, expires) in self._entries.items() if expires < now]:
+                del self._entries[stale]
+            self._entries[key] = (value, now + ttl)
+
+    def get_many(self, keys):
+        now = time.time()
+        values = []
+        for key in keys:
+            entry = self._entries.get(key)
+            values.append(entry[0] if entry is not None and entry[1] >= now else None)
+        return values
+
+
+class RedisRevocationStore:
+    """Revocation entries in Redis, so a logout is honoured by every worker and node."""
+
+    def __init__(self, url, prefix='pseudocode:auth:'):
+        if redis is None:
+            raise RuntimeError('AUTH_STORE_URL is set but the redis package is not installed')
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def set(self, key, value, ttl):
+        self.client.set(self.prefix + key, value, ex=max(int(ttl), 1))
+
+    def get_many(self, keys):
+        return [None if value is None else float(value)
+                for value in self.client.mget([self.prefix + key for key in keys])]
+
+
+class TokenManager:
+    """Signed, stateless auth tokens carrying the user's id, username and email.
+
+    Verifying a token is an HMAC check plus one revocation lookup (a dict
+    locally, one MGET on Redis); the database is never touched. Tokens are
+    signed with SECRET_KEY and still accepted when signed with any key in
+    SECRET_KEY_FALLBACKS, so keys can be rotated without logging everyone out.
+    """
+
+    def __init__(self):
+        self.serializer = None
+        self.store = LocalRevocationStore()
+        self.max_age = TOKEN_MAX_AGE
+
+    def init_app(self, app):
+        # itsdangerous signs with the last key and verifies with all of them
+        keys = list(app.config.get('SECRET_KEY_FALLBACKS') or []) + [app.config['SECRET_KEY']]
+        self.serializer = URLSafeTimedSerializer(keys, salt='auth-token')
+        self.max_age = app.config.get('AUTH_TOKEN_MAX_AGE', TOKEN_MAX_AGE)
+        url = app.config.get('AUTH_STORE_URL')
+        self.store = RedisRevocationStore(url) if url else LocalRevocationStore()
+
+    def issue(self, user):
+        return self.serializer.dumps({
+            'uid': user.id,
+            'usr': user.username,
+            'eml': user.email,
+            'jti': uuid.uuid4().hex,
+            'iat': time.time()  # sub-second, unlike the signer's timestamp, for revoke_user cut-offs
+        })
+
+    def verify(self, token):
+        try:
+            payload = self.serializer.loads(token, max_age=self.max_age)
+        except BadSignature:  # also covers expired tokens
+            return None
+
+        issued_at = payload['iat']
+        revoked, not_before = self.store.get_many([f"token:{payload['jti']}", f"user:{payload['uid']}"])
+        if revoked is not None or (not_before is not None and issued_at <= not_before):
+            return None
+        return Identity(payload['uid'], payload['usr'], payload['eml'], payload['jti'], issued_at)
+
+    def revoke(self, identity):
+        """Reject this token from now on, until it would have expired anyway."""
+        remaining = identity.issued_at + self.max_age - time.time()
+        if remaining > 0:
+            self.store.set(f'token:{identity.token_id}', time.time(), remaining)
+
+    def revoke_user(self, user_id):
+        """Reject every token issued to the user up to now."""
+        self.store.set(f'user:{user_id}', time.time(), self.max_age)
+
+
+token_manager = TokenManager()
+
+
+def current_identity():
+    """Identity of the caller from a Bearer token or the auth cookie, or None."""
+    if '_identity' not in g:
+        authorization = request.headers.get('Authorization', '')
+        if authorization.startswith('Bearer '):
+            token = authorization[len('Bearer '):].strip()
+        else:
+            token = request.cookies.get(TOKEN_COOKIE)
+        g._identity = token_manager.verify(token) if token else None
+    return g._identity
+
+
+def set_auth_cookie(response, token):
+    response.set_cookie(
+        TOKEN_COOKIE, token, max_age=token_manager.max_age,
+        httponly=True, samesite='Lax', secure=request.is_secure
+    )
+    return response
+
+
+def clear_auth_cookie(response):
+    response.delete_cookie(TOKEN_COOKIE, httponly=True, samesite='Lax')
+    return response
+
+
+def init_auth(app):
+    token_manager.init_app(app)
+    if not app.config.get('AUTH_STORE_URL') and app.config.get('WEB_CONCURRENCY', 1) > 1:
+        app.logger.warning(
+            'AUTH_STORE_URL is not set but %s worker processes are configured: a logout only revokes '
+            'the token in the worker that served it', app.config['WEB_CONCURRENCY']
+        )
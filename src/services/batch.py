@@ -0,0 +1,281 @@
+from src.models.user import db
+from src.models.section import Section, Item
+from src.services.ordering import next_order_index
+from src.services.tree import delete_subtree
+from src.services import stats
+from src.services.stats import StatDeltas
+from src.services.versioning import VersionConflict, RowDeleted, conditional_update
+
+SECTION_FIELDS = ('name', 'priority')
+ITEM_FIELDS = ('text', 'description', 'priority', 'type')
+
+
+class BatchError(ValueError):
+    def __init__(self, index, message):
+        super().__init__(f'Operation {index}: {message}')
+        self.index = index
+
+
+class BatchNotFound(BatchError):
+    """A row the batch refers to was deleted while it ran."""
+
+
+class BatchConflict(BatchError):
+    def __init__(self, index, current):
+        super().__init__(index, f'{current.__tablename__} {current.id} was changed by someone else')
+        self.current = current
+
+
+class BatchWriter:
+    """Apply an ordered list of section/item operations to one project.
+
+    Operations look like
+        {'op': 'create', 'type': 'item', 'temp_id': 'a',
+         'data': {'section_id': 3, 'parent_id': None, 'text': '...'}}
+        {'op': 'update', 'type': 'section', 'id': 'b', 'data': {'name': '...'}, 'expected_version': 4}
+        {'op': 'delete', 'type': 'item', 'id': 12}
+    where ids are either existing integer ids or temp ids (strings) created
+    earlier in the same batch. Consecutive creates are inserted with one
+    bulk INSERT per tree level; nothing is committed here.
+    """
+
+    def __init__(self, project_id):
+        self.project_id = project_id
+        self.id_map = {}
+        self.changes = []
+        self.item_sections = {}  # item id -> section id for every item the batch touches
+        self.section_ids = set()
+        self.max_order = {}
+        self.removed_items = []  # every item id deleted, including descendants
+        self.stat_deltas = StatDeltas()
+
+    def apply(self, operations):
+        self._preload(operations)
+
+        run = []
+        for index, operation in enumerate(operations):
+            if operation.get('op') == 'create':
+                run.append((index, operation))
+                continue
+            self._create_run(run)
+            run = []
+            if operation.get('op') == 'update':
+                self._update(index, operation)
+            elif operation.get('op') == 'delete':
+                self._delete(index, operation)
+            else:
+                raise BatchError(index, f"unknown op {operation.get('op')!r}")
+        self._create_run(run)
+
+        return self.id_map, self.changes
+
+    def _preload(self, operations):
+        # One query per table validates every existing id the batch refers to
+        section_refs, item_refs = set(), set()
+        for operation in operations:
+            data = operation.get('data') or {}
+            if operation.get('type') == 'section' and isinstance(operation.get('id'), int):
+                section_refs.add(operation['id'])
+            if operation.get('type') == 'item' and isinstance(operation.get('id'), int):
+                item_refs.add(operation['id'])
+            if isinstance(data.get('section_id'), int):
+                section_refs.add(data['section_id'])
+            if isinstance(data.get('parent_id'), int):
+                item_refs.add(data['parent_id'])
+
+        # Whole rows, so updates find them in the identity map
+        if section_refs:
+            self.section_ids.update(section.id for section in db.session.execute(
+                db.select(Section).where(Section.id.in_(section_refs), Section.project_id == self.project_id)
+            ).scalars())
+        if item_refs:
+            self.item_sections.update((item.id, item.section_id) for item in db.session.execute(
+                db.select(Item)
+                .join(Section, Item.section_id == Section.id)
+                .where(Item.id.in_(item_refs), Section.project_id == self.project_id)
+            ).scalars())
+
+    def _resolve(self, index, ref, known):
+        if ref is None:
+            return None
+        if isinstance(ref, str):
+            if ref not in self.id_map:
+                raise BatchError(index, f'unknown temp id {ref!r}')
+            return self.id_map[ref]
+        if ref not in known:
+            raise BatchError(index, f'id {ref} not found in project')
+        return ref
+
+    def _is_ready(self, operation):
+        data = operation.get('data') or {}
+        refs = [data.get('section_id'), data.get('parent_id')] if operation.get('type') == 'item' else []
+        return all(not isinstance(ref, str) or ref in self.id_map for ref in refs)
+
+    def _next_order(self, section_id, parent_id, is_new_container):
+        key = (section_id, parent_id)
+        if key not in self.max_order:
+            if is_new_container:
+                self.max_order[key] = 0
+            elif parent_id is None:
+                self.max_order[key] = db.session.query(db.func.max(Item.order_index)).filter_by(
+                    section_id=section_id, parent_id=None
+                ).scalar() or 0
+            else:
+                self.max_order[key] = db.session.query(db.func.max(Item.order_index)).filter_by(
+                    section_id=section_id, parent_id=parent_id
+                ).scalar() or 0
+        self.max_order[key] = next_order_index(self.max_order[key])
+        return self.max_order[key]
+
+    def _create_run(self, run):
+        # Insert in waves: every create whose parents already have ids goes into the
+        # current wave, so a nested outline costs one INSERT per level and table
+        remaining = run
+        while remaining:
+            ready = [(index, operation) for index, operation in remaining if self._is_ready(operation)]
+            if not ready:
+                index, operation = remaining[0]
+                raise BatchError(index, 'references a temp id that is never created')
+            ready_ids = {index for index, _ in ready}
+            remaining = [(index, operation) for index, operation in remaining if index not in ready_ids]
+
+            sections = [(index, operation) for index, operation in ready if operation.get('type') == 'section']
+            items = [(index, operation) for index, operation in ready if operation.get('type') == 'item']
+            for index, operation in ready:
+                if operation.get('type') not in ('section', 'item'):
+                    raise BatchError(index, f"unknown type {operation.get('type')!r}")
+            if sections:
+                self._insert_sections(sections)
+            if items:
+                self._insert_items(items)
+
+    def _insert_sections(self, operations):
+        max_order = db.session.query(db.func.max(Section.order_index)).filter_by(
+            project_id=self.project_id
+        ).scalar()
+        rows = []
+        for index, operation in operations:
+            data = operation.get('data') or {}
+            if not data.get('name'):
+                raise BatchError(index, 'Section name is required')
+            max_order = next_order_index(max_order)
+            rows.append({
+                'project_id': self.project_id,
+                'name': data['name'],
+                'priority': data.get('priority', 'medium'),
+                'order_index': max_order
+            })
+
+        # New rows have distinct order keys, which map RETURNING rows back to their
+        # operations without forcing row-at-a-time inserts on SQLite
+        returned = dict((order_index, section_id) for section_id, order_index in db.session.execute(
+            db.insert(Section).returning(Section.id, Section.order_index), rows
+        ))
+        for (index, operation), row in zip(operations, rows):
+            section_id = returned[row['order_index']]
+            self.section_ids.add(section_id)
+            if operation.get('temp_id') is not None:
+                self.id_map[operation['temp_id']] = section_id
+            self.changes.append(('section', section_id, 'created'))
+
+    def _insert_items(self, operations):
+        rows = []
+        for index, operation in operations:
+            data = operation.get('data') or {}
+            if not data.get('text'):
+                raise BatchError(index, 'Item text is required')
+
+            parent_ref = data.get('parent_id')
+            parent_id = self._resolve(index, parent_ref, self.item_sections)
+            if parent_id is not None:
+                section_id = self.item_sections[parent_id]
+            else:
+                section_id = self._resolve(index, data.get('section_id'), self.section_ids)
+                if section_id is None:
+                    raise BatchError(index, 'section_id or parent_id is required')
+
+            new_container = isinstance(parent_ref if parent_ref is not None else data.get('section_id'), str)
+            rows.append({
+                'section_id': section_id,
+                'parent_id': parent_id,
+                'text': data['text'],
+                'description': data.get('description', ''),
+                'priority': data.get('priority', 'medium'),
+                'type': data.get('type', 'feature'),
+                'order_index': self._next_order(section_id, parent_id, new_container)
+            })
+
+        returned = dict(((section_id, parent_id, order_index), item_id) for item_id, section_id, parent_id, order_index in db.session.execute(
+            db.insert(Item).returning(Item.id, Item.section_id, Item.parent_id, Item.order_index), rows
+        ))
+        for (index, operation), row in zip(operations, rows):
+            item_id = returned[(row['section_id'], row['parent_id'], row['order_index'])]
+            self.item_sections[item_id] = row['section_id']
+            self.stat_deltas.add(self.project_id, row['section_id'], row['priority'], row['type'])
+            if operation.get('temp_id') is not None:
+                self.id_map[operation['temp_id']] = item_id
+            self.changes.append(('item', item_id, 'created'))
+
+    def _update(self, index, operation):
+        data = operation.get('data') or {}
+        if operation.get('type') == 'section':
+            model, fields, known = Section, SECTION_FIELDS, self.section_ids
+        elif operation.get('type') == 'item':
+            model, fields, known = Item, ITEM_FIELDS, self.item_sections
+        else:
+            raise BatchError(index, f"unknown type {operation.get('type')!r}")
+
+        entity_id = self._resolve(index, operation.get('id'), known)
+        expected = operation.get('expected_version')
+        if expected is not None and (not isinstance(expected, int) or isinstance(expected, bool)):
+            raise BatchError(index, 'expected_version must be an integer')
+        values = {field: data[field] for field in fields if field in data}
+
+        row = db.session.get(model, entity_id)
+        try:
+            if row is None:
+                raise RowDeleted()
+            old = (row.section_id, row.priority, row.type) if model is Item else None
+            if values:
+                conditional_update(model, row, values, expected)
+            elif expected is not None and row.version != expected:
+                # Nothing to write, but the client still asked for this version
+                raise VersionConflict(row)
+        except VersionConflict as e:
+            raise BatchConflict(index, e.current)
+        except RowDeleted:
+            raise BatchNotFound(index, f"{operation['type']} {entity_id} was deleted")
+
+        if old is not None and ('priority' in values or 'type' in values):
+            section_id, priority, item_type = old
+            self.stat_deltas.remove(self.project_id, section_id, priority, item_type)
+            self.stat_deltas.add(self.project_id, section_id,
+                                 values.get('priority', priority), values.get('type', item_type))
+        self.changes.append((operation['type'], entity_id, 'updated'))
+
+    def _delete(self, index, operation):
+        if operation.get('type') == 'section':
+            section_id = self._resolve(index, operation.get('id'), self.section_ids)
+            self.removed_items.extend(db.session.execute(
+                db.delete(Item).where(Item.section_id == section_id).returning(Item.id)
+            ).scalars())
+            stats.remove_section(section_id)
+            for key in [key for key in self.stat_deltas if key[1] == section_id]:
+                del self.stat_deltas[key]
+            db.session.execute(db.delete(Section).where(Section.id == section_id))
+            self.section_ids.discard(section_id)
+            self.item_sections = {
+                item_id: item_section for item_id, item_section in self.item_sections.items()
+                if item_section != section_id
+            }
+            self.changes.append(('section', section_id, 'deleted'))
+        elif operation.get('type') == 'item':
+            item_id = self._resolve(index, operation.get('id'), self.item_sections)
+            deleted_rows = delete_subtree(item_id)
+            for row in deleted_rows:
+                self.item_sections.pop(row.id, None)
+                self.removed_items.append(row.id)
+            self.stat_deltas.remove_rows(self.project_id, deleted_rows)
+            self.changes.append(('item', item_id, 'deleted'))
+        else:
+            raise BatchError(index, f"unknown type {operation.get('type')!r}")
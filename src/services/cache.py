@@ -0,0 +1,157 @@
+import threading
+from collections import OrderedDict
+
+try:
+    import redis
+except ImportError:  # optional, only needed for a cache shared across workers
+    redis = None
+
+
+class CacheBackend:
+    """Storage for serialized project trees, one entry per project."""
+
+    def get(self, key):
+        raise NotImplementedError
+
+    def set(self, key, value):
+        raise NotImplementedError
+
+    def delete(self, key):
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+
+class LocalLRUBackend(CacheBackend):
+    """In-process LRU bounded by the total size of the stored payloads."""
+
+    def __init__(self, max_bytes=64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        if len(value) > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.size -= len(previous)
+            self._entries[key] = value
+            self.size += len(value)
+            while self.size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.size -= len(evicted)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.size -= len(previous)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+
+class RedisBackend(CacheBackend):
+    """Shares the cache across workers through any Redis-protocol server."""
+
+    def __init__(self, url, ttl=3600, prefix='talentlms:'):
+        if redis is None:
+            raise RuntimeError('PROJECT_CACHE_URL is set but the redis package is not installed')
+        self.client = redis.Redis.from_url(url)
+        self.ttl = ttl
+        self.prefix = prefix
+
+    def get(self, key):
+        return self.client.get(self.prefix + key)
+
+    def set(self, key, value):
+        self.client.set(self.prefix + key, value, ex=self.ttl)
+
+    def delete(self, key):
+        self.client.delete(self.prefix + key)
+
+    def clear(self):
+        for key in self.client.scan_iter(match=self.prefix + '*'):
+            self.client.delete(key)
+
+
+class ProjectCache:
+    """Serialized project trees keyed by project id and revision.
+
+    Only one revision per project and wire format is kept. The stored value
+    is prefixed with its revision, so a lookup for any other revision is a
+    miss even if an invalidation was lost.
+    """
+
+    FORMATS = ('json', 'compact')
+
+    def __init__(self, backend=None):
+        self.backend = backend or LocalLRUBackend()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(project_id, fmt='json'):
+        return f'project-tree:{project_id}' if fmt == 'json' else f'project-tree:{project_id}:{fmt}'
+
+    def get(self, project_id, revision, fmt='json'):
+        value = self.backend.get(self._key(project_id, fmt))
+        if value is not None:
+            stored_revision, _, payload = value.partition(b'\n')
+            if stored_revision == str(revision).encode():
+                with self._lock:
+                    self.hits += 1
+                return payload
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def set(self, project_id, revision, payload, fmt='json'):
+        self.backend.set(self._key(project_id, fmt), str(revision).encode() + b'\n' + payload)
+
+    def invalidate(self, project_id):
+        with self._lock:
+            self.invalidations += 1
+        for fmt in self.FORMATS:
+            self.backend.delete(self._key(project_id, fmt))
+
+    def stats(self):
+        result = {
+            'backend': type(self.backend).__name__,
+            'hits': self.hits,
+            'misses': self.misses,
+            'invalidations': self.invalidations
+        }
+        if isinstance(self.backend, LocalLRUBackend):
+            result['size_bytes'] = self.backend.size
+            result['max_bytes'] = self.backend.max_bytes
+            result['evictions'] = self.backend.evictions
+        return result
+
+
+project_cache = ProjectCache()
+
+
+def init_project_cache(app):
+    url = app.config.get('PROJECT_CACHE_URL')
+    if url:
+        project_cache.backend = RedisBackend(url, ttl=app.config.get('PROJECT_CACHE_TTL', 3600))
+    else:
+        project_cache.backend = LocalLRUBackend(app.config.get('PROJECT_CACHE_MAX_BYTES', 64 * 1024 * 1024))
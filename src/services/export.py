@@ -0,0 +1,147 @@
+import json
+import zlib
+from datetime import datetime
+from src.models.user import db
+from src.models.section import Section, Item
+
+EXPORT_FORMAT = 'talentlms-project'
+EXPORT_VERSION = 2  # 2: NDJSON record kinds moved from 'type' (an item field) to 'record'
+STREAM_BATCH_SIZE = 1000
+
+ITEM_COLUMNS = (
+    Item.id, Item.section_id, Item.parent_id, Item.text, Item.description,
+    Item.priority, Item.type, Item.order_index, Item.created_at, Item.updated_at
+)
+
+
+def _isoformat(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def _dumps(value):
+    return json.dumps(value, separators=(',', ':'), default=_isoformat)
+
+
+def _project_dict(project):
+    return {
+        'id': project.id,
+        'name': project.name,
+        'description': project.description,
+        'created_at': _isoformat(project.created_at),
+        'updated_at': _isoformat(project.updated_at),
+        'revision': project.revision
+    }
+
+
+def _item_dict(row):
+    return {
+        'id': row.id,
+        'section_id': row.section_id,
+        'parent_id': row.parent_id,
+        'text': row.text,
+        'description': row.description,
+        'priority': row.priority,
+        'type': row.type,
+        'order_index': row.order_index,
+        'created_at': _isoformat(row.created_at),
+        'updated_at': _isoformat(row.updated_at)
+    }
+
+
+def _iter_sections(project_id):
+    return db.session.execute(
+        db.select(Section)
+        .where(Section.project_id == project_id)
+        .order_by(Section.order_index, Section.id)
+        .execution_options(yield_per=STREAM_BATCH_SIZE)
+    ).scalars()
+
+
+def _iter_items(project_id):
+    # Server-side cursor over plain column tuples, grouped by section in section order
+    return db.session.execute(
+        db.select(*ITEM_COLUMNS)
+        .join(Section, Item.section_id == Section.id)
+        .where(Section.project_id == project_id)
+        .order_by(Section.order_index, Section.id, Item.order_index, Item.id)
+        .execution_options(yield_per=STREAM_BATCH_SIZE)
+    )
+
+
+def _nest(rows):
+    nodes = {}
+    roots = []
+    for row in rows:
+        nodes[row['id']] = row
+    for row in rows:
+        parent = nodes.get(row['parent_id'])
+        if parent is None:
+            roots.append(row)
+        else:
+            parent.setdefault('children', []).append(row)
+    return roots
+
+
+def iter_export_json(project):
+    """Yield the project as one JSON document, one section at a time.
+
+    Items are nested under 'children' like Item.to_dict(include_children=True).
+    Only the items of the section being written are held in memory.
+    """
+    yield '{"format":%s,"version":%d,"exported_at":%s,"project":%s,"sections":[' % (
+        _dumps(EXPORT_FORMAT), EXPORT_VERSION, _dumps(datetime.utcnow()), _dumps(_project_dict(project))
+    )
+
+    items = iter(_iter_items(project.id))
+    pending = next(items, None)
+
+    for position, section in enumerate(_iter_sections(project.id)):
+        rows = []
+        while pending is not None and pending.section_id == section.id:
+            rows.append(_item_dict(pending))
+            pending = next(items, None)
+
+        section_data = section.to_dict()
+        section_data['items'] = _nest(rows)
+        yield (',' if position else '') + _dumps(section_data)
+
+    yield ']}'
+
+
+def iter_export_ndjson(project):
+    """Yield the project as newline-delimited JSON records with flat items.
+
+    Each line names its kind under 'record', a key no entity has.
+    """
+    yield _dumps(dict(_project_dict(project), record='project', format=EXPORT_FORMAT, version=EXPORT_VERSION)) + '\n'
+
+    for section in _iter_sections(project.id):
+        yield _dumps(dict(section.to_dict(), record='section')) + '\n'
+
+    for row in _iter_items(project.id):
+        yield _dumps(dict(_item_dict(row), record='item')) + '\n'
+
+
+def iter_chunks(records, chunk_size=64 * 1024):
+    # Coalesce small records so the server writes reasonably sized chunks
+    buffer = []
+    size = 0
+    for record in records:
+        data = record.encode()
+        buffer.append(data)
+        size += len(data)
+        if size >= chunk_size:
+            yield b''.join(buffer)
+            buffer = []
+            size = 0
+    if buffer:
+        yield b''.join(buffer)
+
+
+def iter_gzip(chunks):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
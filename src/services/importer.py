@@ -0,0 +1,199 @@
+import json
+import time
+from collections import defaultdict
+from src.models.user import db
+from src.models.section import Section, Item
+from src.services.ordering import next_order_index
+from src.services.revisions import record_changes
+from src.services import search, stats
+from src.services.stats import StatDeltas
+
+DEFAULT_CHUNK_SIZE = 1000
+
+
+class ImportFormatError(ValueError):
+    pass
+
+
+class ProjectImporter:
+    """Bulk-load sections and items into an existing project.
+
+    Records are fed in source order with their source ids. An item is
+    inserted as soon as its section and parent have new ids; items whose
+    parent has not been inserted yet wait in `pending` and are released
+    level by level as parents land. Rows go in with multi-row INSERTs of up
+    to `chunk_size` rows and every chunk is committed on its own.
+    """
+
+    def __init__(self, project_id, chunk_size=DEFAULT_CHUNK_SIZE):
+        self.project_id = project_id
+        self.chunk_size = chunk_size
+        self.section_map = {}
+        self.item_map = {}
+        self.sections = []
+        self.ready = []
+        self.pending = defaultdict(list)
+        self.max_order = defaultdict(int)
+        self.section_order = None
+        self.changes = []
+        self.stat_deltas = StatDeltas()
+        self.section_count = 0
+        self.item_count = 0
+        self.revision = None
+        self.started = time.perf_counter()
+
+    def add_section(self, key, data):
+        if not data.get('name'):
+            raise ImportFormatError('Section name is required')
+        self.sections.append((key, data))
+
+    def add_item(self, key, section_key, parent_key, data):
+        if not data.get('text'):
+            raise ImportFormatError('Item text is required')
+        record = (key, section_key, parent_key, data)
+        if parent_key is None or parent_key in self.item_map:
+            self.ready.append(record)
+        else:
+            self.pending[parent_key].append(record)
+        if len(self.ready) >= self.chunk_size:
+            self._flush_items()
+
+    def finish(self):
+        self._flush_sections()
+        while self.ready:
+            self._flush_items()
+        self._commit()
+
+        elapsed = time.perf_counter() - self.started
+        rows = self.section_count + self.item_count
+        return {
+            'sections': self.section_count,
+            'items': self.item_count,
+            'orphans': sum(len(records) for records in self.pending.values()),
+            'seconds': round(elapsed, 3),
+            'rows_per_second': round(rows / elapsed, 1) if elapsed else None,
+            'revision': self.revision
+        }
+
+    def _flush_sections(self):
+        if not self.sections:
+            return
+        if self.section_order is None:
+            self.section_order = db.session.query(db.func.max(Section.order_index)).filter_by(
+                project_id=self.project_id
+            ).scalar()
+
+        rows = []
+        for key, data in self.sections:
+            self.section_order = next_order_index(self.section_order)
+            rows.append({
+                'project_id': self.project_id,
+                'name': data['name'],
+                'priority': data.get('priority', 'medium'),
+                'order_index': self.section_order
+            })
+
+        # New rows have distinct order keys, which map RETURNING rows back to their source
+        returned = dict((order_index, section_id) for section_id, order_index in db.session.execute(
+            db.insert(Section).returning(Section.id, Section.order_index), rows
+        ))
+        for (key, data), row in zip(self.sections, rows):
+            section_id = returned[row['order_index']]
+            self.section_map[key] = section_id
+            self.changes.append(('section', section_id, 'created'))
+
+        self.section_count += len(rows)
+        self.sections = []
+
+    def _flush_items(self):
+        self._flush_sections()
+        chunk, self.ready = self.ready[:self.chunk_size], self.ready[self.chunk_size:]
+
+        rows = []
+        for key, section_key, parent_key, data in chunk:
+            if section_key not in self.section_map:
+                raise ImportFormatError(f'Item {key!r} references unknown section {section_key!r}')
+            section_id = self.section_map[section_key]
+            parent_id = self.item_map.get(parent_key) if parent_key is not None else None
+            container = (section_id, parent_id)
+            self.max_order[container] = next_order_index(self.max_order[container])
+            rows.append({
+                'section_id': section_id,
+                'parent_id': parent_id,
+                'text': data['text'],
+                'description': data.get('description', ''),
+                'priority': data.get('priority', 'medium'),
+                'type': data.get('type', 'feature'),
+                'order_index': self.max_order[container]
+            })
+
+        returned = dict(((section_id, parent_id, order_index), item_id) for item_id, section_id, parent_id, order_index in db.session.execute(
+            db.insert(Item).returning(Item.id, Item.section_id, Item.parent_id, Item.order_index), rows
+        ))
+        for (key, section_key, parent_key, data), row in zip(chunk, rows):
+            item_id = returned[(row['section_id'], row['parent_id'], row['order_index'])]
+            self.item_map[key] = item_id
+            self.changes.append(('item', item_id, 'created'))
+            self.stat_deltas.add(self.project_id, row['section_id'], row['priority'], row['type'])
+            # Children waiting for this item can go into the next chunk
+            self.ready.extend(self.pending.pop(key, ()))
+
+        self.item_count += len(rows)
+        self._commit()
+
+    def _commit(self):
+        if self.changes:
+            stats.apply_deltas(self.stat_deltas)
+            self.stat_deltas = StatDeltas()
+            search.sync_index(self.changes)
+            self.revision = record_changes(self.project_id, self.changes)
+            self.changes = []
+        db.session.commit()
+
+
+def import_ndjson(importer, lines):
+    """Feed export NDJSON (one project/section/item record per line, kind in 'record') into an importer."""
+    for number, line in enumerate(lines, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            raise ImportFormatError(f'Line {number} is not valid JSON')
+        if not isinstance(record, dict):
+            raise ImportFormatError(f'Line {number} is not a JSON object')
+
+        if 'record' in record:
+            kind = record['record']
+        else:
+            # Version 1 exports put the kind in 'type', overwriting the item's own type
+            kind = record.pop('type', None)
+        if kind == 'section':
+            importer.add_section(record.get('id'), record)
+        elif kind == 'item':
+            importer.add_item(record.get('id'), record.get('section_id'), record.get('parent_id'), record)
+        elif kind != 'project':
+            raise ImportFormatError(f'Line {number} has unknown record kind {kind!r}')
+
+
+def import_document(importer, document):
+    """Feed a JSON export (sections with items nested under 'children') into an importer."""
+    sections = document.get('sections') if isinstance(document, dict) else None
+    if not isinstance(sections, list):
+        raise ImportFormatError('Document must contain a sections list')
+
+    next_key = 0
+    for section in sections:
+        section_key = ('section', next_key)
+        next_key += 1
+        importer.add_section(section_key, section)
+
+        # Depth-first walk without recursion so deep outlines are safe
+        stack = [(item, None) for item in reversed(section.get('items') or [])]
+        while stack:
+            item, parent_key = stack.pop()
+            item_key = ('item', next_key)
+            next_key += 1
+            importer.add_item(item_key, section_key, parent_key, item)
+            stack.extend((child, item_key) for child in reversed(item.get('children') or []))
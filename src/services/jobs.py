@@ -0,0 +1,332 @@
+import os
+import socket
+import threading
+from datetime import datetime, timedelta
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy import event
+from src.models.user import db
+from src.models.job import Job
+from src.models.project import Project, ProjectMember, ProjectChange
+from src.models.section import Section, Item, SectionStat
+from src.services import search, stats
+from src.services.access import membership_cache
+from src.services.cache import project_cache
+from src.services.realtime import queue_changes
+from src.services.routing import router
+
+WORKERS = 1
+POLL_SECONDS = 1.0
+LEASE_SECONDS = 60
+MAX_ATTEMPTS = 3
+CHUNK_SIZE = 2000
+FINISHED = ('succeeded', 'failed')
+
+jobs_cli = AppGroup('jobs', help='Run and maintain background jobs.')
+
+# kind -> step function; see job_handler()
+handlers = {}
+
+
+def job_handler(kind):
+    """Register `step(job)` for a kind of job.
+
+    A step does one bounded chunk of work, records where the next one
+    starts in job.checkpoint (and job.progress/total), and returns True
+    once the job is complete. The runner commits each step together with
+    the job row, so a job interrupted by a crash or a deploy resumes from
+    its last checkpoint. Steps must tolerate being run twice: with
+    sharding, the shard and the primary commit one after the other.
+    """
+    def register(step):
+        handlers[kind] = step
+        return step
+    return register
+
+
+def enqueue(kind, user_id, project_id=None, params=None):
+    """Add a job to the session; workers are woken once the caller commits."""
+    job = Job(kind=kind, user_id=user_id, project_id=project_id, params=params or {}, status='queued')
+    db.session.add(job)
+    db.session.flush()
+    db.session.info['jobs_enqueued'] = True
+    return job
+
+
+def pending(kind, project_id):
+    """The queued or running job of this kind for the project, or None."""
+    return db.session.execute(
+        db.select(Job).where(Job.kind == kind, Job.project_id == project_id, Job.status.in_(('queued', 'running')))
+        .order_by(Job.id).limit(1)
+    ).scalar()
+
+
+def _wake_committed(session):
+    if session.info.pop('jobs_enqueued', False):
+        job_runner.wake()
+
+
+def _discard_rolled_back(session):
+    session.info.pop('jobs_enqueued', None)
+
+
+class JobRunner:
+    """A pool of threads that claim queued jobs from the jobs table and run them step by step.
+
+    Jobs are claimed with a conditional UPDATE and held under a lease that
+    every step renews; a job whose worker died is picked up again once its
+    lease runs out. The table is the queue, so no broker is needed, and
+    `flask jobs work` runs the same loop in a process of its own.
+    """
+
+    def __init__(self):
+        self.configure(None)
+
+    def configure(self, app, workers=WORKERS, poll=POLL_SECONDS, lease=LEASE_SECONDS, max_attempts=MAX_ATTEMPTS):
+        self.app = app
+        self.workers = workers
+        self.poll = poll
+        self.lease = lease
+        self.max_attempts = max_attempts
+        self._wakeup = threading.Event()
+        self._lock = threading.Lock()
+        self._pid = None
+
+    def ensure_started(self):
+        # Threads don't survive fork, so each gunicorn worker starts its own pool on first use
+        if not self.workers or self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            for n in range(self.workers):
+                threading.Thread(target=self.work, name=f'job-worker-{n}', daemon=True).start()
+            self._pid = os.getpid()
+
+    def wake(self):
+        self.ensure_started()
+        self._wakeup.set()
+
+    def work(self, stop=None):
+        """Claim and run jobs until `stop` (an Event) is set, or forever."""
+        worker_id = f'{socket.gethostname()}:{os.getpid()}:{threading.current_thread().name}'
+        while stop is None or not stop.is_set():
+            try:
+                with self.app.app_context():
+                    job_id = self.claim(worker_id)
+            except Exception as e:
+                self.app.logger.warning('Job worker could not poll the jobs table: %s', e)
+                job_id = None
+            if job_id is None:
+                self._wakeup.wait(self.poll)
+                self._wakeup.clear()
+                continue
+            try:
+                with self.app.app_context():
+                    self.run(job_id, worker_id)
+            except Exception as e:
+                # The job stays 'running' until its lease expires, then it is retried
+                self.app.logger.warning('Job worker could not record the outcome of job %s: %s', job_id, e)
+
+    def claim(self, worker_id):
+        """Take the oldest queued or abandoned job; return its id, or None."""
+        now = datetime.utcnow()
+        claimable = (Job.status == 'queued') | ((Job.status == 'running') & (Job.locked_until < now))
+        candidates = db.session.execute(
+            db.select(Job.id).where(claimable).order_by(Job.id).limit(self.workers + 1)
+        ).scalars().all()
+        for job_id in candidates:
+            claimed = db.session.execute(
+                db.update(Job).where(Job.id == job_id, claimable).values(
+                    status='running',
+                    locked_by=worker_id,
+                    locked_until=now + timedelta(seconds=self.lease),
+                    attempts=Job.attempts + 1,
+                    started_at=db.func.coalesce(Job.started_at, now)
+                )
+            ).rowcount
+            db.session.commit()
+            if claimed:
+                return job_id
+        return None
+
+    def _renew(self, job, worker_id):
+        # Fails if the lease ran out and another worker took the job over
+        return db.session.execute(
+            db.update(Job).where(Job.id == job.id, Job.locked_by == worker_id).values(
+                locked_until=datetime.utcnow() + timedelta(seconds=self.lease)
+            ).execution_options(synchronize_session=False)
+        ).rowcount == 1
+
+    def run(self, job_id, worker_id):
+        job = db.session.get(Job, job_id)
+        step = handlers.get(job.kind)
+        if step is None or job.attempts > self.max_attempts:
+            job.status = 'failed'
+            job.error = f'Unknown job kind {job.kind!r}' if step is None else f'Gave up after {self.max_attempts} attempts'
+            job.finished_at = datetime.utcnow()
+            db.session.commit()
+            return
+        if job.project_id is not None:
+            router.use_project(job.project_id)
+
+        while True:
+            try:
+                done = step(job)
+                if not self._renew(job, worker_id):
+                    db.session.rollback()
+                    self.app.logger.warning('Job %s lost its lease; left to the worker that took it over', job_id)
+                    return
+                if done:
+                    job.status = 'succeeded'
+                    job.finished_at = datetime.utcnow()
+                    job.locked_by = None
+                    job.locked_until = None
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                self.app.logger.warning('Job %s (%s) failed on attempt %s: %s', job_id, job.kind, job.attempts, e)
+                job = db.session.get(Job, job_id)
+                job.error = str(e)
+                job.locked_by = None
+                job.locked_until = None
+                if job.attempts >= self.max_attempts:
+                    job.status = 'failed'
+                    job.finished_at = datetime.utcnow()
+                else:
+                    job.status = 'queued'  # retried from the last checkpoint
+                db.session.commit()
+                return
+            if done:
+                return
+
+
+job_runner = JobRunner()
+
+
+def _chunk_size():
+    return current_app.config.get('JOB_CHUNK_SIZE', CHUNK_SIZE)
+
+
+def _project_item_count(project_id):
+    return db.session.execute(
+        db.select(db.func.count(Item.id)).join(Section, Item.section_id == Section.id)
+        .where(Section.project_id == project_id)
+    ).scalar()
+
+
+@job_handler('delete_project')
+def delete_project_step(job):
+    """Delete the project's sections a batch at a time, then the project itself.
+
+    Batches are whole sections (so a parent and its children always go in
+    one statement) of up to about JOB_CHUNK_SIZE items.
+    """
+    project_id = job.project_id
+    if job.total is None:
+        sections = db.session.execute(
+            db.select(db.func.count(Section.id)).where(Section.project_id == project_id)
+        ).scalar()
+        job.total = sections + _project_item_count(project_id)
+
+    chunk = _chunk_size()
+    item_count = db.select(db.func.count(Item.id)).where(Item.section_id == Section.id).scalar_subquery()
+    batch, size = [], 0
+    for section_id, count in db.session.execute(
+        db.select(Section.id, item_count).where(Section.project_id == project_id).order_by(Section.id).limit(chunk)
+    ):
+        if batch and size + count > chunk:
+            break
+        batch.append(section_id)
+        size += count
+
+    if batch:
+        db.session.execute(db.delete(Item).where(Item.section_id.in_(batch)).execution_options(synchronize_session=False))
+        db.session.execute(db.delete(SectionStat).where(SectionStat.section_id.in_(batch)))
+        db.session.execute(db.delete(Section).where(Section.id.in_(batch)).execution_options(synchronize_session=False))
+        job.progress = min(job.progress + size + len(batch), job.total)
+        return False
+
+    # Content is gone; the index is cleared by project in one statement
+    search.remove_project(project_id)
+    stats.remove_project(project_id)
+    db.session.execute(db.delete(ProjectMember).where(ProjectMember.project_id == project_id))
+    db.session.execute(db.delete(ProjectChange).where(ProjectChange.project_id == project_id))
+    db.session.execute(db.delete(Project).where(Project.id == project_id).execution_options(synchronize_session=False))
+    queue_changes(project_id, None, [('project', project_id, 'deleted')])
+    job.progress = job.total
+    job.result = {'message': 'Project deleted successfully'}
+    project_cache.invalidate(project_id)
+    membership_cache.invalidate(project_id=project_id)
+    return True
+
+
+@job_handler('reindex_project')
+def reindex_project_step(job):
+    """Rebuild the project's search documents, items in id order a chunk at a time."""
+    project_id = job.project_id
+    checkpoint = job.checkpoint or {}
+    if 'after_id' not in checkpoint:
+        search.remove_project(project_id)
+        section_ids = db.session.execute(
+            db.select(Section.id).where(Section.project_id == project_id)
+        ).scalars().all()
+        search.index_sections(section_ids)
+        job.total = len(section_ids) + _project_item_count(project_id)
+        job.progress = len(section_ids)
+        job.checkpoint = {'after_id': 0}
+        return False
+
+    chunk = _chunk_size()
+    item_ids = db.session.execute(
+        db.select(Item.id).join(Section, Item.section_id == Section.id)
+        .where(Section.project_id == project_id, Item.id > checkpoint['after_id'])
+        .order_by(Item.id).limit(chunk)
+    ).scalars().all()
+    search.index_items(item_ids)
+    job.progress = min(job.progress + len(item_ids), job.total)
+    if len(item_ids) < chunk:
+        job.progress = job.total
+        job.result = {'indexed': job.total, 'backend': search.backend.name}
+        return True
+    job.checkpoint = {'after_id': item_ids[-1]}
+    return False
+
+
+@jobs_cli.command('work')
+@click.option('--threads', default=WORKERS, show_default=True, help='Jobs to run at once.')
+def work_command(threads):
+    """Run jobs in this process until interrupted (for JOB_WORKERS=0 web servers)."""
+    for n in range(threads - 1):
+        threading.Thread(target=job_runner.work, name=f'job-worker-{n + 1}', daemon=True).start()
+    click.echo(f'Running jobs with {threads} thread(s)')
+    job_runner.work()
+
+
+@jobs_cli.command('prune')
+@click.option('--days', default=7, show_default=True, help='Keep finished jobs younger than this.')
+def prune_command(days):
+    """Delete finished jobs older than --days."""
+    cutoff = datetime.utcnow() - timedelta(days=days)
+    deleted = db.session.execute(
+        db.delete(Job).where(Job.status.in_(FINISHED), Job.finished_at < cutoff)
+    ).rowcount
+    db.session.commit()
+    click.echo(f'Deleted {deleted} finished job(s)')
+
+
+def init_jobs(app):
+    job_runner.configure(
+        app,
+        workers=app.config.get('JOB_WORKERS', WORKERS),
+        poll=app.config.get('JOB_POLL_SECONDS', POLL_SECONDS),
+        lease=app.config.get('JOB_LEASE_SECONDS', LEASE_SECONDS),
+        max_attempts=app.config.get('JOB_MAX_ATTEMPTS', MAX_ATTEMPTS)
+    )
+    # Also picks up jobs left queued (or abandoned) by a previous run, once a worker serves a request
+    app.before_request(job_runner.ensure_started)
+
+    if not event.contains(db.session, 'after_commit', _wake_committed):
+        event.listen(db.session, 'after_commit', _wake_committed)
+        event.listen(db.session, 'after_rollback', _discard_rolled_back)
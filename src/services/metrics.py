@@ -0,0 +1,301 @@
+import hmac
+import re
+import threading
+import time
+from contextlib import contextmanager
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import event
+from src.models.user import db
+from src.services.cache import project_cache
+from src.services.profiler import profiler
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+STATEMENT_BUCKETS = (1, 2, 3, 5, 10, 20, 50, 100, 250)
+SLOW_QUERY_MS = 200
+MAX_LOGGED_SQL = 1000
+
+
+class RequestStats:
+    """Database and serialization work done while serving one request."""
+
+    __slots__ = ('started', 'statements', 'db_seconds', 'rows', 'serialize_seconds', 'slow_statements')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.statements = 0
+        self.db_seconds = 0.0
+        self.rows = 0
+        self.serialize_seconds = 0.0
+        self.slow_statements = 0
+
+
+def current_stats():
+    """Stats of the request being served, or None outside requests or with metrics off."""
+    return g.get('_request_stats') if has_request_context() else None
+
+
+@contextmanager
+def timed_serialization():
+    stats = current_stats()
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        if stats is not None:
+            stats.serialize_seconds += time.perf_counter() - started
+
+
+class MetricsRegistry:
+    """Counters and histograms keyed by label values, rendered in the Prometheus text format.
+
+    Values live in this process only; under gunicorn each worker reports
+    its own, so scrape workers individually (or sum what you get).
+    """
+
+    def __init__(self):
+        self._metrics = {}
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def counter(self, name, help_text, labels=()):
+        self._metrics[name] = ('counter', help_text, tuple(labels), None)
+
+    def histogram(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        self._metrics[name] = ('histogram', help_text, tuple(labels), tuple(buckets))
+
+    def inc(self, name, label_values=(), amount=1):
+        with self._lock:
+            key = (name, tuple(label_values))
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def observe(self, name, label_values, value):
+        buckets = self._metrics[name][3]
+        with self._lock:
+            key = (name, tuple(label_values))
+            counts = self._values.get(key)
+            if counts is None:
+                counts = self._values[key] = [0] * (len(buckets) + 2)  # per bucket, then sum and count
+            for i, bound in enumerate(buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            counts[-2] += value
+            counts[-1] += 1
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+    def render(self, extra=()):
+        """Exposition text for every metric, followed by `extra` (name, type, help, value) gauges."""
+        with self._lock:
+            values = {key: list(value) if isinstance(value, list) else value for key, value in self._values.items()}
+
+        lines = []
+        for name, (kind, help_text, labels, buckets) in self._metrics.items():
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+            for (metric, label_values), value in sorted(values.items()):
+                if metric != name:
+                    continue
+                pairs = list(zip(labels, label_values))
+                if kind == 'counter':
+                    lines.append(f'{name}{_labels(pairs)} {_number(value)}')
+                    continue
+                cumulative = 0
+                for bound, count in zip(buckets, value):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{_labels(pairs + [("le", _number(bound))])} {cumulative}')
+                lines.append(f'{name}_bucket{_labels(pairs + [("le", "+Inf")])} {value[-1]}')
+                lines.append(f'{name}_sum{_labels(pairs)} {_number(value[-2])}')
+                lines.append(f'{name}_count{_labels(pairs)} {value[-1]}')
+        for name, kind, help_text, value in extra:
+            lines.extend([f'# HELP {name} {help_text}', f'# TYPE {name} {kind}', f'{name} {_number(value)}'])
+        return '\n'.join(lines) + '\n'
+
+
+def _labels(pairs):
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{key}="{value}"' for (key, _), value in zip(pairs, escaped)) + '}'
+
+
+def _number(value):
+    return repr(round(value, 6)) if isinstance(value, float) else str(value)
+
+
+metrics = MetricsRegistry()
+metrics.counter('pseudocode_http_requests_total', 'Requests served.', ('endpoint', 'method', 'status'))
+metrics.histogram('pseudocode_http_request_duration_seconds', 'Time to build each response.', ('endpoint',))
+metrics.counter('pseudocode_db_statements_total', 'SQL statements executed while serving requests.', ('endpoint',))
+metrics.histogram('pseudocode_db_statements_per_request', 'SQL statements per request.', ('endpoint',),
+                  buckets=STATEMENT_BUCKETS)
+metrics.counter('pseudocode_db_seconds_total', 'Time spent executing SQL while serving requests.', ('endpoint',))
+metrics.counter('pseudocode_db_rows_fetched_total', 'Rows fetched from the database while serving requests.',
+                ('endpoint',))
+metrics.counter('pseudocode_db_slow_statements_total', 'Statements slower than SLOW_QUERY_MS.', ('endpoint',))
+metrics.counter('pseudocode_serialization_seconds_total', 'Time spent encoding JSON responses.', ('endpoint',))
+
+
+class CountingCursor:
+    """DBAPI cursor proxy that counts the rows handed back by fetch*() into the request's stats."""
+
+    __slots__ = ('_cursor', '_stats')
+
+    def __init__(self, cursor, stats):
+        self._cursor = cursor
+        self._stats = stats
+
+    def fetchone(self):
+        row = self._cursor.fetchone()
+        if row is not None:
+            self._stats.rows += 1
+        return row
+
+    def fetchmany(self, *args, **kwargs):
+        rows = self._cursor.fetchmany(*args, **kwargs)
+        self._stats.rows += len(rows)
+        return rows
+
+    def fetchall(self):
+        rows = self._cursor.fetchall()
+        self._stats.rows += len(rows)
+        return rows
+
+    def __iter__(self):
+        return iter(self.fetchone, None)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+def redact(parameters):
+    """Keep the shape of bound parameters (types, string lengths) but none of the values."""
+    if isinstance(parameters, dict):
+        return {key: redact(value) for key, value in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        if parameters and isinstance(parameters[0], (list, tuple, dict)):
+            return f'<{len(parameters)} rows of {redact(parameters[0])}>'
+        return [redact(value) for value in parameters]
+    if parameters is None:
+        return None
+    if isinstance(parameters, (str, bytes)):
+        return f'<{type(parameters).__name__}:{len(parameters)}>'
+    return f'<{type(parameters).__name__}>'
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context._metrics_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, '_metrics_started', None)
+    stats = current_stats()
+    if started is None or stats is None:
+        return
+    elapsed = time.perf_counter() - started
+    stats.statements += 1
+    stats.db_seconds += elapsed
+    if context.cursor is cursor:
+        context.cursor = CountingCursor(cursor, stats)
+
+    slow_ms = current_app.config.get('SLOW_QUERY_MS', SLOW_QUERY_MS)
+    if slow_ms and elapsed * 1000 >= slow_ms:
+        stats.slow_statements += 1
+        sql = re.sub(r'\s+', ' ', statement).strip()
+        current_app.logger.warning(
+            'Slow query (%.0f ms) in %s: %s | parameters: %s',
+            elapsed * 1000, request.endpoint, sql[:MAX_LOGGED_SQL], redact(parameters)
+        )
+
+
+def _start_request():
+    g._request_stats = RequestStats()
+    if profiler.enabled:
+        profiler.begin()
+
+
+def _finish_request(response):
+    stats = g.get('_request_stats')
+    if stats is None:
+        return response
+    app = current_app._get_current_object()
+    request_line = (request.endpoint or 'unmatched', request.method, request.path)
+    if response.is_streamed and response.mimetype != 'text/event-stream':
+        # The body is produced after the view returns (exports), so time it until the server has sent it.
+        # Event streams stay open while the client listens; for them the time to open the stream is kept.
+        response.call_on_close(lambda: _record_request(app, stats, request_line, response.status_code))
+    else:
+        g.pop('_request_stats')
+        _record_request(app, stats, request_line, response.status_code)
+    return response
+
+
+def _record_request(app, stats, request_line, status_code):
+    endpoint, method, path = request_line
+    elapsed = time.perf_counter() - stats.started
+    metrics.inc('pseudocode_http_requests_total', (endpoint, method, status_code))
+    metrics.observe('pseudocode_http_request_duration_seconds', (endpoint,), elapsed)
+    metrics.observe('pseudocode_db_statements_per_request', (endpoint,), stats.statements)
+    if stats.statements:
+        metrics.inc('pseudocode_db_statements_total', (endpoint,), stats.statements)
+        metrics.inc('pseudocode_db_seconds_total', (endpoint,), stats.db_seconds)
+        metrics.inc('pseudocode_db_rows_fetched_total', (endpoint,), stats.rows)
+    if stats.slow_statements:
+        metrics.inc('pseudocode_db_slow_statements_total', (endpoint,), stats.slow_statements)
+    if stats.serialize_seconds:
+        metrics.inc('pseudocode_serialization_seconds_total', (endpoint,), stats.serialize_seconds)
+
+    if profiler.enabled:
+        profile = profiler.end(endpoint, elapsed)
+        if profile:
+            app.logger.warning('Slow request (%.0f ms) %s %s: profile written to %s',
+                               elapsed * 1000, method, path, profile)
+
+
+def _cache_gauges():
+    cache = project_cache.stats()
+    gauges = [
+        ('pseudocode_project_cache_hits_total', 'counter', 'Project tree cache hits.', cache['hits']),
+        ('pseudocode_project_cache_misses_total', 'counter', 'Project tree cache misses.', cache['misses']),
+    ]
+    if 'size_bytes' in cache:
+        gauges.append(('pseudocode_project_cache_bytes', 'gauge', 'Bytes held by the local tree cache.',
+                       cache['size_bytes']))
+    return gauges
+
+
+def metrics_endpoint():
+    token = current_app.config.get('METRICS_TOKEN')
+    if not token:
+        # Endpoint names and traffic are not for the public; scraping needs a configured token
+        return current_app.response_class('Set METRICS_TOKEN to read metrics\n', status=403, mimetype='text/plain')
+    if not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return current_app.response_class('Unauthorized\n', status=401, mimetype='text/plain')
+    return current_app.response_class(metrics.render(_cache_gauges()),
+                                      mimetype='text/plain; version=0.0.4; charset=utf-8')
+
+
+def init_metrics(app):
+    if not app.config.get('METRICS_ENABLED', True):
+        return
+
+    # Opt-in: sample request stacks and keep the ones of requests slower than this
+    profiler.configure(
+        threshold=app.config.get('PROFILE_SLOW_REQUESTS_MS', 0) / 1000,
+        interval=app.config.get('PROFILE_INTERVAL_MS', 5) / 1000,
+        directory=app.config.get('PROFILE_DIR')
+    )
+
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
+    app.add_url_rule('/metrics', 'metrics', metrics_endpoint)
+
+    with app.app_context():
+        engines = list(db.engines.values())  # primary plus any replica and shard binds
+    for engine in engines:
+        if not event.contains(engine, 'after_cursor_execute', _after_cursor_execute):
+            event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+            event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
@@ -0,0 +1,219 @@
+import zlib
+from datetime import datetime
+import click
+from flask.cli import AppGroup
+from sqlalchemy.orm import Session
+from src.models.user import db
+from src.services import stats
+
+db_cli = AppGroup('db', help='Schema migrations and index checks.')
+
+MIGRATION_TABLE = 'schema_migration'
+LOCK_ID = zlib.crc32(b'talentlms-schema-migrations')
+
+
+class AddColumn:
+    """Add a column that db.create_all() can't add to an existing table."""
+
+    def __init__(self, table, column, ddl):
+        self.table = table
+        self.column = column
+        self.ddl = ddl
+
+    def apply(self, connection):
+        inspector = db.inspect(connection)
+        if not inspector.has_table(self.table):
+            return  # e.g. primary-only tables on a shard
+        columns = {column['name'] for column in inspector.get_columns(self.table)}
+        if self.column not in columns:
+            connection.execute(db.text(f'ALTER TABLE {self.table} ADD COLUMN {self.column} {self.ddl}'))
+            connection.commit()
+
+
+class CreateIndex:
+    """Build an index without blocking writes (CONCURRENTLY) on PostgreSQL."""
+
+    def __init__(self, name, table, columns):
+        self.name = name
+        self.table = table
+        self.columns = columns
+
+    def apply(self, connection):
+        has_table = db.inspect(connection).has_table(self.table)
+        # End the transaction the inspection began: CONCURRENTLY waits for every open one
+        connection.commit()
+        if not has_table:
+            return
+        column_list = ', '.join(self.columns)
+        if connection.dialect.name == 'postgresql':
+            # CONCURRENTLY can't run inside a transaction, so build on a connection of its own.
+            # A failed build leaves an INVALID index behind that IF NOT EXISTS would silently keep
+            with connection.engine.connect().execution_options(isolation_level='AUTOCOMMIT') as autocommit:
+                invalid = autocommit.execute(db.text(
+                    'SELECT 1 FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid '
+                    'WHERE c.relname = :name AND NOT i.indisvalid'
+                ), {'name': self.name}).first()
+                if invalid:
+                    autocommit.execute(db.text(f'DROP INDEX CONCURRENTLY IF EXISTS {self.name}'))
+                autocommit.execute(db.text(
+                    f'CREATE INDEX CONCURRENTLY IF NOT EXISTS {self.name} ON {self.table} ({column_list})'
+                ))
+        else:
+            connection.execute(db.text(f'CREATE INDEX IF NOT EXISTS {self.name} ON {self.table} ({column_list})'))
+            connection.commit()
+
+
+class Backfill:
+    """Fill rows derived from existing data, e.g. counters for items written before they were kept."""
+
+    def __init__(self, table, fill):
+        self.table = table
+        self.fill = fill
+
+    def apply(self, connection):
+        if not db.inspect(connection).has_table(self.table):
+            return
+        # Bound to this connection, so it fills whichever database (primary or shard) is being upgraded
+        with Session(bind=connection) as session:
+            self.fill(session)
+            session.commit()
+        connection.commit()
+
+
+# Ordered, append-only. Each step is idempotent, so databases built by
+# db.create_all() (which already have everything) just record them as applied.
+MIGRATIONS = [
+    ('0001_project_revision', [
+        AddColumn('project', 'revision', 'INTEGER NOT NULL DEFAULT 0'),
+    ]),
+    ('0002_project_change_log', [
+        CreateIndex('ix_project_change_project_revision', 'project_change', ['project_id', 'revision']),
+    ]),
+    ('0003_hot_path_indexes', [
+        CreateIndex('ix_section_project_order', 'section', ['project_id', 'order_index']),
+        CreateIndex('ix_item_section_parent_order', 'item', ['section_id', 'parent_id', 'order_index']),
+        CreateIndex('ix_item_parent_order', 'item', ['parent_id', 'order_index']),
+        CreateIndex('ix_project_member_user_project', 'project_member', ['user_id', 'project_id']),
+        CreateIndex('ix_section_stat_project_id', 'section_stat', ['project_id']),
+    ]),
+    ('0004_row_versions', [
+        AddColumn('project', 'version', 'INTEGER NOT NULL DEFAULT 1'),
+        AddColumn('section', 'version', 'INTEGER NOT NULL DEFAULT 1'),
+        AddColumn('item', 'version', 'INTEGER NOT NULL DEFAULT 1'),
+    ]),
+    ('0005_project_deleting', [
+        AddColumn('project', 'deleting', 'BOOLEAN NOT NULL DEFAULT FALSE'),
+    ]),
+    ('0006_section_stat_backfill', [
+        # section_stat arrived empty on databases that already had items
+        Backfill('section_stat', lambda session: stats.rebuild(session=session)),
+    ]),
+]
+
+
+def _applied(connection):
+    connection.execute(db.text(
+        f'CREATE TABLE IF NOT EXISTS {MIGRATION_TABLE} ('
+        'version VARCHAR(100) PRIMARY KEY, applied_at TIMESTAMP NOT NULL)'
+    ))
+    connection.commit()
+    return set(connection.execute(db.text(f'SELECT version FROM {MIGRATION_TABLE}')).scalars())
+
+
+def upgrade(app, engine=None):
+    """Apply pending migrations to the primary (or `engine`); safe to call from every worker at startup."""
+    with app.app_context():
+        with (engine or db.engine).connect() as connection:
+            is_postgres = connection.dialect.name == 'postgresql'
+            if is_postgres:
+                # Only one worker migrates; the others wait and then find nothing to do
+                connection.execute(db.text('SELECT pg_advisory_lock(:id)'), {'id': LOCK_ID})
+                connection.commit()
+            try:
+                applied = _applied(connection)
+                done = []
+                for version, steps in MIGRATIONS:
+                    if version in applied:
+                        continue
+                    for step in steps:
+                        step.apply(connection)
+                    connection.execute(
+                        db.text(f'INSERT INTO {MIGRATION_TABLE} (version, applied_at) VALUES (:version, :applied_at)'),
+                        {'version': version, 'applied_at': datetime.utcnow()}
+                    )
+                    connection.commit()
+                    done.append(version)
+                return done
+            finally:
+                if is_postgres:
+                    connection.execute(db.text('SELECT pg_advisory_unlock(:id)'), {'id': LOCK_ID})
+                    connection.commit()
+
+
+# Hot queries and the index each must use; statements mirror the route queries
+INDEX_CHECKS = [
+    ('get_project sections', 'ix_section_project_order',
+     'SELECT * FROM section WHERE project_id = 1 ORDER BY order_index'),
+    ('create_item max(order_index)', 'ix_item_section_parent_order',
+     'SELECT max(order_index) FROM item WHERE section_id = 1 AND parent_id = 1'),
+    ('item children', 'ix_item_parent_order',
+     'SELECT * FROM item WHERE parent_id = 1 ORDER BY order_index'),
+    ('get_projects memberships', 'ix_project_member_user_project',
+     'SELECT project_id FROM project_member WHERE user_id = 1'),
+    ('changes since revision', 'ix_project_change_project_revision',
+     'SELECT * FROM project_change WHERE project_id = 1 AND revision > 5'),
+]
+
+
+def explain_index_usage():
+    """Run EXPLAIN for each hot query; returns [(name, expected index, plan text, used)]."""
+    results = []
+    with db.engine.connect() as connection:
+        is_postgres = connection.dialect.name == 'postgresql'
+        if is_postgres:
+            # Small tables make sequential scans cheapest; ask what the plan would be at scale
+            connection.execute(db.text('SET enable_seqscan = off'))
+        try:
+            for name, index, sql in INDEX_CHECKS:
+                if is_postgres:
+                    plan = '\n'.join(connection.execute(db.text(f'EXPLAIN {sql}')).scalars())
+                else:
+                    plan = '\n'.join(row[-1] for row in connection.execute(db.text(f'EXPLAIN QUERY PLAN {sql}')))
+                results.append((name, index, plan, index in plan))
+        finally:
+            if is_postgres:
+                # Hand the pooled connection back as it was: under autocommit a rollback does not undo SET
+                connection.rollback()
+                connection.execute(db.text('RESET enable_seqscan'))
+                connection.commit()
+    return results
+
+
+@db_cli.command('upgrade')
+def upgrade_command():
+    """Apply pending schema migrations."""
+    from flask import current_app
+    done = upgrade(current_app)
+    click.echo(f"Applied: {', '.join(done)}" if done else 'Schema is up to date')
+
+
+@db_cli.command('status')
+def status_command():
+    """List migrations and whether they have been applied."""
+    with db.engine.connect() as connection:
+        applied = _applied(connection)
+    for version, _ in MIGRATIONS:
+        click.echo(f"{'applied' if version in applied else 'pending'}  {version}")
+
+
+@db_cli.command('check-indexes')
+def check_indexes_command():
+    """Fail if the planner does not use the expected index for a hot query."""
+    failures = 0
+    for name, index, plan, used in explain_index_usage():
+        click.echo(f"{'ok  ' if used else 'FAIL'}  {name}: expected {index}")
+        if not used:
+            failures += 1
+            click.echo('      ' + plan.replace('\n', '\n      '))
+    if failures:
+        raise SystemExit(1)
@@ -0,0 +1,72 @@
+from src.models.user import db
+
+# Spacing between consecutive order_index values. Moving a row between two
+# siblings takes the midpoint, so a gap of 1024 absorbs about ten moves into
+# the same slot before the siblings have to be renumbered.
+ORDER_GAP = 1024
+
+
+def next_order_index(max_order):
+    return (max_order or 0) + ORDER_GAP
+
+
+def order_between(lower, upper):
+    """Pick an order_index strictly between two neighbours, or None if there is no room."""
+    if lower is None and upper is None:
+        return ORDER_GAP
+    if lower is None:
+        return upper - ORDER_GAP
+    if upper is None:
+        return lower + ORDER_GAP
+    if upper - lower > 1:
+        return (lower + upper) // 2
+    return None
+
+
+def rebalance(model, container):
+    """Renumber all siblings in a container with ORDER_GAP spacing; returns the ids that changed."""
+    siblings = model.query.filter_by(**container).order_by(model.order_index, model.id).all()
+    rewritten = []
+    for position, sibling in enumerate(siblings, start=1):
+        if sibling.order_index != position * ORDER_GAP:
+            sibling.order_index = position * ORDER_GAP
+            rewritten.append(sibling.id)
+    db.session.flush()
+    return rewritten
+
+
+def place(entity, container, before_id=None, after_id=None):
+    """Give `entity` an order_index that puts it in `container` next to an anchor.
+
+    `container` is the filter_by() mapping that selects the siblings, e.g.
+    {'project_id': 1} for sections or {'section_id': 2, 'parent_id': None}
+    for items. Without an anchor the entity goes to the end. Only the moved
+    row is updated unless the gap between the neighbours is exhausted; the
+    ids of other rows renumbered then are returned, for the change log.
+    """
+    model = type(entity)
+    siblings = model.query.filter_by(**container).filter(model.id != entity.id)
+
+    if after_id is not None:
+        anchor = siblings.filter(model.id == after_id).first()
+        if anchor is None:
+            raise ValueError(f'after_id {after_id} is not a sibling in the target position')
+        lower = anchor.order_index
+        upper = siblings.filter(model.order_index > lower).with_entities(db.func.min(model.order_index)).scalar()
+    elif before_id is not None:
+        anchor = siblings.filter(model.id == before_id).first()
+        if anchor is None:
+            raise ValueError(f'before_id {before_id} is not a sibling in the target position')
+        upper = anchor.order_index
+        lower = siblings.filter(model.order_index < upper).with_entities(db.func.max(model.order_index)).scalar()
+    else:
+        lower = siblings.with_entities(db.func.max(model.order_index)).scalar()
+        upper = None
+
+    key = order_between(lower, upper)
+    if key is None:
+        rewritten = rebalance(model, container)
+        return rewritten + place(entity, container, before_id=before_id, after_id=after_id)
+
+    entity.order_index = key
+    return []
@@ -0,0 +1,45 @@
+import base64
+import json
+from src.models.user import db
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+
+def encode_cursor(order_index, row_id):
+    raw = json.dumps([order_index, row_id], separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Turn an opaque cursor back into (order_index, id); raises ValueError if malformed."""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        order_index, row_id = json.loads(base64.urlsafe_b64decode(padded))
+        return int(order_index), int(row_id)
+    except (TypeError, ValueError, json.JSONDecodeError) as e:
+        raise ValueError('Invalid cursor') from e
+
+
+def page_args(args):
+    """Read limit/cursor from request args."""
+    limit = min(max(args.get('limit', DEFAULT_PAGE_SIZE, type=int), 1), MAX_PAGE_SIZE)
+    cursor = args.get('cursor')
+    return limit, decode_cursor(cursor) if cursor else None
+
+
+def keyset_page(query, model, limit, after):
+    """Return one page of `query` in (order_index, id) order and the cursor for the next one.
+
+    Seeks past `after` instead of using OFFSET, so every page costs the same
+    no matter how deep into the list it is.
+    """
+    if after is not None:
+        query = query.filter(db.tuple_(model.order_index, model.id) > after)
+    rows = query.order_by(model.order_index, model.id).limit(limit + 1).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].order_index, rows[-1].id)
+    return rows, next_cursor
@@ -0,0 +1,86 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from werkzeug.security import generate_password_hash, check_password_hash
+
+DEFAULT_METHOD = 'scrypt'  # werkzeug's default; e.g. 'scrypt:65536:8:1' or 'pbkdf2:sha256:600000'
+HASH_TIMEOUT = 10
+
+
+class HasherBusy(Exception):
+    """Too many hashes are already queued; the request should be retried later."""
+
+
+class PasswordHasher:
+    """Runs password hashing in a small process pool instead of request threads.
+
+    Hashing is CPU-bound by design, so running it inline holds the GIL and
+    stalls every other request the worker is serving. At most `max_pending`
+    hashes may be queued per process; beyond that callers get HasherBusy
+    rather than piling more work onto the CPU. With workers=0 hashing runs
+    inline.
+    """
+
+    def __init__(self, method=DEFAULT_METHOD, workers=1, max_pending=16):
+        self.configure(method, workers, max_pending)
+
+    def configure(self, method=DEFAULT_METHOD, workers=1, max_pending=16):
+        self.method = method
+        self.workers = workers
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._pool = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._reference = None
+
+    def _reference_hash(self):
+        # Its prefix identifies the current parameters, and checking against it
+        # makes a login for an unknown user cost as much as a real one
+        if self._reference is None:
+            self._reference = generate_password_hash('', self.method)
+        return self._reference
+
+    def _executor(self):
+        # One pool per process; spawned rather than forked, since forking a threaded worker is unsafe
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context('spawn'))
+                    self._pid = os.getpid()
+        return self._pool
+
+    def _run(self, function, *args):
+        if not self.workers:
+            return function(*args)
+        if not self._slots.acquire(blocking=False):
+            raise HasherBusy()
+        try:
+            return self._executor().submit(function, *args).result(timeout=HASH_TIMEOUT)
+        finally:
+            self._slots.release()
+
+    def hash(self, password):
+        return self._run(generate_password_hash, password, self.method)
+
+    def verify(self, password_hash, password):
+        return self._run(check_password_hash, password_hash, password)
+
+    def verify_unknown(self, password):
+        """Spend the same work as verify() for a user that doesn't exist."""
+        self._run(check_password_hash, self._reference_hash(), password)
+        return False
+
+    def needs_rehash(self, password_hash):
+        return password_hash.split('$', 1)[0] != self._reference_hash().split('$', 1)[0]
+
+
+password_hasher = PasswordHasher(workers=0)
+
+
+def init_passwords(app):
+    password_hasher.configure(
+        method=app.config.get('PASSWORD_HASH_METHOD', DEFAULT_METHOD),
+        workers=app.config.get('PASSWORD_HASH_WORKERS', 1),
+        max_pending=app.config.get('PASSWORD_HASH_MAX_PENDING', 16)
+    )
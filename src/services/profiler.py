@@ -0,0 +1,86 @@
+import os
+import re
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+
+SAMPLE_INTERVAL = 0.005
+MAX_DEPTH = 128
+
+
+def _frame_name(frame):
+    return f"{frame.f_globals.get('__name__', '?')}:{frame.f_code.co_name}"
+
+
+def _stack(frame):
+    names = []
+    while frame is not None and len(names) < MAX_DEPTH:
+        names.append(_frame_name(frame))
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+class SamplingProfiler:
+    """Samples the stacks of threads that are serving requests and keeps those of slow ones.
+
+    A background thread records the current stack of every thread inside a
+    request each `interval` seconds. When a request takes `threshold`
+    seconds or more, its samples are written out as collapsed stacks (one
+    `frame;frame;frame count` line per distinct stack), which flamegraph.pl
+    and speedscope read directly. Other requests' samples are dropped.
+    """
+
+    def __init__(self, threshold=0, interval=SAMPLE_INTERVAL, directory=None):
+        self.configure(threshold, interval, directory)
+
+    def configure(self, threshold=0, interval=SAMPLE_INTERVAL, directory=None):
+        self.threshold = threshold
+        self.interval = interval
+        self.directory = directory or os.path.join(tempfile.gettempdir(), 'pseudocode-profiles')
+        self._active = {}
+        self._pid = None
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return bool(self.threshold)
+
+    def _ensure_started(self):
+        # Threads don't survive fork, so each worker starts its own sampler on first use
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._active = {}
+                    threading.Thread(target=self._run, name='request-profiler', daemon=True).start()
+                    self._pid = os.getpid()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            frames = sys._current_frames()
+            for ident, samples in list(self._active.items()):
+                frame = frames.get(ident)
+                if frame is not None:
+                    samples[_stack(frame)] += 1
+
+    def begin(self):
+        self._ensure_started()
+        self._active[threading.get_ident()] = Counter()
+
+    def end(self, label, elapsed):
+        """Stop sampling this thread; return the path written if the request was slow, else None."""
+        samples = self._active.pop(threading.get_ident(), None)
+        if not samples or elapsed < self.threshold:
+            return None
+        os.makedirs(self.directory, exist_ok=True)
+        name = f"{time.strftime('%Y%m%d-%H%M%S')}-{re.sub(r'[^A-Za-z0-9_.-]', '_', label)}-{elapsed * 1000:.0f}ms-{os.getpid()}.folded"
+        path = os.path.join(self.directory, name)
+        with open(path, 'w') as f:
+            for stack, count in samples.most_common():
+                f.write(f'{stack} {count}\n')
+        return path
+
+
+profiler = SamplingProfiler()
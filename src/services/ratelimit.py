@@ -0,0 +1,87 @@
+import math
+import threading
+import time
+
+try:
+    import redis
+except ImportError:  # optional, only needed to share limits across workers
+    redis = None
+
+
+class LocalCounterStore:
+    """Fixed-window counters in this process."""
+
+    def __init__(self):
+        self._windows = {}
+        self._lock = threading.Lock()
+
+    def incr(self, key, window):
+        """Count a hit; return (hits in the current window, seconds until it resets)."""
+        now = time.monotonic()
+        with self._lock:
+            count, resets_at = self._windows.get(key, (0, 0))
+            if resets_at <= now:
+                if len(self._windows) > 10000:
+                    self._windows = {k: v for k, v in self._windows.items() if v[1] > now}
+                count, resets_at = 0, now + window
+            self._windows[key] = (count + 1, resets_at)
+        return count + 1, resets_at - now
+
+
+class RedisCounterStore:
+    """Fixed-window counters in Redis, shared by every worker."""
+
+    def __init__(self, url, prefix='pseudocode:ratelimit:'):
+        if redis is None:
+            raise RuntimeError('RATE_LIMIT_STORE_URL is set but the redis package is not installed')
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def incr(self, key, window):
+        key = self.prefix + key
+        pipeline = self.client.pipeline()
+        pipeline.set(key, 0, ex=window, nx=True)  # opens the window on the first hit
+        pipeline.incr(key)
+        pipeline.ttl(key)
+        _, count, ttl = pipeline.execute()
+        return count, max(ttl, 0)
+
+
+class RateLimiter:
+    """Allow `limit` hits per key per `window` seconds."""
+
+    def __init__(self, limit, window, store=None):
+        self.limit = limit
+        self.window = window
+        self.store = store or LocalCounterStore()
+
+    def hit(self, key):
+        """Record a hit; return seconds to wait if the key is over its limit, else None."""
+        if not self.limit:
+            return None
+        count, resets_in = self.store.incr(key, self.window)
+        if count > self.limit:
+            return max(1, math.ceil(resets_in))
+        return None
+
+
+def parse_limit(value):
+    """'10/60' -> (10, 60): ten hits per sixty seconds. '0' disables the limit."""
+    hits, _, seconds = str(value).partition('/')
+    return int(hits), int(seconds or 60)
+
+
+login_ip_limiter = RateLimiter(30, 60)
+login_user_limiter = RateLimiter(10, 60)
+
+
+def init_rate_limits(app):
+    url = app.config.get('RATE_LIMIT_STORE_URL')
+    store = RedisCounterStore(url) if url else LocalCounterStore()
+    enabled = app.config.get('RATE_LIMIT_ENABLED', True)
+
+    for limiter, setting in ((login_ip_limiter, 'LOGIN_IP_RATE_LIMIT'), (login_user_limiter, 'LOGIN_USER_RATE_LIMIT')):
+        limit, window = parse_limit(app.config.get(setting, f'{limiter.limit}/{limiter.window}'))
+        limiter.limit = limit if enabled else 0
+        limiter.window = window
+        limiter.store = store
@@ -0,0 +1,226 @@
+import json
+import os
+import queue
+import threading
+import time
+from collections import defaultdict
+from sqlalchemy import event
+from src.models.user import db
+
+try:
+    import redis
+except ImportError:  # optional, only needed to fan out across workers
+    redis = None
+
+TICK_SECONDS = 0.1
+HEARTBEAT_SECONDS = 15
+STREAM_SECONDS = 300  # clients reconnect after this, so a worker thread is never held forever
+SUBSCRIBER_BUFFER = 100
+MAX_STREAMS = 2  # per process; each open stream holds a worker thread
+FALLBACK_POLL_SECONDS = 10
+FALLBACK_RETRY_SECONDS = 60
+
+
+class MemoryBroker:
+    """Delivers published batches straight back to this process."""
+
+    def start(self, deliver):
+        self.deliver = deliver
+
+    def publish(self, project_id, message):
+        self.deliver(project_id, message)
+
+
+class RedisBroker:
+    """Relays batches through Redis pub/sub so every worker sees every project's changes.
+
+    Each process holds one pattern subscription and fans out to its own
+    subscribers locally.
+    """
+
+    def __init__(self, url, prefix='pseudocode:changes:'):
+        if redis is None:
+            raise RuntimeError('REALTIME_BROKER_URL is set but the redis package is not installed')
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def start(self, deliver):
+        def on_message(message):
+            project_id = int(message['channel'].decode()[len(self.prefix):])
+            deliver(project_id, message['data'].decode())
+
+        pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+        pubsub.psubscribe(**{self.prefix + '*': on_message})
+        self.thread = pubsub.run_in_thread(sleep_time=1, daemon=True)
+
+    def publish(self, project_id, message):
+        self.client.publish(f'{self.prefix}{project_id}', message)
+
+
+class ChangeHub:
+    """Per-project rooms of subscribers, fed with change batches once per tick.
+
+    Committed changes are buffered per project and collapsed to the latest
+    action per node; a background thread publishes one message per project
+    per tick. A burst of edits therefore costs one write per subscriber per
+    tick rather than one per edit.
+    """
+
+    def __init__(self, broker=None, tick=TICK_SECONDS, max_streams=MAX_STREAMS):
+        self.app = None
+        self.broker = broker or MemoryBroker()
+        self.tick = tick
+        self.max_streams = max_streams
+        self._streams = 0
+        self._pending = {}
+        self._rooms = defaultdict(set)
+        self._lock = threading.Lock()
+        self._pid = None
+
+    def configure(self, app, broker, tick=TICK_SECONDS, max_streams=MAX_STREAMS):
+        self.app = app
+        self.broker = broker
+        self.tick = tick
+        self.max_streams = max_streams
+        self._pid = None
+
+    def _ensure_started(self):
+        # Threads don't survive fork, so each worker starts its own on first use
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self.broker.start(self._deliver)
+            threading.Thread(target=self._run, name='change-hub', daemon=True).start()
+            self._pid = os.getpid()
+
+    def publish(self, project_id, revision, changes):
+        with self._lock:
+            pending = self._pending.setdefault(project_id, {'revision': revision, 'events': {}})
+            if revision is not None and (pending['revision'] is None or revision > pending['revision']):
+                pending['revision'] = revision
+            events = pending['events']
+            for entity_type, entity_id, action in changes:
+                key = (entity_type, entity_id)
+                if events.get(key) != 'created':
+                    events[key] = action
+                elif action == 'deleted':
+                    # Created and deleted within one tick: subscribers never need to hear of it
+                    del events[key]
+        self._ensure_started()
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+
+        for project_id, batch in pending.items():
+            message = json.dumps({
+                'project_id': project_id,
+                'revision': batch['revision'],
+                'events': [{'type': f'{entity_type}_{action}', 'id': entity_id}
+                           for (entity_type, entity_id), action in batch['events'].items()]
+            }, separators=(',', ':'))
+            self.broker.publish(project_id, message)
+
+    def _run(self):
+        while True:
+            time.sleep(self.tick)
+            try:
+                self.flush()
+            except Exception:
+                # No request context in this thread, so log through the app configure() was given
+                self.app.logger.exception('Change broadcast failed')
+
+    def _deliver(self, project_id, message):
+        with self._lock:
+            subscribers = list(self._rooms.get(project_id, ()))
+        for subscriber in subscribers:
+            try:
+                subscriber.put_nowait(message)
+            except queue.Full:
+                # Every batch carries the revision, so a lagging client catches up from the next one
+                pass
+
+    def subscribe(self, project_id):
+        self._ensure_started()
+        subscriber = queue.Queue(maxsize=SUBSCRIBER_BUFFER)
+        with self._lock:
+            self._rooms[project_id].add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, project_id, subscriber):
+        with self._lock:
+            room = self._rooms.get(project_id)
+            if room is not None:
+                room.discard(subscriber)
+                if not room:
+                    del self._rooms[project_id]
+
+    def open_stream(self):
+        """Take a stream slot; False once max_streams are open in this process."""
+        with self._lock:
+            if self._streams >= self.max_streams:
+                return False
+            self._streams += 1
+            return True
+
+    def close_stream(self):
+        with self._lock:
+            self._streams -= 1
+
+    def subscriber_count(self, project_id=None):
+        if project_id is not None:
+            return len(self._rooms.get(project_id, ()))
+        return sum(len(room) for room in self._rooms.values())
+
+
+change_hub = ChangeHub()
+
+
+def queue_changes(project_id, revision, changes):
+    """Broadcast `changes` once the current transaction commits."""
+    db.session.info.setdefault('realtime_changes', []).append((project_id, revision, list(changes)))
+
+
+def _publish_committed(session):
+    for project_id, revision, changes in session.info.pop('realtime_changes', ()):
+        change_hub.publish(project_id, revision, changes)
+
+
+def _discard_rolled_back(session):
+    session.info.pop('realtime_changes', None)
+
+
+def iter_events(project_id, stream_seconds=STREAM_SECONDS):
+    """Server-sent event stream of change batches for one project."""
+    subscriber = change_hub.subscribe(project_id)
+    deadline = time.monotonic() + stream_seconds
+    try:
+        yield 'retry: 2000\n\n'
+        while time.monotonic() < deadline:
+            try:
+                message = subscriber.get(timeout=HEARTBEAT_SECONDS)
+            except queue.Empty:
+                yield ': keep-alive\n\n'
+                continue
+            yield f'event: changes\ndata: {message}\n\n'
+    finally:
+        change_hub.unsubscribe(project_id, subscriber)
+
+
+def fallback_event(poll_seconds=FALLBACK_POLL_SECONDS, retry_seconds=FALLBACK_RETRY_SECONDS):
+    """A one-message stream telling the client to poll /changes instead, and when to try streaming again."""
+    data = json.dumps({'poll_seconds': poll_seconds, 'retry_seconds': retry_seconds}, separators=(',', ':'))
+    return f'event: fallback\ndata: {data}\n\n'
+
+
+def init_realtime(app):
+    url = app.config.get('REALTIME_BROKER_URL')
+    broker = RedisBroker(url) if url else MemoryBroker()
+    change_hub.configure(app, broker, tick=app.config.get('REALTIME_TICK_SECONDS', TICK_SECONDS),
+                         max_streams=app.config.get('REALTIME_MAX_STREAMS', MAX_STREAMS))
+
+    if not event.contains(db.session, 'after_commit', _publish_committed):
+        event.listen(db.session, 'after_commit', _publish_committed)
+        event.listen(db.session, 'after_rollback', _discard_rolled_back)
@@ -0,0 +1,115 @@
+import hashlib
+from flask import request, make_response
+from src.models.user import db
+from src.models.project import Project, ProjectChange
+from src.models.section import Section, Item
+from src.services.cache import project_cache
+from src.services.realtime import queue_changes
+
+
+def record_changes(project_id, changes):
+    """Bump the project revision and log the changed nodes under it.
+
+    `changes` is a list of (entity_type, entity_id, action) tuples. All of
+    them share the new revision, which is returned. Must be called inside
+    the same transaction as the write it describes. Also drops the cached
+    tree of the project, since its revision no longer matches, and queues
+    the changes for subscribers once the transaction commits.
+    """
+    revision = db.session.execute(
+        db.update(Project)
+        .where(Project.id == project_id)
+        .values(revision=Project.revision + 1)
+        .returning(Project.revision)
+    ).scalar()
+
+    # executemany, so large batches log their changes in a single statement
+    db.session.execute(db.insert(ProjectChange), [{
+        'project_id': project_id,
+        'revision': revision,
+        'entity_type': entity_type,
+        'entity_id': entity_id,
+        'action': action
+    } for entity_type, entity_id, action in changes])
+    project_cache.invalidate(project_id)
+    queue_changes(project_id, revision, changes)
+    return revision
+
+
+def record_change(project_id, entity_type, entity_id, action):
+    return record_changes(project_id, [(entity_type, entity_id, action)])
+
+
+def collect_changes(project_id, since):
+    """Return the nodes of a project that changed after revision `since`.
+
+    Each node appears once with its current state; nodes whose last change
+    is a delete are only listed by id. Deleting an item or section implies
+    the removal of everything beneath it.
+    """
+    rows = db.session.query(
+        ProjectChange.entity_type, ProjectChange.entity_id, ProjectChange.action
+    ).filter(
+        ProjectChange.project_id == project_id,
+        ProjectChange.revision > since
+    ).order_by(ProjectChange.revision, ProjectChange.id).all()
+
+    # Collapse the log so only the latest action per node counts
+    latest = {}
+    for entity_type, entity_id, action in rows:
+        latest[(entity_type, entity_id)] = action
+
+    live = {'project': set(), 'section': set(), 'item': set()}
+    deleted = {'section': [], 'item': []}
+    for (entity_type, entity_id), action in latest.items():
+        if action == 'deleted':
+            deleted.setdefault(entity_type, []).append(entity_id)
+        else:
+            live.setdefault(entity_type, set()).add(entity_id)
+
+    sections = []
+    if live['section']:
+        sections = Section.query.filter(Section.id.in_(live['section'])).order_by(Section.order_index).all()
+
+    items = []
+    if live['item']:
+        items = Item.query.filter(Item.id.in_(live['item'])).order_by(Item.order_index).all()
+
+    return {
+        'project_changed': bool(live['project']),
+        'sections': [section.to_dict() for section in sections],
+        'items': [item.to_dict() for item in items],
+        'deleted': {
+            'sections': deleted['section'],
+            'items': deleted['item']
+        }
+    }
+
+
+def project_etag(project):
+    # Every write to the project tree bumps the revision, so it fully identifies the payload
+    return f'project-{project.id}-r{project.revision}'
+
+
+def projects_list_etag(user_id, projects):
+    digest = hashlib.sha1(str(user_id).encode())
+    for project in projects:
+        digest.update(f'|{project.id}:{project.revision}'.encode())
+    return f'projects-{digest.hexdigest()}'
+
+
+def etag_matches(etag):
+    return request.if_none_match.contains(etag)
+
+
+def not_modified(etag):
+    response = make_response('', 304)
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+def with_etag(response, etag):
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
@@ -0,0 +1,296 @@
+import random
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+import sqlalchemy as sa
+from flask import g, has_app_context, request
+from flask_sqlalchemy.session import Session
+from sqlalchemy.sql.util import find_tables
+from src.services.auth import current_identity
+
+try:
+    import redis
+except ImportError:  # optional, only needed to share read-your-writes markers across workers
+    redis = None
+
+# Project-scoped tables that live on the project's shard; everything else stays on the primary
+SHARDED_TABLES = frozenset({'section', 'item', 'section_stat'})
+# Sections and items created on shard n are numbered from n * SHARD_ID_SPAN, so an id names its shard
+SHARD_ID_SPAN = 100_000_000
+STICKY_SECONDS = 5
+SAFE_METHODS = frozenset({'GET', 'HEAD', 'OPTIONS'})
+
+
+class LocalStickyStore:
+    """Per-user 'wrote recently' markers in this process."""
+
+    def __init__(self):
+        self._until = {}
+        self._lock = threading.Lock()
+
+    def mark(self, key, ttl):
+        now = time.monotonic()
+        with self._lock:
+            if len(self._until) > 10000:
+                self._until = {k: until for k, until in self._until.items() if until > now}
+            self._until[key] = now + ttl
+
+    def active(self, key):
+        return self._until.get(key, 0) > time.monotonic()
+
+
+class RedisStickyStore:
+    """Markers in Redis, so a write on one worker pins the user's reads on all of them."""
+
+    def __init__(self, url, prefix='pseudocode:sticky:'):
+        if redis is None:
+            raise RuntimeError('DATABASE_ROUTING_STORE_URL is set but the redis package is not installed')
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def mark(self, key, ttl):
+        self.client.set(self.prefix + key, 1, ex=max(int(ttl), 1))
+
+    def active(self, key):
+        return bool(self.client.exists(self.prefix + key))
+
+
+class DatabaseRouter:
+    """Chooses the engine for each statement: primary, a read replica or a project's shard.
+
+    Statements on SHARDED_TABLES go to the shard of the project the request
+    works on (set by the access decorators, or use_shard()); the rest, and
+    everything when no shard is selected, go to the primary. Raw SQL
+    follows the selected shard too, which is what the search index needs.
+
+    Within views marked @read_only, plain SELECTs on the primary go to one
+    replica per request, unless the caller wrote something in the last
+    `sticky_seconds`: then they read the primary, and see their own writes.
+    Shards have no replicas.
+    """
+
+    def __init__(self):
+        self.configure()
+
+    def configure(self, replicas=(), shards=None, shard_map=None, id_span=SHARD_ID_SPAN,
+                  sticky_seconds=STICKY_SECONDS, store=None):
+        self.replicas = list(replicas)  # bind keys
+        self.shards = dict(shards or {})  # shard number -> bind key
+        self.shard_map = dict(shard_map or {})  # project id -> shard number
+        self.id_span = id_span
+        self.sticky_seconds = sticky_seconds
+        self.store = store or LocalStickyStore()
+
+    @property
+    def enabled(self):
+        return bool(self.replicas or self.shards)
+
+    def shard_for_project(self, project_id):
+        return self.shard_map.get(project_id, 0)
+
+    def shard_for_id(self, entity_id):
+        """Shard holding a section or item, from the range its id falls in."""
+        shard = int(entity_id) // self.id_span if self.shards else 0
+        return shard if shard in self.shards else 0
+
+    def current_shard(self):
+        return g.get('_db_shard', 0) if has_app_context() else 0
+
+    def use_project(self, project_id):
+        """Route the rest of this request (or app context) to the project's shard."""
+        g._db_shard = self.shard_for_project(project_id)
+
+    def use_id(self, entity_id):
+        g._db_shard = self.shard_for_id(entity_id)
+
+    @contextmanager
+    def use_shard(self, shard):
+        previous = g.get('_db_shard', 0)
+        g._db_shard = shard
+        try:
+            yield
+        finally:
+            g._db_shard = previous
+
+    def all_shards(self):
+        return [0] + sorted(self.shards)
+
+    def group_by_shard(self, project_ids):
+        """{shard: [project ids]} for fanning a multi-project query out."""
+        groups = {}
+        for project_id in project_ids:
+            groups.setdefault(self.shard_for_project(project_id), []).append(project_id)
+        return groups
+
+    def mark_written(self, user_id):
+        if self.replicas and user_id is not None:
+            self.store.mark(f'user:{user_id}', self.sticky_seconds)
+
+    def _replica_key(self):
+        if not (self.replicas and g.get('_db_read_only')):
+            return None
+        if '_db_replica' not in g:
+            identity = current_identity()
+            sticky = identity is not None and self.store.active(f'user:{identity.user_id}')
+            g._db_replica = None if sticky else random.choice(self.replicas)
+        return g._db_replica
+
+    def engine_for(self, session, mapper, clause):
+        """Engine for a statement, or None for the primary."""
+        if mapper is not None:
+            sharded = sa.inspect(mapper).local_table.name in SHARDED_TABLES
+        elif isinstance(clause, sa.TextClause):
+            sharded = True
+        elif clause is not None:
+            sharded = any(getattr(table, 'name', None) in SHARDED_TABLES
+                          for table in find_tables(clause, include_crud=True))
+        else:
+            sharded = False
+
+        shard = self.current_shard()
+        if sharded and shard:
+            return session._db.engines[self.shards[shard]]
+
+        if session._flushing or clause is None or not getattr(clause, 'is_select', False):
+            return None
+        if getattr(clause, '_for_update_arg', None) is not None:
+            return None
+        replica = self._replica_key()
+        return session._db.engines[replica] if replica else None
+
+
+router = DatabaseRouter()
+
+
+class RoutingSession(Session):
+    """Flask-SQLAlchemy session that asks the router which database a statement goes to."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and router.enabled and has_app_context():
+            engine = router.engine_for(self, mapper, clause)
+            if engine is not None:
+                return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def read_only(view):
+    """Let the view's SELECTs be served by a read replica (see DatabaseRouter)."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        g._db_read_only = True
+        return view(*args, **kwargs)
+    return wrapper
+
+
+def _parse_pairs(value):
+    # 'a=b,c=d' -> [('a', 'b'), ('c', 'd')]
+    return [tuple(part.strip() for part in pair.split('=', 1)) for pair in (value or '').split(',') if pair.strip()]
+
+
+def configure_binds(app):
+    """Register replica and shard engines as Flask-SQLAlchemy binds; call before db.init_app."""
+    binds = dict(app.config.get('SQLALCHEMY_BINDS') or {})
+    replicas = []
+    for n, url in enumerate(url for url in (app.config.get('DATABASE_REPLICA_URLS') or '').split(',') if url.strip()):
+        binds[f'replica-{n}'] = url.strip()
+        replicas.append(f'replica-{n}')
+
+    shards = {}
+    for number, url in _parse_pairs(app.config.get('DATABASE_SHARDS')):
+        if not number.isdigit() or int(number) < 1:
+            raise RuntimeError(f'DATABASE_SHARDS: shard numbers start at 1, got {number!r}')
+        binds[f'shard-{number}'] = url
+        shards[int(number)] = f'shard-{number}'
+
+    shard_map = {}
+    for project_id, number in _parse_pairs(app.config.get('SHARD_MAP')):
+        if int(number) not in shards:
+            raise RuntimeError(f'SHARD_MAP: project {project_id} is mapped to unknown shard {number}')
+        shard_map[int(project_id)] = int(number)
+
+    url = app.config.get('DATABASE_ROUTING_STORE_URL')
+    app.config['SQLALCHEMY_BINDS'] = binds
+    router.configure(
+        replicas=replicas,
+        shards=shards,
+        shard_map=shard_map,
+        id_span=app.config.get('SHARD_ID_SPAN', SHARD_ID_SPAN),
+        sticky_seconds=app.config.get('REPLICA_STICKY_SECONDS', STICKY_SECONDS),
+        store=RedisStickyStore(url) if url else LocalStickyStore()
+    )
+
+
+def _shard_tables(metadata):
+    # Copies of the sharded tables without foreign keys into primary-only tables (project)
+    shard_metadata = sa.MetaData()
+    tables = []
+    for name in sorted(SHARDED_TABLES):
+        copy = metadata.tables[name].to_metadata(shard_metadata)
+        for constraint in list(copy.foreign_key_constraints):
+            if constraint.elements[0].target_fullname.split('.')[0] not in SHARDED_TABLES:
+                copy.constraints.discard(constraint)
+                for element in constraint.elements:
+                    element.parent.foreign_keys.discard(element)
+        # Ids never go back to ones used before, so numbering stays inside the shard's range
+        copy.dialect_options['sqlite']['autoincrement'] = True
+        tables.append(copy)
+    return tables
+
+
+def _start_ids_at(connection, table, start):
+    if connection.dialect.name == 'sqlite':
+        connection.execute(sa.text('UPDATE sqlite_sequence SET seq = :start WHERE name = :name AND seq < :start'),
+                           {'name': table, 'start': start})
+        connection.execute(sa.text(
+            'INSERT INTO sqlite_sequence (name, seq) SELECT :name, :start '
+            'WHERE NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = :name)'
+        ), {'name': table, 'start': start})
+    elif connection.dialect.name == 'postgresql':
+        connection.execute(sa.text(
+            f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), "
+            f"GREATEST(:start, (SELECT COALESCE(MAX(id), 0) FROM {table})))"
+        ), {'start': start})
+    else:
+        raise RuntimeError(f'Sharding is not supported on {connection.dialect.name}')
+
+
+def _mark_writer(response):
+    if request.method not in SAFE_METHODS and response.status_code < 400:
+        identity = current_identity()
+        if identity is not None:
+            router.mark_written(identity.user_id)
+    return response
+
+
+def init_routing(app):
+    """Create shard schemas and id ranges, and pin writers' reads to the primary."""
+    # Imported here: the models import this module for RoutingSession
+    from src.models.user import db
+    from src.services import search
+    from src.services.migrations import upgrade
+
+    if router.replicas:
+        app.after_request(_mark_writer)
+    if not router.shards:
+        return
+
+    with app.app_context():
+        # Ids at or past the span on the primary would be taken for shard ids
+        for table in ('section', 'item'):
+            highest = db.session.execute(sa.text(f'SELECT MAX(id) FROM {table}')).scalar() or 0
+            if highest >= router.id_span:
+                raise RuntimeError(f'{table} ids on the primary reach {highest}; raise SHARD_ID_SPAN above it')
+
+        tables = _shard_tables(db.metadata)
+        for number, key in sorted(router.shards.items()):
+            engine = db.engines[key]
+            with engine.begin() as connection:
+                for table in tables:  # section before item and section_stat
+                    table.create(connection, checkfirst=True)
+                for table in ('section', 'item'):
+                    _start_ids_at(connection, table, number * router.id_span)
+            upgrade(app, engine)
+            with router.use_shard(number):
+                if search.backend.create():
+                    search.reindex_all()
@@ -0,0 +1,361 @@
+import html
+import click
+from flask.cli import AppGroup
+from src.models.user import db
+from src.models.project import Project
+from src.models.section import Section, Item
+from src.services.routing import router
+
+search_cli = AppGroup('search', help='Maintain the full-text search index.')
+
+# Markers wrapped around matches by the database, replaced after escaping the snippet
+MATCH_START = '\x02'
+MATCH_END = '\x03'
+
+
+def _doc_id(entity_type, entity_id):
+    # Sections and items share one index; the low bit keeps their ids apart
+    return entity_id * 2 + (1 if entity_type == 'item' else 0)
+
+
+def _highlight(snippet):
+    escaped = html.escape(snippet or '')
+    return escaped.replace(MATCH_START, '<mark>').replace(MATCH_END, '</mark>')
+
+
+def _fts5_query(query):
+    # Quote every term so user input can't produce FTS5 syntax errors; match prefixes
+    terms = [term.replace('"', '""') for term in query.split()]
+    return ' '.join(f'"{term}"*' for term in terms)
+
+
+class SearchBackend:
+    name = None
+
+    def create(self):
+        """Create the index tables in the current database; True if they are new (and so empty)."""
+        return False
+
+    def upsert(self, documents):
+        raise NotImplementedError
+
+    def remove(self, doc_ids):
+        raise NotImplementedError
+
+    def remove_project(self, project_id):
+        raise NotImplementedError
+
+    def query(self, query, project_ids, limit, offset):
+        raise NotImplementedError
+
+
+class SqliteFtsBackend(SearchBackend):
+    """FTS5 virtual table keyed by doc id, ranked with bm25 (title weighted 10x)."""
+
+    name = 'sqlite-fts5'
+
+    def create(self):
+        created = db.session.execute(db.text("SELECT 1 FROM sqlite_master WHERE name = 'search_index'")).first() is None
+        db.session.execute(db.text(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING fts5("
+            "title, body, entity_type UNINDEXED, entity_id UNINDEXED, "
+            "project_id UNINDEXED, section_id UNINDEXED, tokenize='unicode61')"
+        ))
+        db.session.commit()
+        return created
+
+    def upsert(self, documents):
+        if documents:
+            self.remove([document['doc_id'] for document in documents])
+            db.session.execute(db.text(
+                'INSERT INTO search_index (rowid, title, body, entity_type, entity_id, project_id, section_id) '
+                'VALUES (:doc_id, :title, :body, :entity_type, :entity_id, :project_id, :section_id)'
+            ), documents)
+
+    def remove(self, doc_ids):
+        if doc_ids:
+            db.session.execute(
+                db.text('DELETE FROM search_index WHERE rowid IN :doc_ids').bindparams(
+                    db.bindparam('doc_ids', expanding=True)
+                ),
+                {'doc_ids': list(doc_ids)}
+            )
+
+    def remove_project(self, project_id):
+        db.session.execute(db.text('DELETE FROM search_index WHERE project_id = :project_id'), {'project_id': project_id})
+
+    def query(self, query, project_ids, limit, offset):
+        match = _fts5_query(query)
+        if not match:
+            return []
+        rows = db.session.execute(
+            db.text(
+                'SELECT entity_type, entity_id, project_id, section_id, title, '
+                f"snippet(search_index, -1, '{MATCH_START}', '{MATCH_END}', '…', 16) AS snippet, "
+                'bm25(search_index, 10.0, 1.0) AS rank '
+                'FROM search_index WHERE search_index MATCH :match AND project_id IN :project_ids '
+                'ORDER BY rank LIMIT :limit OFFSET :offset'
+            ).bindparams(db.bindparam('project_ids', expanding=True)),
+            {'match': match, 'project_ids': list(project_ids), 'limit': limit, 'offset': offset}
+        ).mappings().all()
+        # bm25 is lower-is-better; flip it so higher rank means a better match everywhere
+        return [dict(row, rank=-row['rank']) for row in rows]
+
+
+class PostgresBackend(SearchBackend):
+    """tsvector column maintained by Postgres, GIN-indexed, ranked with ts_rank."""
+
+    name = 'postgres-tsvector'
+
+    def create(self):
+        created = db.session.execute(db.text("SELECT to_regclass('search_document') IS NULL")).scalar()
+        db.session.execute(db.text(
+            'CREATE TABLE IF NOT EXISTS search_document ('
+            'doc_id BIGINT PRIMARY KEY, entity_type VARCHAR(10) NOT NULL, entity_id INTEGER NOT NULL, '
+            'project_id INTEGER NOT NULL, section_id INTEGER, title TEXT, body TEXT, '
+            "tsv tsvector GENERATED ALWAYS AS ("
+            "setweight(to_tsvector('simple', coalesce(title, '')), 'A') || "
+            "setweight(to_tsvector('simple', coalesce(body, '')), 'B')) STORED)"
+        ))
+        db.session.execute(db.text('CREATE INDEX IF NOT EXISTS ix_search_document_tsv ON search_document USING GIN (tsv)'))
+        db.session.execute(db.text('CREATE INDEX IF NOT EXISTS ix_search_document_project ON search_document (project_id)'))
+        db.session.commit()
+        return created
+
+    def upsert(self, documents):
+        if documents:
+            db.session.execute(db.text(
+                'INSERT INTO search_document (doc_id, entity_type, entity_id, project_id, section_id, title, body) '
+                'VALUES (:doc_id, :entity_type, :entity_id, :project_id, :section_id, :title, :body) '
+                'ON CONFLICT (doc_id) DO UPDATE SET project_id = EXCLUDED.project_id, '
+                'section_id = EXCLUDED.section_id, title = EXCLUDED.title, body = EXCLUDED.body'
+            ), documents)
+
+    def remove(self, doc_ids):
+        if doc_ids:
+            db.session.execute(
+                db.text('DELETE FROM search_document WHERE doc_id = ANY(:doc_ids)'),
+                {'doc_ids': list(doc_ids)}
+            )
+
+    def remove_project(self, project_id):
+        db.session.execute(db.text('DELETE FROM search_document WHERE project_id = :project_id'), {'project_id': project_id})
+
+    def query(self, query, project_ids, limit, offset):
+        return db.session.execute(
+            db.text(
+                'SELECT entity_type, entity_id, project_id, section_id, title, '
+                "ts_headline('simple', coalesce(title, '') || ' ' || coalesce(body, ''), q, :headline) AS snippet, "
+                'ts_rank(tsv, q) AS rank '
+                "FROM search_document, websearch_to_tsquery('simple', :query) q "
+                'WHERE tsv @@ q AND project_id = ANY(:project_ids) '
+                'ORDER BY rank DESC, doc_id LIMIT :limit OFFSET :offset'
+            ),
+            {
+                'query': query,
+                'project_ids': list(project_ids),
+                'headline': f'StartSel={MATCH_START}, StopSel={MATCH_END}, MaxFragments=1, MaxWords=24',
+                'limit': limit,
+                'offset': offset
+            }
+        ).mappings().all()
+
+
+class LikeBackend(SearchBackend):
+    """Unindexed fallback that scans the items and sections tables directly."""
+
+    name = 'like'
+
+    def upsert(self, documents):
+        pass
+
+    def remove(self, doc_ids):
+        pass
+
+    def remove_project(self, project_id):
+        pass
+
+    def query(self, query, project_ids, limit, offset):
+        pattern = f'%{query}%'
+        sections = db.session.query(
+            Section.id, Section.project_id, Section.name
+        ).filter(Section.project_id.in_(project_ids), Section.name.ilike(pattern))
+        items = db.session.query(
+            Item.id, Section.project_id, Item.section_id, Item.text
+        ).join(Section, Item.section_id == Section.id).filter(
+            Section.project_id.in_(project_ids),
+            db.or_(Item.text.ilike(pattern), Item.description.ilike(pattern))
+        ).order_by(Item.id)
+
+        results = [{
+            'entity_type': 'section', 'entity_id': section_id, 'project_id': project_id,
+            'section_id': section_id, 'title': name, 'snippet': name, 'rank': 0.0
+        } for section_id, project_id, name in sections.order_by(Section.id)]
+        results += [{
+            'entity_type': 'item', 'entity_id': item_id, 'project_id': project_id,
+            'section_id': section_id, 'title': text, 'snippet': text, 'rank': 0.0
+        } for item_id, project_id, section_id, text in items.limit(offset + limit)]
+        return results[offset:offset + limit]
+
+
+backend = LikeBackend()
+
+
+def init_search(app):
+    """Pick the index backend for the configured database and create its tables."""
+    global backend
+    with app.app_context():
+        dialect = db.engine.dialect.name
+        if dialect == 'postgresql':
+            candidate = PostgresBackend()
+        elif dialect == 'sqlite':
+            candidate = SqliteFtsBackend()
+        else:
+            candidate = LikeBackend()
+        try:
+            created = candidate.create()
+            backend = candidate
+        except Exception as e:
+            db.session.rollback()
+            app.logger.warning('Full-text search unavailable (%s), falling back to LIKE', e)
+            backend = LikeBackend()
+            return
+        if created:
+            # A database from before search existed: index the rows it already holds
+            reindex_all()
+
+
+def index_items(item_ids):
+    """(Re)index items by id; call within the transaction that wrote them."""
+    item_ids = list(item_ids)
+    if not item_ids:
+        return
+    rows = db.session.execute(
+        db.select(Item.id, Section.project_id, Item.section_id, Item.text, Item.description)
+        .join(Section, Item.section_id == Section.id)
+        .where(Item.id.in_(item_ids))
+    ).all()
+    backend.upsert([{
+        'doc_id': _doc_id('item', item_id),
+        'entity_type': 'item',
+        'entity_id': item_id,
+        'project_id': project_id,
+        'section_id': section_id,
+        'title': text,
+        'body': description or ''
+    } for item_id, project_id, section_id, text, description in rows])
+
+
+def index_sections(section_ids):
+    section_ids = list(section_ids)
+    if not section_ids:
+        return
+    rows = db.session.execute(
+        db.select(Section.id, Section.project_id, Section.name).where(Section.id.in_(section_ids))
+    ).all()
+    backend.upsert([{
+        'doc_id': _doc_id('section', section_id),
+        'entity_type': 'section',
+        'entity_id': section_id,
+        'project_id': project_id,
+        'section_id': section_id,
+        'title': name,
+        'body': ''
+    } for section_id, project_id, name in rows])
+
+
+def remove_items(item_ids):
+    backend.remove([_doc_id('item', item_id) for item_id in item_ids])
+
+
+def remove_sections(section_ids):
+    backend.remove([_doc_id('section', section_id) for section_id in section_ids])
+
+
+def remove_project(project_id):
+    backend.remove_project(project_id)
+
+
+def sync_index(changes, removed_items=()):
+    """Bring the index in line with a list of (entity_type, entity_id, action) changes.
+
+    Deleting an item or section also removes rows beneath it; pass their ids
+    as `removed_items` since the change list only names the root.
+    """
+    live = {'section': set(), 'item': set()}
+    deleted = {'section': set(), 'item': set(removed_items)}
+    for entity_type, entity_id, action in changes:
+        if entity_type not in live:
+            continue
+        if action == 'deleted':
+            deleted[entity_type].add(entity_id)
+            live[entity_type].discard(entity_id)
+        else:
+            live[entity_type].add(entity_id)
+    # A row written earlier in the batch may sit under a root deleted later in it
+    remove_sections(deleted['section'])
+    remove_items(deleted['item'])
+    index_sections(live['section'] - deleted['section'])
+    index_items(live['item'] - deleted['item'])
+
+
+def reindex_all(chunk=2000):
+    """Index every section and item in the current database, a chunk of ids at a time, and commit."""
+    for model, index in ((Section, index_sections), (Item, index_items)):
+        after_id = 0
+        while True:
+            ids = db.session.execute(
+                db.select(model.id).where(model.id > after_id).order_by(model.id).limit(chunk)
+            ).scalars().all()
+            if not ids:
+                break
+            index(ids)
+            after_id = ids[-1]
+    db.session.commit()
+
+
+def reindex_project(project_id):
+    remove_project(project_id)
+    index_sections(db.session.execute(
+        db.select(Section.id).where(Section.project_id == project_id)
+    ).scalars().all())
+    index_items(db.session.execute(
+        db.select(Item.id).join(Section, Item.section_id == Section.id).where(Section.project_id == project_id)
+    ).scalars().all())
+
+
+def search(query, project_ids, limit=20, offset=0):
+    """Ranked matches in the given projects, best first, with highlighted snippets."""
+    if not project_ids or not query.strip():
+        return []
+    groups = router.group_by_shard(project_ids)
+    if len(groups) == 1:
+        [(shard, shard_project_ids)] = groups.items()
+        with router.use_shard(shard):
+            rows = backend.query(query.strip(), shard_project_ids, limit, offset)
+    else:
+        # Each shard has its own index: take the top offset + limit from every one and merge by rank
+        rows = []
+        for shard, shard_project_ids in groups.items():
+            with router.use_shard(shard):
+                rows.extend(backend.query(query.strip(), shard_project_ids, offset + limit, 0))
+        rows = sorted(rows, key=lambda row: -row['rank'])[offset:offset + limit]
+    return [{
+        'type': row['entity_type'],
+        'id': row['entity_id'],
+        'project_id': row['project_id'],
+        'section_id': row['section_id'],
+        'title': row['title'],
+        'snippet': _highlight(row['snippet']),
+        'rank': float(row['rank'])
+    } for row in rows]
+
+
+@search_cli.command('reindex')
+def reindex_command():
+    """Rebuild the full-text index for every project."""
+    for project_id in db.session.execute(db.select(Project.id)).scalars().all():
+        with router.use_shard(router.shard_for_project(project_id)):
+            reindex_project(project_id)
+            db.session.commit()
+    click.echo(f'Reindexed with backend {backend.name}')
@@ -0,0 +1,207 @@
+from collections import Counter
+import click
+from flask.cli import AppGroup
+from src.models.user import db
+from src.models.section import Section, Item, SectionStat
+from src.services.routing import router
+
+stats_cli = AppGroup('stats', help='Maintain the per-section item counters.')
+
+
+class StatDeltas(Counter):
+    """Pending counter changes keyed by (project_id, section_id, priority, type)."""
+
+    def add(self, project_id, section_id, priority, item_type, amount=1):
+        self[(project_id, section_id, priority or 'medium', item_type or 'feature')] += amount
+
+    def remove(self, project_id, section_id, priority, item_type, amount=1):
+        self.add(project_id, section_id, priority, item_type, -amount)
+
+    def add_rows(self, project_id, rows, amount=1):
+        # rows: (section_id, priority, type) or objects/rows with those attributes
+        for row in rows:
+            if isinstance(row, tuple) and not hasattr(row, 'section_id'):
+                section_id, priority, item_type = row
+            else:
+                section_id, priority, item_type = row.section_id, row.priority, row.type
+            self.add(project_id, section_id, priority, item_type, amount)
+
+    def remove_rows(self, project_id, rows):
+        self.add_rows(project_id, rows, -1)
+
+
+def _upsert_statement(dialect):
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        return None
+    statement = insert(SectionStat)
+    return statement.on_conflict_do_update(
+        index_elements=['section_id', 'priority', 'type'],
+        set_={'count': SectionStat.count + statement.excluded['count']}
+    )
+
+
+def apply_deltas(deltas, session=None):
+    """Add the deltas to the counter rows, within the caller's transaction."""
+    session = session or db.session
+    rows = [{
+        'project_id': project_id,
+        'section_id': section_id,
+        'priority': priority,
+        'type': item_type,
+        'count': amount
+    } for (project_id, section_id, priority, item_type), amount in deltas.items() if amount]
+    if not rows:
+        return
+
+    statement = _upsert_statement(session.get_bind(SectionStat).dialect.name)
+    if statement is not None:
+        session.execute(statement, rows)
+        return
+
+    for row in rows:
+        updated = session.execute(
+            db.update(SectionStat)
+            .where(SectionStat.section_id == row['section_id'],
+                   SectionStat.priority == row['priority'],
+                   SectionStat.type == row['type'])
+            .values(count=SectionStat.count + row['count'])
+        ).rowcount
+        if not updated:
+            session.execute(db.insert(SectionStat), [row])
+
+
+def remove_section(section_id):
+    db.session.execute(db.delete(SectionStat).where(SectionStat.section_id == section_id))
+
+
+def remove_project(project_id):
+    db.session.execute(db.delete(SectionStat).where(SectionStat.project_id == project_id))
+
+
+def _summarize(rows):
+    summary = {'total': 0, 'critical': 0, 'ux_decisions': 0, 'by_priority': {}, 'by_type': {}}
+    for priority, item_type, count in rows:
+        if not count:
+            continue
+        summary['total'] += count
+        summary['by_priority'][priority] = summary['by_priority'].get(priority, 0) + count
+        summary['by_type'][item_type] = summary['by_type'].get(item_type, 0) + count
+    summary['critical'] = summary['by_priority'].get('critical', 0)
+    summary['ux_decisions'] = summary['by_type'].get('ux-decision', 0)
+    return summary
+
+
+def project_stats(project_id):
+    rows = db.session.execute(
+        db.select(SectionStat.section_id, SectionStat.priority, SectionStat.type, SectionStat.count)
+        .where(SectionStat.project_id == project_id)
+    ).all()
+    by_section = {}
+    for section_id, priority, item_type, count in rows:
+        by_section.setdefault(section_id, []).append((priority, item_type, count))
+
+    result = _summarize([(priority, item_type, count) for _, priority, item_type, count in rows])
+    result['sections'] = {str(section_id): _summarize(section_rows) for section_id, section_rows in by_section.items()}
+    return result
+
+
+def projects_stats(project_ids):
+    """Totals for many projects in one grouped query over the counter rows (one per shard)."""
+    rows = []
+    for shard, shard_project_ids in router.group_by_shard(project_ids).items():
+        with router.use_shard(shard):
+            rows += db.session.execute(
+                db.select(SectionStat.project_id, SectionStat.priority, SectionStat.type, db.func.sum(SectionStat.count))
+                .where(SectionStat.project_id.in_(shard_project_ids))
+                .group_by(SectionStat.project_id, SectionStat.priority, SectionStat.type)
+            ).all()
+    by_project = {project_id: [] for project_id in project_ids}
+    for project_id, priority, item_type, count in rows:
+        by_project[project_id].append((priority, item_type, count))
+    return {project_id: _summarize(project_rows) for project_id, project_rows in by_project.items()}
+
+
+def _actual_counts(project_id=None, session=None):
+    query = db.select(
+        Section.project_id, Item.section_id, Item.priority, Item.type, db.func.count(Item.id)
+    ).join(Section, Item.section_id == Section.id).group_by(
+        Section.project_id, Item.section_id, Item.priority, Item.type
+    )
+    if project_id is not None:
+        query = query.where(Section.project_id == project_id)
+    return {
+        (row_project, section_id, priority or 'medium', item_type or 'feature'): count
+        for row_project, section_id, priority, item_type, count in (session or db.session).execute(query)
+    }
+
+
+def _stored_counts(project_id=None):
+    query = db.select(
+        SectionStat.project_id, SectionStat.section_id, SectionStat.priority, SectionStat.type, SectionStat.count
+    )
+    if project_id is not None:
+        query = query.where(SectionStat.project_id == project_id)
+    return {
+        (row_project, section_id, priority, item_type): count
+        for row_project, section_id, priority, item_type, count in db.session.execute(query)
+        if count
+    }
+
+
+def find_drift(project_id=None):
+    """Compare the counters with a fresh count of the items table."""
+    actual = _actual_counts(project_id)
+    stored = _stored_counts(project_id)
+    return {
+        key: (stored.get(key, 0), actual.get(key, 0))
+        for key in actual.keys() | stored.keys()
+        if stored.get(key, 0) != actual.get(key, 0)
+    }
+
+
+def rebuild(project_id=None, session=None):
+    """Recount from the items table; `session` defaults to db.session (e.g. one bound to a migration's connection)."""
+    session = session or db.session
+    query = db.delete(SectionStat)
+    if project_id is not None:
+        query = query.where(SectionStat.project_id == project_id)
+    session.execute(query)
+
+    deltas = StatDeltas()
+    for key, count in _actual_counts(project_id, session).items():
+        deltas[key] = count
+    apply_deltas(deltas, session)
+
+
+def _shards(project_id):
+    return [router.shard_for_project(project_id)] if project_id is not None else router.all_shards()
+
+
+@stats_cli.command('verify')
+@click.option('--project', 'project_id', type=int, default=None, help='Only check one project.')
+def verify_command(project_id):
+    """Report counters that disagree with the items table."""
+    drift = {}
+    for shard in _shards(project_id):
+        with router.use_shard(shard):
+            drift.update(find_drift(project_id))
+    for (row_project, section_id, priority, item_type), (stored, actual) in sorted(drift.items()):
+        click.echo(f'project {row_project} section {section_id} {priority}/{item_type}: stored {stored}, actual {actual}')
+    click.echo(f'{len(drift)} counter(s) out of date')
+    if drift:
+        raise SystemExit(1)
+
+
+@stats_cli.command('rebuild')
+@click.option('--project', 'project_id', type=int, default=None, help='Only rebuild one project.')
+def rebuild_command(project_id):
+    """Recompute the counters from the items table."""
+    for shard in _shards(project_id):
+        with router.use_shard(shard):
+            rebuild(project_id)
+            db.session.commit()
+    click.echo('Counters rebuilt')
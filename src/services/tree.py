@@ -0,0 +1,173 @@
+from collections import defaultdict
+from src.models.user import db
+from src.models.section import Section, Item
+
+
+# Plain column tuples: the tree is built straight from rows, without ORM objects
+SECTION_COLUMNS = (Section.id, Section.name, Section.priority, Section.order_index, Section.version)
+ITEM_COLUMNS = (
+    Item.id, Item.section_id, Item.parent_id, Item.text, Item.description,
+    Item.priority, Item.type, Item.order_index, Item.version
+)
+# Row layout of the compact format: every ITEM_COLUMNS field except section_id
+COMPACT_ITEM_FIELDS = ('id', 'parent_id', 'text', 'description', 'priority', 'type', 'order_index', 'version')
+
+
+def _tree_rows(project_id):
+    sections = db.session.execute(
+        db.select(*SECTION_COLUMNS).where(Section.project_id == project_id).order_by(Section.order_index)
+    ).all()
+
+    # Single pass over every item of the project, already in sibling order
+    items = db.session.execute(
+        db.select(*ITEM_COLUMNS).join(Section, Item.section_id == Section.id)
+        .where(Section.project_id == project_id)
+        .order_by(Item.order_index, Item.id)
+    ).all()
+    return sections, items
+
+
+def build_project_tree(project_id):
+    """Build the nested sections -> items -> children tree of a project.
+
+    Runs one query for sections and one for items regardless of project size,
+    then links items to their parents in memory.
+    """
+    sections, items = _tree_rows(project_id)
+
+    nodes = {}
+    children_by_parent = defaultdict(list)
+    roots_by_section = defaultdict(list)
+
+    # Unpacked positionally; named access on rows is noticeably slower at this volume
+    for item_id, section_id, parent_id, text, description, priority, item_type, order_index, version in items:
+        node = {
+            'id': item_id,
+            'text': text,
+            'description': description,
+            'priority': priority,
+            'type': item_type,
+            'order_index': order_index,
+            'version': version,
+            'children': []
+        }
+        nodes[item_id] = node
+        if parent_id is None:
+            roots_by_section[section_id].append(node)
+        else:
+            children_by_parent[parent_id].append(node)
+
+    for parent_id, children in children_by_parent.items():
+        parent = nodes.get(parent_id)
+        if parent is not None:
+            parent['children'] = children
+
+    return [{
+        'id': section.id,
+        'name': section.name,
+        'priority': section.priority,
+        'order_index': section.order_index,
+        'version': section.version,
+        'items': roots_by_section.get(section.id, [])
+    } for section in sections]
+
+
+def build_compact_tree(project_id):
+    """Sections with their items as flat rows laid out as COMPACT_ITEM_FIELDS.
+
+    Rows are in sibling order and carry parent_id, so clients rebuild the
+    nesting themselves. No per-item dict is built and keys aren't repeated.
+    """
+    sections, items = _tree_rows(project_id)
+
+    rows_by_section = defaultdict(list)
+    for item_id, section_id, *rest in items:
+        rows_by_section[section_id].append([item_id, *rest])
+
+    return [{
+        'id': section.id,
+        'name': section.name,
+        'priority': section.priority,
+        'order_index': section.order_index,
+        'version': section.version,
+        'items': rows_by_section.get(section.id, [])
+    } for section in sections]
+
+
+def subtree_cte(item_id):
+    """Recursive CTE yielding the ids of an item and all of its descendants."""
+    subtree = db.select(Item.id).where(Item.id == item_id).cte('subtree', recursive=True)
+    children = db.select(Item.id).join(subtree, Item.parent_id == subtree.c.id)
+    return subtree.union_all(children)
+
+
+def fetch_subtree(item_id):
+    """Return the item with its descendants nested under 'children', or None."""
+    subtree = subtree_cte(item_id)
+    items = Item.query.filter(
+        Item.id.in_(db.select(subtree.c.id))
+    ).order_by(Item.order_index, Item.id).all()
+
+    nodes = {}
+    for item in items:
+        nodes[item.id] = dict(item.to_dict(), children=[])
+    for item in items:
+        if item.id != item_id and item.parent_id in nodes:
+            nodes[item.parent_id]['children'].append(nodes[item.id])
+    return nodes.get(item_id)
+
+
+def count_subtree(item_id):
+    subtree = subtree_cte(item_id)
+    return db.session.execute(db.select(db.func.count()).select_from(subtree)).scalar()
+
+
+def delete_subtree(item_id):
+    """Delete an item and all of its descendants in one statement.
+
+    Returns the deleted rows as (id, section_id, priority, type) so callers
+    can update derived data without reading the subtree first.
+    """
+    subtree = subtree_cte(item_id)
+    result = db.session.execute(
+        db.delete(Item)
+        .where(Item.id.in_(db.select(subtree.c.id)))
+        .returning(Item.id, Item.section_id, Item.priority, Item.type),
+        execution_options={'synchronize_session': False}
+    )
+    return result.all()
+
+
+def expand_items(items, depth):
+    """Serialize items with `depth` levels of descendants (1 means the items alone).
+
+    Loads one level per query. Every item reports has_children, so clients
+    can fetch deeper levels on demand.
+    """
+    nodes = [dict(item.to_dict(), has_children=False) for item in items]
+    level = {node['id']: node for node in nodes}
+
+    for remaining in range(depth - 1, -1, -1):
+        if not level:
+            break
+        if remaining == 0:
+            # Last level: only find out which items have children
+            parent_ids = db.session.execute(
+                db.select(Item.parent_id).where(Item.parent_id.in_(level.keys())).group_by(Item.parent_id)
+            ).scalars()
+            for parent_id in parent_ids:
+                level[parent_id]['has_children'] = True
+            break
+
+        children = Item.query.filter(Item.parent_id.in_(level.keys())).order_by(Item.order_index, Item.id).all()
+        next_level = {}
+        for node in level.values():
+            node['children'] = []
+        for child in children:
+            child_node = dict(child.to_dict(), has_children=False)
+            level[child.parent_id]['children'].append(child_node)
+            level[child.parent_id]['has_children'] = True
+            next_level[child.id] = child_node
+        level = next_level
+
+    return nodes
@@ -0,0 +1,80 @@
+import re
+from flask import request, jsonify
+from src.models.user import db
+
+
+class VersionConflict(Exception):
+    """The row was changed since the version the client based its edit on."""
+
+    def __init__(self, current):
+        super().__init__('version conflict')
+        self.current = current
+
+
+class RowDeleted(Exception):
+    """The row was deleted since this request read it."""
+
+
+def version_etag(kind, entity_id, version):
+    return f'{kind}-{entity_id}-v{version}'
+
+
+def expected_version(data, kind, entity_id):
+    """Version the client's edit is based on, or None for an unconditional write.
+
+    Taken from `expected_version` in the body, else from an If-Match header
+    holding either the ETag of an earlier write or the bare version number.
+    Raises ValueError if neither can be read.
+    """
+    version = (data or {}).get('expected_version')
+    if version is not None:
+        if not isinstance(version, int) or isinstance(version, bool):
+            raise ValueError('expected_version must be an integer')
+        return version
+
+    if not request.if_match or request.if_match.star_tag:
+        return None
+
+    etags = request.if_match.as_set()
+    match = re.fullmatch(rf'(?:{kind}-{entity_id}-v)?(\d+)', next(iter(etags))) if len(etags) == 1 else None
+    if not match:
+        raise ValueError(f'If-Match must be a single {kind} version')
+    return int(match.group(1))
+
+
+def conditional_update(model, loaded, values, expected):
+    """Apply `values` to a row with one UPDATE ... WHERE version = expected.
+
+    `loaded` is the row as this request already read it; if it is at another
+    version the conflict is reported without touching the database. Every
+    successful write bumps the version. Raises VersionConflict with the
+    current row when the version no longer matches, or RowDeleted if the
+    row is gone.
+    """
+    if expected is not None and loaded.version != expected:
+        raise VersionConflict(loaded)
+
+    statement = db.update(model).where(model.id == loaded.id)
+    if expected is not None:
+        statement = statement.where(model.version == expected)
+    updated = db.session.execute(
+        statement.values(version=model.version + 1, **values).returning(model),
+        execution_options={'synchronize_session': 'fetch'}
+    ).scalar_one_or_none()
+
+    if updated is None:
+        # Lost a race after the read: report the row as it is now, if it still exists
+        current = db.session.get(model, loaded.id, populate_existing=True)
+        if current is None:
+            raise RowDeleted()
+        raise VersionConflict(current)
+    return updated
+
+
+def conflict_response(kind, current):
+    response = jsonify({
+        'error': f'{kind.capitalize()} was changed by someone else',
+        'current': current.to_dict()
+    })
+    response.set_etag(version_etag(kind, current.id, current.version))
+    return response, 409
@@ -0,0 +1,42 @@
+from contextlib import contextmanager
+import pytest
+from sqlalchemy import event
+from main import create_app
+from src.models.user import db
+
+
+@pytest.fixture
+def app(tmp_path):
+    return create_app({
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'test.db'}",
+        'PASSWORD_HASH_WORKERS': 0,
+        'RATE_LIMIT_ENABLED': False,
+        'JOB_WORKERS': 0
+    })
+
+
+@pytest.fixture
+def client(app):
+    """A test client logged in as a freshly registered user."""
+    client = app.test_client()
+    response = client.post('/api/auth/register', json={'username': 'alice', 'email': 'alice@example.com', 'password': 'pw'})
+    assert response.status_code == 201, response.get_json()
+    return client
+
+
+@contextmanager
+def count_statements(app):
+    """Yields a list that collects every SQL statement run on the app's engine."""
+    with app.app_context():
+        engine = db.engine
+    statements = []
+
+    def record(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(engine, 'before_cursor_execute', record)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, 'before_cursor_execute', record)
@@ -0,0 +1,18 @@
+import pytest
+
+
+@pytest.mark.parametrize('path, credentials', [
+    ('/api/auth/login', {'username': 'alice', 'password': 'pw'}),
+    ('/api/auth/register', {'username': 'bob', 'email': 'bob@example.com', 'password': 'pw'}),
+])
+def test_token_is_only_returned_to_clients_that_ask(client, path, credentials):
+    response = client.post(path, json=credentials)
+    assert response.status_code in (200, 201)
+    assert 'token' not in response.get_json()
+    assert 'auth_token' in response.headers['Set-Cookie']
+
+    if path.endswith('register'):
+        credentials = {**credentials, 'username': 'carol', 'email': 'carol@example.com'}
+    token = client.post(path, json={**credentials, 'return_token': True}).get_json()['token']
+    client.delete_cookie('auth_token')
+    assert client.get('/api/projects', headers={'Authorization': f'Bearer {token}'}).status_code == 200
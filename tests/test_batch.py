@@ -0,0 +1,67 @@
+import pytest
+from src.models.user import db
+from src.services import batch as batch_service
+from src.services.versioning import conditional_update
+
+
+@pytest.fixture
+def project_id(client):
+    return client.post('/api/projects', json={'name': 'Batch'}).get_json()['id']
+
+
+@pytest.fixture
+def section_id(client, project_id):
+    return client.post(f'/api/projects/{project_id}/sections', json={'name': 'Section'}).get_json()['section']['id']
+
+
+def batch(client, project_id, *operations):
+    return client.post(f'/api/projects/{project_id}/batch', json={'operations': list(operations)})
+
+
+def search(client, query):
+    return client.get('/api/search', query_string={'q': query}).get_json()['results']
+
+
+def test_create_then_delete_the_section_in_one_batch(client, project_id, section_id):
+    response = batch(client, project_id,
+                     {'op': 'create', 'type': 'item', 'temp_id': 'a', 'data': {'section_id': section_id, 'text': 'orphaned'}},
+                     {'op': 'delete', 'type': 'section', 'id': section_id})
+    assert response.status_code == 200, response.get_json()
+    assert search(client, 'orphaned') == []
+
+
+def test_create_then_delete_the_parent_item_in_one_batch(client, project_id, section_id):
+    parent_id = client.post(f'/api/sections/{section_id}/items', json={'text': 'parent'}).get_json()['item']['id']
+    response = batch(client, project_id,
+                     {'op': 'create', 'type': 'item', 'temp_id': 'a', 'data': {'section_id': section_id, 'parent_id': parent_id, 'text': 'orphaned'}},
+                     {'op': 'update', 'type': 'item', 'id': 'a', 'data': {'text': 'orphaned child'}},
+                     {'op': 'delete', 'type': 'item', 'id': parent_id})
+    assert response.status_code == 200, response.get_json()
+    assert search(client, 'orphaned') == []
+    assert search(client, 'parent') == []
+
+
+@pytest.mark.parametrize('expected_version', [None, 1])
+def test_update_of_a_row_deleted_mid_batch_is_not_found(client, monkeypatch, project_id, section_id, expected_version):
+    item_id = client.post(f'/api/sections/{section_id}/items', json={'text': 'Item'}).get_json()['item']['id']
+
+    def deleted_first(model, loaded, values, expected):
+        # Another request deletes the item between the batch's read and its UPDATE
+        db.session.execute(db.delete(model).where(model.id == loaded.id))
+        return conditional_update(model, loaded, values, expected)
+
+    monkeypatch.setattr(batch_service, 'conditional_update', deleted_first)
+    response = batch(client, project_id,
+                     {'op': 'update', 'type': 'item', 'id': item_id, 'expected_version': expected_version, 'data': {'text': 'Edit'}})
+
+    assert response.status_code == 404
+    assert response.get_json()['operation'] == 0
+
+
+def test_stale_version_conflicts_even_without_changes(client, project_id, section_id):
+    item_id = client.post(f'/api/sections/{section_id}/items', json={'text': 'Item'}).get_json()['item']['id']
+    assert client.put(f'/api/items/{item_id}', json={'text': 'First'}).status_code == 200
+
+    response = batch(client, project_id, {'op': 'update', 'type': 'item', 'id': item_id, 'expected_version': 1, 'data': {}})
+    assert response.status_code == 409
+    assert response.get_json()['current']['text'] == 'First'
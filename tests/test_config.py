@@ -0,0 +1,42 @@
+import pytest
+from main import create_app
+from src.services import cache
+
+
+@pytest.fixture
+def config(tmp_path, monkeypatch):
+    monkeypatch.delenv('SECRET_KEY', raising=False)
+    monkeypatch.delenv('FLASK_DEBUG', raising=False)
+    return {
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'test.db'}",
+        'PASSWORD_HASH_WORKERS': 0,
+        'JOB_WORKERS': 0
+    }
+
+
+def test_refuses_to_start_without_secret_key(config):
+    with pytest.raises(RuntimeError, match='SECRET_KEY'):
+        create_app(config)
+
+
+def test_secret_key_from_environment(config, monkeypatch):
+    monkeypatch.setenv('SECRET_KEY', 'from-the-environment')
+    assert create_app(config).config['SECRET_KEY'] == 'from-the-environment'
+
+
+@pytest.mark.parametrize('mode', [{'TESTING': True}, {'DEBUG': True}])
+def test_debug_and_testing_get_a_random_key(config, mode):
+    keys = {create_app({**config, **mode}).config['SECRET_KEY'] for _ in range(2)}
+    assert len(keys) == 2
+    assert 'asdf#FGSgvasgf$5$WGT' not in keys
+
+
+def test_warns_when_revocations_are_not_shared_between_workers(config, caplog):
+    create_app({**config, 'TESTING': True, 'WEB_CONCURRENCY': 5})
+    assert 'AUTH_STORE_URL is not set' in caplog.text
+
+
+def test_shared_cache_needs_the_redis_package(config, monkeypatch):
+    monkeypatch.setattr(cache, 'redis', None)
+    with pytest.raises(RuntimeError, match='PROJECT_CACHE_URL is set but the redis package is not installed'):
+        create_app({**config, 'TESTING': True, 'PROJECT_CACHE_URL': 'redis://localhost:6379/0'})
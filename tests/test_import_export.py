@@ -0,0 +1,98 @@
+import json
+import pytest
+from src.services.cache import project_cache
+
+
+def ndjson(*records):
+    return '\n'.join(json.dumps(record) for record in records) + '\n'
+
+
+def import_ndjson(client, project_id, body):
+    return client.post(f'/api/projects/{project_id}/import', data=body, content_type='application/x-ndjson')
+
+
+def new_project(client, name):
+    return client.post('/api/projects', json={'name': name}).get_json()['id']
+
+
+def item_types(client, project_id):
+    project_cache.invalidate(project_id)
+    types = []
+    stack = [item for section in client.get(f'/api/projects/{project_id}').get_json()['sections'] for item in section['items']]
+    while stack:
+        item = stack.pop()
+        types.append(item['type'])
+        stack.extend(item['children'])
+    return sorted(types)
+
+
+def test_ndjson_import_keeps_item_types(client):
+    project_id = new_project(client, 'Import')
+    body = ndjson(
+        {'record': 'project', 'id': 1, 'name': 'Source'},
+        {'record': 'section', 'id': 10, 'name': 'S'},
+        {'record': 'item', 'id': 100, 'section_id': 10, 'parent_id': None, 'text': 'a', 'type': 'comment'},
+        {'record': 'item', 'id': 101, 'section_id': 10, 'parent_id': 100, 'text': 'b', 'type': 'ux-decision'},
+        {'record': 'item', 'id': 102, 'section_id': 10, 'parent_id': None, 'text': 'c'}
+    )
+
+    response = import_ndjson(client, project_id, body)
+
+    assert response.status_code == 201, response.get_json()
+    assert item_types(client, project_id) == ['comment', 'feature', 'ux-decision']
+    stats = client.get(f'/api/projects/{project_id}/stats').get_json()
+    assert stats['by_type'] == {'comment': 1, 'ux-decision': 1, 'feature': 1}
+
+
+def test_ndjson_import_reads_version_1_records(client):
+    project_id = new_project(client, 'Legacy')
+    body = ndjson(
+        {'type': 'project', 'id': 1, 'name': 'Source', 'version': 1},
+        {'type': 'section', 'id': 10, 'name': 'S'},
+        {'type': 'item', 'id': 100, 'section_id': 10, 'parent_id': None, 'text': 'a'}
+    )
+
+    response = import_ndjson(client, project_id, body)
+
+    assert response.status_code == 201, response.get_json()
+    assert item_types(client, project_id) == ['feature']
+
+
+def test_ndjson_import_rejects_unknown_records(client):
+    project_id = new_project(client, 'Bad')
+
+    response = import_ndjson(client, project_id, ndjson({'record': 'widget', 'id': 1}))
+
+    assert response.status_code == 400
+    assert 'widget' in response.get_json()['error']
+
+
+@pytest.mark.parametrize('line', ['[]', '1', '"x"', 'null'])
+def test_ndjson_import_rejects_lines_that_are_not_objects(client, line):
+    project_id = new_project(client, 'Bad')
+
+    response = import_ndjson(client, project_id, ndjson({'record': 'section', 'id': 1, 'name': 'S'}) + line + '\n')
+
+    assert response.status_code == 400
+    assert response.get_json()['error'] == 'Line 2 is not a JSON object'
+
+
+def test_ndjson_export_import_round_trip_keeps_item_types(client):
+    source = new_project(client, 'Source')
+    section_id = client.post(f'/api/projects/{source}/sections', json={'name': 'S'}).get_json()['section']['id']
+    parent_id = None
+    for text, item_type in (('a', 'feature'), ('b', 'comment'), ('c', 'ux-decision')):
+        body = {'text': text, 'type': item_type, 'parent_id': parent_id}
+        parent_id = client.post(f'/api/sections/{section_id}/items', json=body).get_json()['item']['id']
+
+    export = client.get(f'/api/projects/{source}/export?format=ndjson').get_data(as_text=True)
+    records = [json.loads(line) for line in export.splitlines()]
+    assert [record['record'] for record in records] == ['project', 'section', 'item', 'item', 'item']
+    assert sorted(record['type'] for record in records if record['record'] == 'item') == ['comment', 'feature', 'ux-decision']
+
+    target = new_project(client, 'Copy')
+    assert import_ndjson(client, target, export).status_code == 201
+
+    assert item_types(client, target) == item_types(client, source)
+    assert client.get(f'/api/projects/{target}/stats').get_json()['by_type'] == \
+        client.get(f'/api/projects/{source}/stats').get_json()['by_type']
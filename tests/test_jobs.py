@@ -0,0 +1,47 @@
+from src.services.jobs import job_runner
+
+
+def run_jobs(app):
+    with app.app_context():
+        while (job_id := job_runner.claim('test-worker')) is not None:
+            job_runner.run(job_id, 'test-worker')
+
+
+def test_delete_project_hides_it_and_reuses_the_pending_job(app, client):
+    project_id = client.post('/api/projects', json={'name': 'Doomed'}).get_json()['id']
+    section_id = client.post(f'/api/projects/{project_id}/sections', json={'name': 'Section'}).get_json()['section']['id']
+    item_id = client.post(f'/api/sections/{section_id}/items', json={'text': 'Item'}).get_json()['item']['id']
+
+    response = client.delete(f'/api/projects/{project_id}')
+    assert response.status_code == 202
+    job = response.get_json()['job']
+
+    # A repeated DELETE gets the job already under way rather than a second one
+    repeated = client.delete(f'/api/projects/{project_id}')
+    assert repeated.status_code == 202
+    assert repeated.get_json()['job']['id'] == job['id']
+    assert len(client.get('/api/jobs').get_json()) == 1
+
+    # Until the job has run, the project is gone for reads and writes alike
+    assert client.get(f'/api/projects/{project_id}').status_code == 404
+    assert client.post(f'/api/projects/{project_id}/sections', json={'name': 'Late'}).status_code == 404
+    assert client.put(f'/api/items/{item_id}', json={'text': 'Late'}).status_code == 404
+    assert client.get(f'/api/sections/{section_id}/items').status_code == 404
+    assert [project['id'] for project in client.get('/api/projects').get_json()] == []
+
+    run_jobs(app)
+    assert client.get(f"/api/jobs/{job['id']}").get_json()['status'] == 'succeeded'
+    assert client.get(f'/api/projects/{project_id}').status_code == 403
+
+
+def test_cli_commands_report_through_click(app, client):
+    client.post('/api/projects', json={'name': 'Indexed'})
+    runner = app.test_cli_runner()
+
+    result = runner.invoke(args=['search', 'reindex'])
+    assert result.exit_code == 0, result.output
+    assert result.output.startswith('Reindexed with backend ')
+
+    result = runner.invoke(args=['jobs', 'prune', '--days', '0'])
+    assert result.exit_code == 0, result.output
+    assert result.output == 'Deleted 0 finished job(s)\n'
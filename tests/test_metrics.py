@@ -0,0 +1,45 @@
+import time
+import pytest
+from src.routes import project as project_routes
+from src.services.metrics import metrics
+
+
+@pytest.fixture
+def scrape(app, client):
+    app.config['METRICS_TOKEN'] = 'scraper'
+
+    def scrape():
+        return client.get('/metrics', headers={'Authorization': 'Bearer scraper'}).get_data(as_text=True)
+    return scrape
+
+
+def duration_sum(text, endpoint):
+    prefix = f'pseudocode_http_request_duration_seconds_sum{{endpoint="{endpoint}"}} '
+    return next((float(line[len(prefix):]) for line in text.splitlines() if line.startswith(prefix)), 0.0)
+
+
+def test_metrics_are_refused_without_a_configured_token(client):
+    assert client.get('/metrics').status_code == 403
+
+
+def test_metrics_require_the_configured_token(client, scrape):
+    assert client.get('/metrics', headers={'Authorization': 'Bearer guess'}).status_code == 401
+    assert 'pseudocode_http_requests_total' in scrape()
+
+
+def test_streamed_export_is_timed_until_it_has_been_sent(client, scrape, monkeypatch):
+    project_id = client.post('/api/projects', json={'name': 'Export'}).get_json()['id']
+    iter_chunks = project_routes.iter_chunks
+
+    def slow_chunks(records):
+        time.sleep(0.2)  # after the view has returned, while the body is being sent
+        yield from iter_chunks(records)
+
+    monkeypatch.setattr(project_routes, 'iter_chunks', slow_chunks)
+    metrics.clear()
+    response = client.get(f'/api/projects/{project_id}/export')
+    assert response.status_code == 200
+    response.get_data()
+    response.close()
+
+    assert duration_sum(scrape(), 'project.export_project') >= 0.2
@@ -0,0 +1,129 @@
+import os
+import pytest
+import sqlalchemy as sa
+from main import create_app
+from src.models.user import db
+from src.services.migrations import MIGRATIONS, explain_index_usage, upgrade
+
+# e.g. postgresql+psycopg2://postgres@localhost/pseudocode_test; the database is dropped and recreated
+POSTGRES_URL = os.environ.get('TEST_POSTGRES_URL')
+
+
+def legacy_schema(engine):
+    """Roll a freshly created schema back to before the migrations."""
+    with engine.begin() as connection:
+        connection.execute(sa.text('DROP TABLE schema_migration'))
+        for index in ('ix_project_change_project_revision', 'ix_section_project_order', 'ix_item_parent_order'):
+            connection.execute(sa.text(f'DROP INDEX {index}'))
+        if engine.dialect.name == 'postgresql':
+            connection.execute(sa.text('ALTER TABLE project DROP COLUMN revision'))
+
+
+def indexes(engine, table):
+    return {index['name'] for index in sa.inspect(engine).get_indexes(table)}
+
+
+def check_upgrade(app):
+    with app.app_context():
+        engine = db.engine
+    legacy_schema(engine)
+
+    assert upgrade(app) == [version for version, _ in MIGRATIONS]
+    assert 'ix_item_parent_order' in indexes(engine, 'item')
+    assert 'ix_section_project_order' in indexes(engine, 'section')
+    assert 'revision' in {column['name'] for column in sa.inspect(engine).get_columns('project')}
+    assert upgrade(app) == []
+
+
+def test_upgrade_brings_a_legacy_sqlite_database_up_to_date(app):
+    check_upgrade(app)
+
+
+@pytest.mark.skipif(not POSTGRES_URL, reason='set TEST_POSTGRES_URL to run against PostgreSQL')
+def test_upgrade_builds_indexes_concurrently_on_postgres():
+    admin = sa.create_engine(POSTGRES_URL.rsplit('/', 1)[0] + '/postgres', isolation_level='AUTOCOMMIT')
+    name = POSTGRES_URL.rsplit('/', 1)[1]
+    with admin.connect() as connection:
+        connection.execute(sa.text(f'DROP DATABASE IF EXISTS {name}'))
+        connection.execute(sa.text(f'CREATE DATABASE {name}'))
+    admin.dispose()
+
+    # create_app runs upgrade() itself, which is what failed to start on PostgreSQL
+    app = create_app({'TESTING': True, 'SQLALCHEMY_DATABASE_URI': POSTGRES_URL, 'PASSWORD_HASH_WORKERS': 0,
+                      'JOB_WORKERS': 0})
+    check_upgrade(app)
+    check_index_usage(app)
+    with app.app_context():
+        db.engine.dispose()
+
+    # Under autocommit nothing rolls the SET back; one pooled connection means the check gets the same one
+    app = create_app({'TESTING': True, 'SQLALCHEMY_DATABASE_URI': POSTGRES_URL, 'PASSWORD_HASH_WORKERS': 0,
+                      'JOB_WORKERS': 0,
+                      'SQLALCHEMY_ENGINE_OPTIONS': {'isolation_level': 'AUTOCOMMIT', 'pool_size': 1, 'max_overflow': 0}})
+    check_index_usage(app)
+    with app.app_context():
+        db.engine.dispose()
+
+
+def baseline_schema(engine):
+    """Strip a database back to the schema of the original code: no counters, change log, search index or versions."""
+    search_table = 'search_document' if engine.dialect.name == 'postgresql' else 'search_index'
+    with engine.begin() as connection:
+        for table in ('schema_migration', 'section_stat', 'project_change', search_table):
+            connection.execute(sa.text(f'DROP TABLE {table}'))
+        for table, column in (('project', 'revision'), ('project', 'version'), ('project', 'deleting'),
+                              ('section', 'version'), ('item', 'version')):
+            connection.execute(sa.text(f'ALTER TABLE {table} DROP COLUMN {column}'))
+    engine.dispose()
+
+
+def restart(app):
+    """A client of a fresh app on the same database, logged in as the fixture's user."""
+    client = create_app({key: app.config[key] for key in (
+        'TESTING', 'SECRET_KEY', 'SQLALCHEMY_DATABASE_URI', 'PASSWORD_HASH_WORKERS', 'RATE_LIMIT_ENABLED', 'JOB_WORKERS'
+    )}).test_client()
+    assert client.post('/api/auth/login', json={'username': 'alice', 'password': 'pw'}).status_code == 200
+    return client
+
+
+def test_startup_upgrades_a_database_created_by_the_original_code(app, client):
+    project_id = client.post('/api/projects', json={'name': 'Old'}).get_json()['id']
+    section_id = client.post(f'/api/projects/{project_id}/sections', json={'name': 'Section'}).get_json()['section']['id']
+    item_ids = [
+        client.post(f'/api/sections/{section_id}/items', json={'text': f'Item {n}', 'priority': priority}).get_json()['item']['id']
+        for n, priority in enumerate(['critical', 'critical', 'low'])
+    ]
+    with app.app_context():
+        engine = db.engine
+    baseline_schema(engine)
+
+    client = restart(app)
+    results = client.get('/api/search', query_string={'q': 'Item'}).get_json()['results']
+    assert sorted(result['id'] for result in results if result['type'] == 'item') == item_ids
+
+    stats = client.get(f'/api/projects/{project_id}/stats').get_json()
+    assert (stats['total'], stats['critical']) == (3, 2)
+
+    assert client.delete(f'/api/items/{item_ids[0]}').status_code == 200
+    listed = client.get('/api/projects?include_stats=true').get_json()
+    assert (listed[0]['stats']['total'], listed[0]['stats']['critical']) == (2, 1)
+
+    # Writes get revisions and show up in the change log
+    response = client.post(f'/api/projects/{project_id}/sections', json={'name': 'New'})
+    assert response.status_code == 201, response.get_json()
+    changes = client.get(f"/api/projects/{project_id}/changes?since={response.get_json()['revision'] - 1}").get_json()
+    assert [section['name'] for section in changes['sections']] == ['New']
+
+
+def check_index_usage(app):
+    with app.app_context():
+        results = explain_index_usage()
+        assert [(name, plan) for name, _, plan, used in results if not used] == []
+        if db.engine.dialect.name == 'postgresql':
+            # The planner override must not leak into the next request that gets this pooled connection
+            with db.engine.connect() as connection:
+                assert connection.execute(sa.text('SHOW enable_seqscan')).scalar() == 'on'
+
+
+def test_hot_queries_use_their_indexes(app):
+    check_index_usage(app)
@@ -0,0 +1,49 @@
+from src.services.cache import project_cache
+from src.services.tree import build_project_tree
+from conftest import count_statements
+
+
+def create_project(client, sections, items_per_section=0, depth=1):
+    project_id = client.post('/api/projects', json={'name': 'Tree'}).get_json()['id']
+    for s in range(sections):
+        section_id = client.post(f'/api/projects/{project_id}/sections', json={'name': f'Section {s}'}).get_json()['section']['id']
+        for i in range(items_per_section):
+            parent_id = None
+            for level in range(depth):
+                body = {'text': f'Item {s}.{i}.{level}', 'parent_id': parent_id}
+                parent_id = client.post(f'/api/sections/{section_id}/items', json=body).get_json()['item']['id']
+    return project_id
+
+
+def tree_statements(app, project_id):
+    with app.app_context():
+        with count_statements(app) as statements:
+            sections = build_project_tree(project_id)
+    return len(statements), sections
+
+
+def test_tree_queries_do_not_grow_with_sections_or_nesting(app, client):
+    small = create_project(client, sections=1)
+    large = create_project(client, sections=6, items_per_section=3, depth=3)
+
+    small_count, _ = tree_statements(app, small)
+    large_count, sections = tree_statements(app, large)
+
+    assert large_count == small_count
+    assert len(sections) == 6
+    assert sections[0]['items'][0]['children'][0]['children'][0]['text'] == 'Item 0.0.2'
+
+
+def test_get_project_queries_do_not_grow_with_sections_or_nesting(app, client):
+    small = create_project(client, sections=1)
+    large = create_project(client, sections=6, items_per_section=3, depth=3)
+
+    counts = []
+    for project_id in (small, large):
+        project_cache.invalidate(project_id)
+        with count_statements(app) as statements:
+            response = client.get(f'/api/projects/{project_id}')
+        assert response.status_code == 200
+        counts.append(len(statements))
+
+    assert counts[0] == counts[1]
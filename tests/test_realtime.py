@@ -0,0 +1,49 @@
+import json
+from unittest.mock import Mock
+import pytest
+from src.services.realtime import ChangeHub, MemoryBroker, change_hub
+
+
+@pytest.fixture
+def project_id(app, client, monkeypatch):
+    app.config['REALTIME_POLL_SECONDS'] = 7
+    monkeypatch.setattr(change_hub, 'max_streams', 1)
+    return client.post('/api/projects', json={'name': 'Live'}).get_json()['id']
+
+
+def test_streams_past_the_cap_are_told_to_poll(client, project_id):
+    url = f'/api/projects/{project_id}/events'
+    stream = client.get(url)
+    try:
+        assert stream.mimetype == 'text/event-stream'
+
+        fallback = client.get(url)
+        event, data = fallback.get_data(as_text=True).strip().split('\n')
+        assert event == 'event: fallback'
+        assert json.loads(data[len('data: '):])['poll_seconds'] == 7
+    finally:
+        stream.close()
+
+    # Closing the first stream frees its slot
+    reopened = client.get(url)
+    try:
+        assert next(reopened.response) == b'retry: 2000\n\n'
+    finally:
+        reopened.close()
+    assert change_hub.open_stream()
+    change_hub.close_stream()
+
+
+def test_broadcast_failures_are_logged(monkeypatch):
+    class Stop(Exception):
+        pass
+
+    app = Mock()
+    app.logger.exception.side_effect = Stop  # ends the loop after the first failure
+    hub = ChangeHub(tick=0)
+    hub.configure(app, MemoryBroker(), tick=0)
+    monkeypatch.setattr(hub, 'flush', Mock(side_effect=RuntimeError('broker down')))
+
+    with pytest.raises(Stop):
+        hub._run()
+    app.logger.exception.assert_called_once_with('Change broadcast failed')
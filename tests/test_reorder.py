@@ -0,0 +1,77 @@
+import pytest
+
+
+@pytest.fixture
+def project_id(client):
+    return client.post('/api/projects', json={'name': 'Reorder'}).get_json()['id']
+
+
+@pytest.fixture
+def section_ids(client, project_id):
+    return [
+        client.post(f'/api/projects/{project_id}/sections', json={'name': f'Section {n}'}).get_json()['section']['id']
+        for n in range(2)
+    ]
+
+
+@pytest.mark.parametrize('url', ['/api/sections/reorder', '/api/items/reorder'])
+@pytest.mark.parametrize('body', [
+    None,
+    [1, 2],
+    {'moves': {'id': 1}},
+    {'moves': []},
+    {'moves': [5]},
+    {'moves': [{}]},
+    {'moves': [{'id': 'a'}]},
+    {'moves': [{'id': True}]},
+    {'moves': [{'id': 1, 'after_id': [2]}]},
+])
+def test_malformed_moves_are_rejected(client, url, body):
+    response = client.put(url, json=body)
+    assert response.status_code == 400
+    assert 'error' in response.get_json()
+
+
+def test_items_reorder_checks_target_ids(client, section_ids):
+    item_id = client.post(f'/api/sections/{section_ids[0]}/items', json={'text': 'Item'}).get_json()['item']['id']
+
+    response = client.put('/api/items/reorder', json={'moves': [{'id': item_id, 'section_id': '2'}]})
+    assert response.status_code == 400
+
+    response = client.put('/api/items/reorder', json={'moves': [{'id': item_id, 'section_id': section_ids[1]}]})
+    assert response.status_code == 200
+
+
+def test_sections_reorder(client, project_id, section_ids):
+    first, second = section_ids
+    response = client.put('/api/sections/reorder', json={'moves': [{'id': second, 'before_id': first}]})
+    assert response.status_code == 200, response.get_json()
+
+    sections = client.get(f'/api/projects/{project_id}/sections').get_json()['sections']
+    assert [section['id'] for section in sorted(sections, key=lambda s: s['order_index'])] == [second, first]
+
+
+def test_changes_carry_siblings_renumbered_by_a_rebalance(client, project_id):
+    ids = [client.post(f'/api/projects/{project_id}/sections', json={'name': f'Section {n}'}).get_json()['section']['id']
+           for n in range(3)]
+    listed = client.get(f'/api/projects/{project_id}/sections').get_json()['sections']
+    local = {section['id']: section['order_index'] for section in listed}
+    revision = client.get(f'/api/projects/{project_id}/changes?since=0').get_json()['revision']
+
+    # Alternately squeeze the last two sections in right after the first until the gap runs out
+    bystanders_changed = False
+    for n in range(16):
+        moved = ids[2 - n % 2]
+        response = client.put('/api/sections/reorder', json={'moves': [{'id': moved, 'after_id': ids[0]}]})
+        assert response.status_code == 200, response.get_json()
+
+        delta = client.get(f'/api/projects/{project_id}/changes?since={revision}').get_json()
+        revision = delta['revision']
+        for section in delta['sections']:
+            local[section['id']] = section['order_index']
+            bystanders_changed |= section['id'] != moved
+
+        listed = client.get(f'/api/projects/{project_id}/sections').get_json()['sections']
+        assert local == {section['id']: section['order_index'] for section in listed}
+
+    assert bystanders_changed
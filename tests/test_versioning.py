@@ -0,0 +1,33 @@
+import pytest
+from src.models.user import db
+from src.routes import section as section_routes
+from src.services.versioning import conditional_update
+
+
+@pytest.fixture
+def item_id(client):
+    project_id = client.post('/api/projects', json={'name': 'Versions'}).get_json()['id']
+    section_id = client.post(f'/api/projects/{project_id}/sections', json={'name': 'Section'}).get_json()['section']['id']
+    return client.post(f'/api/sections/{section_id}/items', json={'text': 'Item'}).get_json()['item']['id']
+
+
+def test_stale_version_is_a_conflict(client, item_id):
+    assert client.put(f'/api/items/{item_id}', json={'text': 'First'}).status_code == 200
+
+    response = client.put(f'/api/items/{item_id}', json={'text': 'Second', 'expected_version': 1})
+    assert response.status_code == 409
+    assert response.get_json()['current']['text'] == 'First'
+
+
+@pytest.mark.parametrize('expected_version', [None, 1])
+def test_row_deleted_after_read_is_not_found(client, monkeypatch, item_id, expected_version):
+    def deleted_first(model, loaded, values, expected):
+        # Another request deletes the item between this request's read and its UPDATE
+        db.session.execute(db.delete(model).where(model.id == loaded.id))
+        return conditional_update(model, loaded, values, expected)
+
+    monkeypatch.setattr(section_routes, 'conditional_update', deleted_first)
+    response = client.put(f'/api/items/{item_id}', json={'text': 'Edit', 'expected_version': expected_version})
+
+    assert response.status_code == 404
+    assert response.get_json() == {'error': 'Item not found'}